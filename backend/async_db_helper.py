@@ -0,0 +1,515 @@
+"""Async counterparts of db_helper and auth_helper backed by an aiomysql pool.
+
+Only used with the MySQL storage engine; other engines run the synchronous
+helpers in the threadpool even when API_MODE is "async".
+
+Every function here mirrors the synchronous helper of the same name. Helpers
+without a native async version are served by running the db_helper function
+in the threadpool, see __getattr__. Generators can't be served that way, so
+iter_expense_batches is the async counterpart of db_helper.iter_all_expenses.
+"""
+import asyncio
+import calendar
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+import aiomysql
+import pymysql
+from starlette.concurrency import run_in_threadpool
+from backend import db_helper, result_cache
+from backend.auth_helper import hash_password
+from backend.logging_setup import setup_logger
+from backend.query_stats import AsyncInstrumentedCursor, record_acquire
+
+logger = setup_logger('async_db_helper')
+
+POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+POOL_RECYCLE = int(os.getenv("ASYNC_DB_POOL_RECYCLE", "3600"))
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_stats = {"waiters": 0, "checkouts": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0}
+
+
+class ThreadedHelper:
+    """Async facade that runs a synchronous helper module's functions in the threadpool"""
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        func = getattr(self._module, name)
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(func, *args, **kwargs)
+
+        return call
+
+
+def __getattr__(name):
+    # Fall back to the synchronous helper for anything without a native async version
+    return getattr(ThreadedHelper(db_helper), name)
+
+
+async def get_pool():
+    """Return the process-wide aiomysql pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await aiomysql.create_pool(
+                    host=os.getenv("DB_HOST", "localhost"),
+                    user=os.getenv("DB_USER", "root"),
+                    password=os.getenv("DB_PASSWORD") or "",
+                    db=os.getenv("DB_NAME", "expense_manager"),
+                    minsize=1,
+                    maxsize=POOL_SIZE,
+                    pool_recycle=POOL_RECYCLE,
+                    autocommit=True,
+                )
+                logger.info("Async connection pool created: size=%s", POOL_SIZE)
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+def pool_stats():
+    """Snapshot of the async pool's counters, in the same shape as db_pool.pool_stats()"""
+    checkouts = _stats["checkouts"]
+    open_connections = _pool.size if _pool else 0
+    idle = _pool.freesize if _pool else 0
+    return {
+        "size": POOL_SIZE,
+        "open": open_connections,
+        "idle": idle,
+        "in_use": open_connections - idle,
+        "waiters": _stats["waiters"],
+        "checkouts": checkouts,
+        "timeouts": _stats["timeouts"],
+        "discarded": 0,
+        "checkout_avg_ms": (_stats["wait_total"] / checkouts * 1000) if checkouts else 0.0,
+        "checkout_max_ms": _stats["wait_max"] * 1000,
+    }
+
+
+@asynccontextmanager
+async def get_db_cursor(commit=False, cursor_class=aiomysql.DictCursor):
+    pool = await get_pool()
+    start = time.perf_counter()
+    _stats["waiters"] += 1
+    try:
+        connection = await asyncio.wait_for(pool.acquire(), POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        raise
+    finally:
+        _stats["waiters"] -= 1
+    waited = time.perf_counter() - start
+    _stats["checkouts"] += 1
+    _stats["wait_total"] += waited
+    _stats["wait_max"] = max(_stats["wait_max"], waited)
+    record_acquire(waited)
+
+    try:
+        if commit:
+            await connection.begin()
+        async with connection.cursor(cursor_class) as cursor:
+            yield AsyncInstrumentedCursor(cursor)
+        if commit:
+            await connection.commit()
+    except BaseException:
+        if commit:
+            try:
+                await connection.rollback()
+            except Exception:
+                connection.close()
+        raise
+    finally:
+        pool.release(connection)
+
+
+async def _bump_rollup_generation(cursor, user_id, expense_date):
+    await cursor.execute(
+        """INSERT INTO expense_rollups (user_id, month_start, generation) VALUES (%s, %s, 1)
+           ON DUPLICATE KEY UPDATE generation = generation + 1""",
+        (user_id, db_helper._month_start(expense_date))
+    )
+
+
+async def _next_data_version(cursor, user_id):
+    await cursor.execute("UPDATE users SET data_version = data_version + 1 WHERE id=%s", (user_id,))
+    await cursor.execute("SELECT data_version FROM users WHERE id=%s", (user_id,))
+    row = await cursor.fetchone()
+    return row["data_version"] if row else 0
+
+
+async def _record_tombstones(cursor, version, where, params):
+    await cursor.execute(
+        f"""INSERT INTO expense_tombstones (user_id, expense_id, change_version)
+            SELECT user_id, id, %s FROM expenses WHERE {where}""",
+        (version, *params)
+    )
+
+
+async def _insert_expense_rows(cursor, rows):
+    for start in range(0, len(rows), db_helper.INSERT_BATCH_SIZE):
+        batch = rows[start:start + db_helper.INSERT_BATCH_SIZE]
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(batch))
+        await cursor.execute(
+            f"""INSERT INTO expenses (expense_date, amount, category, notes, payload, user_id, change_version)
+                VALUES {values}""",
+            [value for row in batch for value in row]
+        )
+
+
+async def _bump_rollup_generation_for_id(cursor, expense_id, user_id):
+    await cursor.execute("SELECT expense_date FROM expenses WHERE id=%s AND user_id=%s", (expense_id, user_id))
+    row = await cursor.fetchone()
+    if not row:
+        return None
+    await _bump_rollup_generation(cursor, user_id, row["expense_date"])
+    return row["expense_date"]
+
+
+async def fetch_expenses_for_date(expense_date, user_id):
+    logger.info("fetch_expenses_for_date: %s, user_id: %s", expense_date, user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(
+            "SELECT amount, category, notes, payload FROM expenses WHERE expense_date=%s AND user_id=%s ORDER BY id;",
+            (expense_date, user_id)
+        )
+        return await cursor.fetchall()
+
+
+async def insert_expense(expense_date, amount, category, notes, user_id, payload=None):
+    logger.info("insert_expense: %s, user_id: %s, [ENCRYPTED DATA]", expense_date, user_id)
+    async with get_db_cursor(commit=True) as cursor:
+        version = await _next_data_version(cursor, user_id)
+        await cursor.execute(
+            """INSERT INTO expenses (expense_date, amount, category, notes, payload, user_id, change_version)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (expense_date, str(amount), category, notes, payload, user_id, version)
+        )
+        await _bump_rollup_generation(cursor, user_id, expense_date)
+    await result_cache.invalidate_async(user_id, expense_date)
+
+
+async def delete_expense_for_date(expense_date, user_id):
+    logger.info("delete_expense_for_date: %s, user_id: %s", expense_date, user_id)
+    async with get_db_cursor(commit=True) as cursor:
+        version = await _next_data_version(cursor, user_id)
+        await _record_tombstones(cursor, version, "expense_date=%s AND user_id=%s", (expense_date, user_id))
+        await cursor.execute("DELETE FROM expenses WHERE expense_date=%s AND user_id=%s", (expense_date, user_id))
+        await _bump_rollup_generation(cursor, user_id, expense_date)
+    await result_cache.invalidate_async(user_id, expense_date)
+
+
+async def replace_expenses_for_date(expense_date, expenses, user_id):
+    """Replace all of a user's expenses for a date in a single transaction"""
+    await replace_expenses_for_dates({expense_date: expenses}, user_id)
+
+
+async def replace_expenses_for_dates(expenses_by_date, user_id):
+    """Replace all of a user's expenses for every date in `expenses_by_date` in a single transaction"""
+    rows = sum(len(expenses) for expenses in expenses_by_date.values())
+    logger.info("replace_expenses_for_dates: dates: %s, user_id: %s, rows: %s, [ENCRYPTED DATA]",
+                len(expenses_by_date), user_id, rows)
+    if not expenses_by_date:
+        return
+    dates = list(expenses_by_date)
+    where = f"user_id=%s AND expense_date IN ({', '.join(['%s'] * len(dates))})"
+    async with get_db_cursor(commit=True) as cursor:
+        version = await _next_data_version(cursor, user_id)
+        await _record_tombstones(cursor, version, where, (user_id, *dates))
+        await cursor.execute(f"DELETE FROM expenses WHERE {where}", (user_id, *dates))
+        await _insert_expense_rows(cursor, [
+            (expense_date, str(expense["amount"]), expense["category"], expense["notes"], expense.get("payload"),
+             user_id, version)
+            for expense_date, expenses in expenses_by_date.items()
+            for expense in expenses
+        ])
+        months = {db_helper._month_start(expense_date) for expense_date in dates}
+        for month in sorted(months):
+            await _bump_rollup_generation(cursor, user_id, month)
+    for month in months:
+        await result_cache.invalidate_async(user_id, month)
+
+
+async def import_expenses(expenses, user_id):
+    """Insert expenses across any number of dates in a single transaction; returns the rows inserted"""
+    logger.info("import_expenses: user_id: %s, rows: %s, [ENCRYPTED DATA]", user_id, len(expenses))
+    if not expenses:
+        return 0
+    months = {db_helper._month_start(expense["expense_date"]) for expense in expenses}
+    async with get_db_cursor(commit=True) as cursor:
+        version = await _next_data_version(cursor, user_id)
+        await _insert_expense_rows(cursor, [
+            (expense["expense_date"], str(expense["amount"]), expense["category"], expense["notes"],
+             expense.get("payload"), user_id, version)
+            for expense in expenses
+        ])
+        for month in sorted(months):
+            await _bump_rollup_generation(cursor, user_id, month)
+    for month in months:
+        await result_cache.invalidate_async(user_id, month)
+    return len(expenses)
+
+
+async def fetch_expense_summary(start_date, end_date, user_id):
+    logger.info("fetch_expense_summary: %s, %s, user_id: %s", start_date, end_date, user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(
+            '''SELECT category, SUM(amount) as total
+            FROM expenses
+            WHERE expense_date BETWEEN %s AND %s AND user_id=%s
+            GROUP BY category;''', (start_date, end_date, user_id))
+        return await cursor.fetchall()
+
+
+async def fetch_monthly_expense_summary(year, user_id):
+    logger.info("fetch_monthly_expense_summary: %s, user_id: %s", year, user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(
+            '''SELECT
+                MONTH(expense_date) as month,
+                SUM(amount) as total
+            FROM expenses
+            WHERE user_id=%s AND expense_date >= %s AND expense_date < %s
+            GROUP BY MONTH(expense_date)
+            ORDER BY MONTH(expense_date);''', (user_id, date(year, 1, 1), date(year + 1, 1, 1)))
+        data = await cursor.fetchall()
+        for row in data:
+            row["month_name"] = calendar.month_name[row["month"]]
+        return data
+
+
+async def fetch_all_expenses_with_id(user_id):
+    logger.info("fetch_all_expenses_with_id: user_id: %s", user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(
+            """SELECT id, expense_date, amount, category, notes, payload
+               FROM expenses
+               WHERE user_id=%s
+               ORDER BY expense_date DESC, id DESC""",
+            (user_id,)
+        )
+        return await cursor.fetchall()
+
+
+async def iter_expense_batches(user_id, batch_size=500):
+    """Yield a user's expenses newest first, batch_size rows at a time, off a server-side cursor"""
+    logger.info("iter_expense_batches: user_id: %s", user_id)
+    async with get_db_cursor(cursor_class=aiomysql.SSDictCursor) as cursor:
+        await cursor.execute(
+            """SELECT id, expense_date, amount, category, notes, payload
+               FROM expenses
+               WHERE user_id=%s
+               ORDER BY expense_date DESC, id DESC""",
+            (user_id,)
+        )
+        while True:
+            rows = await cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+async def fetch_expenses_page(user_id, limit, after=None):
+    logger.info("fetch_expenses_page: user_id: %s, limit: %s, after: %s", user_id, limit, after)
+    async with get_db_cursor() as cursor:
+        if after is None:
+            await cursor.execute(
+                """SELECT id, expense_date, amount, category, notes, payload
+                   FROM expenses
+                   WHERE user_id=%s
+                   ORDER BY expense_date DESC, id DESC
+                   LIMIT %s""",
+                (user_id, limit)
+            )
+        else:
+            after_date, after_id = after
+            await cursor.execute(
+                """SELECT id, expense_date, amount, category, notes, payload
+                   FROM expenses
+                   WHERE user_id=%s AND (expense_date < %s OR (expense_date = %s AND id < %s))
+                   ORDER BY expense_date DESC, id DESC
+                   LIMIT %s""",
+                (user_id, after_date, after_date, after_id, limit)
+            )
+        return await cursor.fetchall()
+
+
+async def fetch_expenses_between(start_date, end_date, user_id):
+    logger.info("fetch_expenses_between: %s, %s, user_id: %s", start_date, end_date, user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(
+            """SELECT id, expense_date, amount, category, notes, payload
+               FROM expenses
+               WHERE user_id=%s AND expense_date >= %s AND expense_date <= %s
+               ORDER BY expense_date DESC, id DESC""",
+            (user_id, start_date, end_date)
+        )
+        return await cursor.fetchall()
+
+
+async def delete_expense_by_id(expense_id, user_id):
+    logger.info("delete_expense_by_id: %s, user_id: %s", expense_id, user_id)
+    async with get_db_cursor(commit=True) as cursor:
+        version = await _next_data_version(cursor, user_id)
+        expense_date = await _bump_rollup_generation_for_id(cursor, expense_id, user_id)
+        await _record_tombstones(cursor, version, "id=%s AND user_id=%s", (expense_id, user_id))
+        await cursor.execute("DELETE FROM expenses WHERE id=%s AND user_id=%s", (expense_id, user_id))
+    if expense_date:
+        await result_cache.invalidate_async(user_id, expense_date)
+
+
+async def update_expense_by_id(expense_id, amount, category, notes, user_id, payload=None):
+    logger.info("update_expense_by_id: %s, amount: %s, user_id: %s", expense_id, amount, user_id)
+    async with get_db_cursor(commit=True) as cursor:
+        version = await _next_data_version(cursor, user_id)
+        expense_date = await _bump_rollup_generation_for_id(cursor, expense_id, user_id)
+        await cursor.execute(
+            """UPDATE expenses SET amount=%s, category=%s, notes=%s, payload=%s, change_version=%s
+               WHERE id=%s AND user_id=%s""",
+            (amount, category, notes, payload, version, expense_id, user_id)
+        )
+    if expense_date:
+        await result_cache.invalidate_async(user_id, expense_date)
+
+
+async def apply_expense_batch(updates, deletes, user_id):
+    """Apply updates and deletes by id in a single transaction; returns the set of ids the user owns"""
+    logger.info("apply_expense_batch: user_id: %s, updates: %s, deletes: %s", user_id, len(updates), len(deletes))
+    ids = [expense["id"] for expense in updates] + list(deletes)
+    if not ids:
+        return set()
+    async with get_db_cursor(commit=True) as cursor:
+        version = await _next_data_version(cursor, user_id)
+        placeholders = ", ".join(["%s"] * len(ids))
+        await cursor.execute(f"SELECT id, expense_date FROM expenses WHERE user_id=%s AND id IN ({placeholders})",
+                             (user_id, *ids))
+        dates = {row["id"]: row["expense_date"] for row in await cursor.fetchall()}
+        updates = [expense for expense in updates if expense["id"] in dates]
+        deletes = [expense_id for expense_id in deletes if expense_id in dates]
+        if updates:
+            cases = " ".join(["WHEN %s THEN %s"] * len(updates))
+            params = []
+            for column in ("amount", "category", "notes", "payload"):
+                for expense in updates:
+                    value = expense.get(column)
+                    params.extend((expense["id"], str(value) if column == "amount" else value))
+            await cursor.execute(
+                f"""UPDATE expenses SET amount = CASE id {cases} END, category = CASE id {cases} END,
+                        notes = CASE id {cases} END, payload = CASE id {cases} END, change_version = %s
+                    WHERE user_id=%s AND id IN ({", ".join(["%s"] * len(updates))})""",
+                (*params, version, user_id, *[expense["id"] for expense in updates])
+            )
+        if deletes:
+            where = f"user_id=%s AND id IN ({', '.join(['%s'] * len(deletes))})"
+            await _record_tombstones(cursor, version, where, (user_id, *deletes))
+            await cursor.execute(f"DELETE FROM expenses WHERE {where}", (user_id, *deletes))
+        months = {db_helper._month_start(dates[expense_id]) for expense_id in dates}
+        for month in sorted(months):
+            await _bump_rollup_generation(cursor, user_id, month)
+    for month in months:
+        await result_cache.invalidate_async(user_id, month)
+    return set(dates)
+
+
+async def fetch_data_version(user_id):
+    logger.info("fetch_data_version: user_id: %s", user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute("SELECT data_version FROM users WHERE id=%s", (user_id,))
+        row = await cursor.fetchone()
+    return row["data_version"] if row else 0
+
+
+async def fetch_changes(since, user_id):
+    logger.info("fetch_changes: since: %s, user_id: %s", since, user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute("SELECT data_version FROM users WHERE id=%s", (user_id,))
+        row = await cursor.fetchone()
+        version = row["data_version"] if row else 0
+        await cursor.execute(
+            """SELECT id, expense_date, amount, category, notes, payload
+               FROM expenses
+               WHERE user_id=%s AND change_version > %s
+               ORDER BY change_version, id""",
+            (user_id, since)
+        )
+        upserts = await cursor.fetchall()
+        await cursor.execute(
+            "SELECT expense_id FROM expense_tombstones WHERE user_id=%s AND change_version > %s",
+            (user_id, since)
+        )
+        deletes = [tombstone["expense_id"] for tombstone in await cursor.fetchall()]
+    return {"version": version, "upserts": upserts, "deletes": deletes}
+
+
+async def fetch_rollups(start_month, end_month, user_id):
+    logger.info("fetch_rollups: %s, %s, user_id: %s", start_month, end_month, user_id)
+    async with get_db_cursor() as cursor:
+        await cursor.execute(
+            """SELECT month_start, generation, built_generation, payload
+               FROM expense_rollups
+               WHERE user_id=%s AND month_start >= %s AND month_start <= %s
+               ORDER BY month_start""",
+            (user_id, start_month, end_month)
+        )
+        return await cursor.fetchall()
+
+
+async def store_rollup(month_start, payload, generation, user_id):
+    logger.info("store_rollup: %s, generation: %s, user_id: %s, [ENCRYPTED DATA]", month_start, generation, user_id)
+    async with get_db_cursor(commit=True) as cursor:
+        await cursor.execute(
+            """UPDATE expense_rollups SET payload=%s, built_generation=%s
+               WHERE user_id=%s AND month_start=%s AND built_generation <= %s AND generation >= %s""",
+            (payload, generation, user_id, month_start, generation, generation)
+        )
+        return cursor.rowcount > 0
+
+
+async def create_user(username, password):
+    """Create a new user"""
+    logger.info("create_user: %s", username)
+    password_hash = hash_password(password)
+
+    try:
+        async with get_db_cursor(commit=True) as cursor:
+            await cursor.execute(
+                "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
+                (username, password_hash)
+            )
+            return {"success": True, "message": "User created successfully"}
+    except pymysql.IntegrityError:
+        return {"success": False, "message": "Username already exists"}
+    except Exception as e:
+        logger.error("Error creating user: %s", e)
+        return {"success": False, "message": "Failed to create user"}
+
+
+async def verify_user(username, password):
+    """Verify user credentials"""
+    logger.info("verify_user: %s", username)
+    password_hash = hash_password(password)
+
+    async with get_db_cursor() as cursor:
+        await cursor.execute(
+            "SELECT id, username FROM users WHERE username=%s AND password_hash=%s",
+            (username, password_hash)
+        )
+        user = await cursor.fetchone()
+
+    if user:
+        return {"success": True, "user_id": user["id"], "username": user["username"]}
+    else:
+        return {"success": False, "message": "Invalid username or password"}
@@ -1,29 +1,11 @@
 import hashlib
-import mysql.connector
-from contextlib import contextmanager
+from backend.db_pool import get_db_cursor
 from backend.logging_setup import setup_logger
+from backend.storage import IntegrityError
 
 logger = setup_logger('auth_helper')
 
 
-@contextmanager
-def get_db_cursor(commit=False):
-    connection = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="r@@t0987", 
-        database="expense_manager"
-    )
-    cursor = connection.cursor(dictionary=True)
-    yield cursor
-
-    if commit:
-        connection.commit()
-
-    cursor.close()
-    connection.close()
-
-
 def hash_password(password):
     """Hash password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -31,7 +13,7 @@ def hash_password(password):
 
 def create_user(username, password):
     """Create a new user"""
-    logger.info(f"create_user: {username}")
+    logger.info("create_user: %s", username)
     password_hash = hash_password(password)
 
     try:
@@ -41,16 +23,16 @@ def create_user(username, password):
                 (username, password_hash)
             )
             return {"success": True, "message": "User created successfully"}
-    except mysql.connector.IntegrityError:
+    except IntegrityError:
         return {"success": False, "message": "Username already exists"}
     except Exception as e:
-        logger.error(f"Error creating user: {e}")
+        logger.error("Error creating user: %s", e)
         return {"success": False, "message": "Failed to create user"}
 
 
 def verify_user(username, password):
     """Verify user credentials"""
-    logger.info(f"verify_user: {username}")
+    logger.info("verify_user: %s", username)
     password_hash = hash_password(password)
 
     with get_db_cursor() as cursor:
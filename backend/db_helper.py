@@ -1,56 +1,170 @@
-import mysql.connector
-from contextlib import contextmanager
+import calendar
+from datetime import date
+from backend import result_cache
+from backend.db_pool import get_db_cursor
 from backend.logging_setup import setup_logger
-import os 
+from backend.storage import get_storage
 
 logger = setup_logger('db_helper')
 
+# Rows per multi-row INSERT, keeps statements well under max_allowed_packet
+INSERT_BATCH_SIZE = 500
 
-@contextmanager
-def get_db_cursor(commit=False):
-    connection = mysql.connector.connect(
-    host=os.getenv("DB_HOST", "localhost"),
-    user=os.getenv("DB_USER", "root"),
-    password=os.getenv("DB_PASSWORD"),
-    database=os.getenv("DB_NAME", "expense_manager")
+
+def _month_start(expense_date):
+    if isinstance(expense_date, str):
+        expense_date = date.fromisoformat(expense_date)
+    return expense_date.replace(day=1)
+
+
+def _bump_rollup_generation(cursor, user_id, expense_date):
+    """Mark the month's encrypted rollup stale, inside the transaction that wrote its expenses"""
+    cursor.execute(
+        f"""INSERT INTO expense_rollups (user_id, month_start, generation) VALUES (%s, %s, 1)
+            {get_storage().on_conflict_update("user_id, month_start")} generation = generation + 1""",
+        (user_id, _month_start(expense_date))
     )
-    cursor = connection.cursor(dictionary=True)
-    yield cursor
 
-    if commit:
-        connection.commit()
 
-    cursor.close()
-    connection.close()
+def _next_data_version(cursor, user_id):
+    """Bump and return the user's change version.
+
+    The UPDATE holds the user row lock until commit, so a user's writes are
+    serialized and their versions become visible in the order they were handed out.
+    """
+    cursor.execute("UPDATE users SET data_version = data_version + 1 WHERE id=%s", (user_id,))
+    cursor.execute("SELECT data_version FROM users WHERE id=%s", (user_id,))
+    row = cursor.fetchone()
+    return row["data_version"] if row else 0
+
+
+def _record_tombstones(cursor, version, where, params):
+    """Remember the ids of the expenses matching `where` before they are deleted"""
+    cursor.execute(
+        f"""INSERT INTO expense_tombstones (user_id, expense_id, change_version)
+            SELECT user_id, id, %s FROM expenses WHERE {where}""",
+        (version, *params)
+    )
+
+
+def _insert_expense_rows(cursor, rows):
+    """Multi-row INSERT of (expense_date, amount, category, notes, payload, user_id, change_version) tuples"""
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start:start + INSERT_BATCH_SIZE]
+        values = ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(batch))
+        cursor.execute(
+            f"""INSERT INTO expenses (expense_date, amount, category, notes, payload, user_id, change_version)
+                VALUES {values}""",
+            [value for row in batch for value in row]
+        )
+
+
+def _bump_rollup_generation_for_id(cursor, expense_id, user_id):
+    """Same for the month of one expense; returns its date, or None if the user has no such expense"""
+    cursor.execute("SELECT expense_date FROM expenses WHERE id=%s AND user_id=%s", (expense_id, user_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    _bump_rollup_generation(cursor, user_id, row["expense_date"])
+    return row["expense_date"]
 
 
 def fetch_expenses_for_date(expense_date, user_id):
-    logger.info(f"fetch_expenses_for_date: {expense_date}, user_id: {user_id}")
+    logger.info("fetch_expenses_for_date: %s, user_id: %s", expense_date, user_id)
     with get_db_cursor() as cursor:
         cursor.execute(
-            "SELECT amount, category, notes FROM expenses WHERE expense_date=%s AND user_id=%s ORDER BY id;",
+            "SELECT amount, category, notes, payload FROM expenses WHERE expense_date=%s AND user_id=%s ORDER BY id;",
             (expense_date, user_id)
         )
         expenses = cursor.fetchall()
     return expenses
 
-def insert_expense(expense_date, amount, category, notes, user_id):
-    logger.info(f"insert_expense: {expense_date}, user_id: {user_id}, [ENCRYPTED DATA]")
+def insert_expense(expense_date, amount, category, notes, user_id, payload=None):
+    logger.info("insert_expense: %s, user_id: %s, [ENCRYPTED DATA]", expense_date, user_id)
     with get_db_cursor(commit=True) as cursor:
+        version = _next_data_version(cursor, user_id)
         cursor.execute(
-            "INSERT INTO expenses (expense_date, amount, category, notes, user_id) VALUES (%s, %s, %s, %s, %s)",
-            (expense_date, str(amount), category, notes, user_id)  # Store amount as string
+            """INSERT INTO expenses (expense_date, amount, category, notes, payload, user_id, change_version)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (expense_date, str(amount), category, notes, payload, user_id, version)  # Store amount as string
         )
+        _bump_rollup_generation(cursor, user_id, expense_date)
+    result_cache.invalidate(user_id, expense_date)
 
 
 def delete_expense_for_date(expense_date, user_id):
-    logger.info(f"delete_expense_for_date: {expense_date}, user_id: {user_id}")
+    logger.info("delete_expense_for_date: %s, user_id: %s", expense_date, user_id)
     with get_db_cursor(commit=True) as cursor:
+        version = _next_data_version(cursor, user_id)
+        _record_tombstones(cursor, version, "expense_date=%s AND user_id=%s", (expense_date, user_id))
         cursor.execute("DELETE FROM expenses WHERE expense_date=%s AND user_id=%s", (expense_date, user_id))
+        _bump_rollup_generation(cursor, user_id, expense_date)
+    result_cache.invalidate(user_id, expense_date)
+
+
+def replace_expenses_for_date(expense_date, expenses, user_id):
+    """Replace all of a user's expenses for a date in a single transaction"""
+    replace_expenses_for_dates({expense_date: expenses}, user_id)
+
+
+def replace_expenses_for_dates(expenses_by_date, user_id):
+    """Replace all of a user's expenses for every date in `expenses_by_date` in a single transaction.
+
+    One DELETE covers every date and the new rows go in with multi-row INSERTs;
+    a date mapped to an empty list is cleared.
+    """
+    rows = sum(len(expenses) for expenses in expenses_by_date.values())
+    logger.info("replace_expenses_for_dates: dates: %s, user_id: %s, rows: %s, [ENCRYPTED DATA]",
+                len(expenses_by_date), user_id, rows)
+    if not expenses_by_date:
+        return
+    dates = list(expenses_by_date)
+    where = f"user_id=%s AND expense_date IN ({', '.join(['%s'] * len(dates))})"
+    with get_db_cursor(commit=True) as cursor:
+        # Bumping the version locks the user row, which serializes concurrent replaces
+        # for the same user so two submits for one date can't interleave their delete and insert
+        version = _next_data_version(cursor, user_id)
+        _record_tombstones(cursor, version, where, (user_id, *dates))
+        cursor.execute(f"DELETE FROM expenses WHERE {where}", (user_id, *dates))
+        _insert_expense_rows(cursor, [
+            (expense_date, str(expense["amount"]), expense["category"], expense["notes"], expense.get("payload"),
+             user_id, version)
+            for expense_date, expenses in expenses_by_date.items()
+            for expense in expenses
+        ])
+        months = {_month_start(expense_date) for expense_date in dates}
+        for month in sorted(months):
+            _bump_rollup_generation(cursor, user_id, month)
+    for month in months:
+        result_cache.invalidate(user_id, month)
+
+
+def import_expenses(expenses, user_id):
+    """Insert expenses across any number of dates in a single transaction; returns the rows inserted.
+
+    Each expense carries its own `expense_date`. Nothing is replaced: rows are
+    added to whatever the dates already hold.
+    """
+    logger.info("import_expenses: user_id: %s, rows: %s, [ENCRYPTED DATA]", user_id, len(expenses))
+    if not expenses:
+        return 0
+    months = {_month_start(expense["expense_date"]) for expense in expenses}
+    with get_db_cursor(commit=True) as cursor:
+        version = _next_data_version(cursor, user_id)
+        _insert_expense_rows(cursor, [
+            (expense["expense_date"], str(expense["amount"]), expense["category"], expense["notes"],
+             expense.get("payload"), user_id, version)
+            for expense in expenses
+        ])
+        for month in sorted(months):
+            _bump_rollup_generation(cursor, user_id, month)
+    for month in months:
+        result_cache.invalidate(user_id, month)
+    return len(expenses)
 
 
 def fetch_expense_summary(start_date, end_date, user_id):
-    logger.info(f"fetch_expense_summary: {start_date}, {end_date}, user_id: {user_id}")
+    logger.info("fetch_expense_summary: %s, %s, user_id: %s", start_date, end_date, user_id)
     with get_db_cursor() as cursor:
         cursor.execute(
             '''SELECT category, SUM(amount) as total
@@ -62,26 +176,29 @@ def fetch_expense_summary(start_date, end_date, user_id):
 
 
 def fetch_monthly_expense_summary(year, user_id):
-    logger.info(f"fetch_monthly_expense_summary: {year}, user_id: {user_id}")
+    logger.info("fetch_monthly_expense_summary: %s, user_id: %s", year, user_id)
+    storage = get_storage()
+    month = storage.month_expr("expense_date")
     with get_db_cursor() as cursor:
         cursor.execute(
-            '''SELECT 
-                MONTH(expense_date) as month,
-                MONTHNAME(expense_date) as month_name,
+            f'''SELECT 
+                {month} as month,
                 SUM(amount) as total
             FROM expenses
-            WHERE YEAR(expense_date) = %s AND user_id=%s
-            GROUP BY MONTH(expense_date), MONTHNAME(expense_date)
-            ORDER BY MONTH(expense_date);''', (year, user_id))
+            WHERE user_id=%s AND expense_date >= %s AND expense_date < %s
+            GROUP BY {month}
+            ORDER BY {month};''', (user_id, date(year, 1, 1), date(year + 1, 1, 1)))
         data = cursor.fetchall()
+        for row in data:
+            row["month_name"] = calendar.month_name[row["month"]]
         return data
 
 
 def fetch_all_expenses_with_id(user_id):
-    logger.info(f"fetch_all_expenses_with_id: user_id: {user_id}")
+    logger.info("fetch_all_expenses_with_id: user_id: %s", user_id)
     with get_db_cursor() as cursor:
         cursor.execute(
-            """SELECT id, expense_date, amount, category, notes 
+            """SELECT id, expense_date, amount, category, notes, payload
                FROM expenses 
                WHERE user_id=%s
                ORDER BY expense_date DESC, id DESC""",
@@ -91,18 +208,200 @@ def fetch_all_expenses_with_id(user_id):
         return expenses
 
 
+def fetch_expenses_page(user_id, limit, after=None):
+    """Fetch one page of a user's expenses, newest first.
+
+    `after` is the (expense_date, id) of the last row of the previous page; paging
+    by that key instead of OFFSET keeps every page a single index range scan.
+    """
+    logger.info("fetch_expenses_page: user_id: %s, limit: %s, after: %s", user_id, limit, after)
+    with get_db_cursor() as cursor:
+        if after is None:
+            cursor.execute(
+                """SELECT id, expense_date, amount, category, notes, payload
+                   FROM expenses
+                   WHERE user_id=%s
+                   ORDER BY expense_date DESC, id DESC
+                   LIMIT %s""",
+                (user_id, limit)
+            )
+        else:
+            after_date, after_id = after
+            cursor.execute(
+                """SELECT id, expense_date, amount, category, notes, payload
+                   FROM expenses
+                   WHERE user_id=%s AND (expense_date < %s OR (expense_date = %s AND id < %s))
+                   ORDER BY expense_date DESC, id DESC
+                   LIMIT %s""",
+                (user_id, after_date, after_date, after_id, limit)
+            )
+        return cursor.fetchall()
+
+
+def fetch_expenses_between(start_date, end_date, user_id):
+    """A user's expenses with start_date <= expense_date <= end_date, newest first"""
+    logger.info("fetch_expenses_between: %s, %s, user_id: %s", start_date, end_date, user_id)
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """SELECT id, expense_date, amount, category, notes, payload
+               FROM expenses
+               WHERE user_id=%s AND expense_date >= %s AND expense_date <= %s
+               ORDER BY expense_date DESC, id DESC""",
+            (user_id, start_date, end_date)
+        )
+        return cursor.fetchall()
+
+
+def iter_all_expenses(user_id, batch_size=500):
+    """Yield a user's expenses newest first, reading them off the server in batches"""
+    logger.info("iter_all_expenses: user_id: %s", user_id)
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """SELECT id, expense_date, amount, category, notes, payload
+               FROM expenses
+               WHERE user_id=%s
+               ORDER BY expense_date DESC, id DESC""",
+            (user_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+
 def delete_expense_by_id(expense_id, user_id):
-    logger.info(f"delete_expense_by_id: {expense_id}, user_id: {user_id}")
+    logger.info("delete_expense_by_id: %s, user_id: %s", expense_id, user_id)
     with get_db_cursor(commit=True) as cursor:
+        version = _next_data_version(cursor, user_id)
+        expense_date = _bump_rollup_generation_for_id(cursor, expense_id, user_id)
+        _record_tombstones(cursor, version, "id=%s AND user_id=%s", (expense_id, user_id))
         cursor.execute("DELETE FROM expenses WHERE id=%s AND user_id=%s", (expense_id, user_id))
+    if expense_date:
+        result_cache.invalidate(user_id, expense_date)
+
+
+def update_expense_by_id(expense_id, amount, category, notes, user_id, payload=None):
+    logger.info("update_expense_by_id: %s, amount: %s, user_id: %s", expense_id, amount, user_id)
+    with get_db_cursor(commit=True) as cursor:
+        version = _next_data_version(cursor, user_id)
+        expense_date = _bump_rollup_generation_for_id(cursor, expense_id, user_id)
+        cursor.execute(
+            """UPDATE expenses SET amount=%s, category=%s, notes=%s, payload=%s, change_version=%s
+               WHERE id=%s AND user_id=%s""",
+            (amount, category, notes, payload, version, expense_id, user_id)
+        )
+    if expense_date:
+        result_cache.invalidate(user_id, expense_date)
+
+
+def apply_expense_batch(updates, deletes, user_id):
+    """Apply updates and deletes by id in a single transaction; returns the set of ids the user owns.
+
+    `updates` are expenses with an `id`, `deletes` are ids. All updates go out in
+    one statement and all deletes in another; ids the user doesn't own are skipped.
+    """
+    logger.info("apply_expense_batch: user_id: %s, updates: %s, deletes: %s", user_id, len(updates), len(deletes))
+    ids = [expense["id"] for expense in updates] + list(deletes)
+    if not ids:
+        return set()
+    with get_db_cursor(commit=True) as cursor:
+        version = _next_data_version(cursor, user_id)
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(f"SELECT id, expense_date FROM expenses WHERE user_id=%s AND id IN ({placeholders})",
+                       (user_id, *ids))
+        dates = {row["id"]: row["expense_date"] for row in cursor.fetchall()}
+        updates = [expense for expense in updates if expense["id"] in dates]
+        deletes = [expense_id for expense_id in deletes if expense_id in dates]
+        if updates:
+            cases = " ".join(["WHEN %s THEN %s"] * len(updates))
+            params = []
+            for column in ("amount", "category", "notes", "payload"):
+                for expense in updates:
+                    value = expense.get(column)
+                    params.extend((expense["id"], str(value) if column == "amount" else value))
+            cursor.execute(
+                f"""UPDATE expenses SET amount = CASE id {cases} END, category = CASE id {cases} END,
+                        notes = CASE id {cases} END, payload = CASE id {cases} END, change_version = %s
+                    WHERE user_id=%s AND id IN ({", ".join(["%s"] * len(updates))})""",
+                (*params, version, user_id, *[expense["id"] for expense in updates])
+            )
+        if deletes:
+            where = f"user_id=%s AND id IN ({', '.join(['%s'] * len(deletes))})"
+            _record_tombstones(cursor, version, where, (user_id, *deletes))
+            cursor.execute(f"DELETE FROM expenses WHERE {where}", (user_id, *deletes))
+        months = {_month_start(dates[expense_id]) for expense_id in dates}
+        for month in sorted(months):
+            _bump_rollup_generation(cursor, user_id, month)
+    for month in months:
+        result_cache.invalidate(user_id, month)
+    return set(dates)
+
+
+def fetch_data_version(user_id):
+    """The user's current change version, bumped by every expense write"""
+    logger.info("fetch_data_version: user_id: %s", user_id)
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT data_version FROM users WHERE id=%s", (user_id,))
+        row = cursor.fetchone()
+    return row["data_version"] if row else 0
+
+
+def fetch_changes(since, user_id):
+    """Expenses written and ids deleted after change version `since`.
+
+    The current version is read first: any write with a version up to it has
+    committed, so a client that syncs from the returned version misses nothing.
+    Rows written meanwhile may show up twice across syncs, which is harmless.
+    """
+    logger.info("fetch_changes: since: %s, user_id: %s", since, user_id)
+    with get_db_cursor() as cursor:
+        cursor.execute("SELECT data_version FROM users WHERE id=%s", (user_id,))
+        row = cursor.fetchone()
+        version = row["data_version"] if row else 0
+        cursor.execute(
+            """SELECT id, expense_date, amount, category, notes, payload
+               FROM expenses
+               WHERE user_id=%s AND change_version > %s
+               ORDER BY change_version, id""",
+            (user_id, since)
+        )
+        upserts = cursor.fetchall()
+        cursor.execute(
+            "SELECT expense_id FROM expense_tombstones WHERE user_id=%s AND change_version > %s",
+            (user_id, since)
+        )
+        deletes = [tombstone["expense_id"] for tombstone in cursor.fetchall()]
+    return {"version": version, "upserts": upserts, "deletes": deletes}
+
+
+def fetch_rollups(start_month, end_month, user_id):
+    """Encrypted monthly rollups for months start_month..end_month (first days of months)"""
+    logger.info("fetch_rollups: %s, %s, user_id: %s", start_month, end_month, user_id)
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """SELECT month_start, generation, built_generation, payload
+               FROM expense_rollups
+               WHERE user_id=%s AND month_start >= %s AND month_start <= %s
+               ORDER BY month_start""",
+            (user_id, start_month, end_month)
+        )
+        return cursor.fetchall()
+
 
+def store_rollup(month_start, payload, generation, user_id):
+    """Save a rollup the client built from the month's `generation`.
 
-def update_expense_by_id(expense_id, amount, category, notes, user_id):
-    logger.info(f"update_expense_by_id: {expense_id}, amount: {amount}, user_id: {user_id}")
+    Returns False when nothing was stored: the month has no expenses, or a rollup
+    built from a later generation is already there.
+    """
+    logger.info("store_rollup: %s, generation: %s, user_id: %s, [ENCRYPTED DATA]", month_start, generation, user_id)
     with get_db_cursor(commit=True) as cursor:
         cursor.execute(
-            "UPDATE expenses SET amount=%s, category=%s, notes=%s WHERE id=%s AND user_id=%s",
-            (amount, category, notes, expense_id, user_id)
+            """UPDATE expense_rollups SET payload=%s, built_generation=%s
+               WHERE user_id=%s AND month_start=%s AND built_generation <= %s AND generation >= %s""",
+            (payload, generation, user_id, month_start, generation, generation)
         )
+        return cursor.rowcount > 0
 
 
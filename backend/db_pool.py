@@ -0,0 +1,218 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from backend.logging_setup import setup_logger
+from backend.query_stats import InstrumentedCursor, record_acquire
+from backend.storage import get_storage
+
+logger = setup_logger('db_pool')
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection frees up within the checkout timeout"""
+
+
+class PooledConnection:
+    """A connection checked out of a ConnectionPool plus its per-connection statement cache"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = OrderedDict()
+        self.released_at = time.monotonic()
+
+    def close(self):
+        for cursor in self.statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.statements.clear()
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of database connections.
+
+    Connections are opened lazily up to `size`. A checkout waits at most `timeout`
+    seconds for a free connection, and connections that sat idle for longer than
+    `ping_after` seconds are health-checked before being handed out.
+    """
+
+    def __init__(self, connect, size=5, timeout=10.0, ping_after=30.0, is_healthy=None):
+        self._connect = connect
+        self._is_healthy = is_healthy or (lambda connection: connection.is_connected())
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._created = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        pooled = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+            self._in_use += 1
+
+        try:
+            if pooled is not None and time.monotonic() - pooled.released_at > self.ping_after:
+                if not self._is_healthy(pooled.connection):
+                    logger.warning("Discarding unhealthy pooled connection")
+                    pooled.close()
+                    pooled = None
+                    with self._cond:
+                        self._discarded += 1
+            if pooled is None:
+                pooled = PooledConnection(self._connect())
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.perf_counter() - start
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return pooled
+
+    def release(self, pooled, discard=False):
+        if discard:
+            pooled.close()
+        else:
+            pooled.released_at = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._created -= 1
+                self._discarded += 1
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._created -= len(idle)
+        for pooled in idle:
+            pooled.close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiters": self._waiters,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "discarded": self._discarded,
+                "checkout_avg_ms": (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                "checkout_max_ms": self._wait_max * 1000,
+            }
+
+
+PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "0") == "1"
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "32"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                storage = get_storage()
+                _pool = ConnectionPool(
+                    storage.connect,
+                    is_healthy=storage.is_healthy,
+                    size=int(os.getenv("DB_POOL_SIZE", "5")),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                    ping_after=float(os.getenv("DB_POOL_PING_AFTER", "30")),
+                )
+                logger.info("Connection pool created: backend=%s, size=%s, timeout=%ss",
+                            storage.name, _pool.size, _pool.timeout)
+    return _pool
+
+
+def reset_pool():
+    """Close idle connections and drop the shared pool so the next checkout builds a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+
+
+def pool_stats():
+    """Snapshot of the shared pool's counters"""
+    return get_pool().stats()
+
+
+@contextmanager
+def get_db_cursor(commit=False):
+    storage = get_storage()
+    pool = get_pool()
+    start = time.perf_counter()
+    pooled = pool.acquire()
+    record_acquire(time.perf_counter() - start)
+    connection = pooled.connection
+    discard = False
+    try:
+        if commit:
+            storage.begin(connection)
+        cursor = InstrumentedCursor(
+            storage.cursor(pooled, prepared=PREPARED_STATEMENTS, max_statements=STATEMENT_CACHE_SIZE))
+        try:
+            yield cursor
+            if commit:
+                connection.commit()
+        finally:
+            cursor.close()
+    except BaseException:
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            discard = True
+        # A consumer that stopped reading early (e.g. a cancelled stream) leaves rows on the wire
+        if getattr(connection, "unread_result", False):
+            discard = True
+        raise
+    finally:
+        pool.release(pooled, discard=discard)
@@ -1,15 +1,114 @@
+"""Logging for the backend modules: one shared log file written off the request path.
+
+setup_logger(name) attaches the module logger to a QueueHandler, so the calling
+thread only puts the record on a queue; a QueueListener thread formats it and
+does the file I/O. Records reach that thread unformatted, so log arguments must
+not be mutated after the call. The file rotates by size (LOG_MAX_BYTES,
+LOG_BACKUP_COUNT) or with LOG_ROTATE=midnight once a day, and LOG_FORMAT=json
+writes one JSON object per line. LOG_SAMPLE keeps only a share of the
+high-volume fetch_* INFO lines per logger, e.g. "db_helper=0.1,async_db_helper=0.1".
+Calling setup_logger again for the same logger changes nothing.
+"""
+import atexit
+import json
 import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
 
-def setup_logger(name, log_file="server.log", level=logging.DEBUG):
+LOG_FILE = os.getenv("LOG_FILE", "server.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# "size" rotates at LOG_MAX_BYTES, "midnight" once a day; either keeps LOG_BACKUP_COUNT old files
+LOG_ROTATE = os.getenv("LOG_ROTATE", "size")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
 
-    logger = logging.getLogger(name)
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_handlers = {}
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread; the queue never leaves the process"""
+
+    def prepare(self, record):
+        return record
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """Logs a `rate` share of fetch_* calls at INFO and below, and everything else.
 
-    logger.setLevel(logging.DEBUG)
-    file_handler = logging.FileHandler(log_file)
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    The dice are rolled before a record is created, so a dropped line costs next to nothing.
+    """
 
-    print("**File**:", __file__)
+    def __init__(self, logger, rate):
+        super().__init__(logger, {})
+        self.rate = rate
 
-    return logger
\ No newline at end of file
+    def log(self, level, msg, *args, **kwargs):
+        if level <= logging.INFO and str(msg).startswith("fetch_") and random.random() >= self.rate:
+            return
+        super().log(level, msg, *args, **kwargs)
+
+
+def parse_sample_rates(text):
+    """"db_helper=0.1,async_db_helper=0.1" -> {"db_helper": 0.1, "async_db_helper": 0.1}"""
+    rates = {}
+    for part in filter(None, (part.strip() for part in text.split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def file_handler(log_file):
+    if LOG_ROTATE == "midnight":
+        handler = TimedRotatingFileHandler(log_file, when="midnight", backupCount=LOG_BACKUP_COUNT,
+                                           encoding="utf-8", delay=True)
+    else:
+        handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                      encoding="utf-8", delay=True)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+    return handler
+
+
+def queue_handler(log_file):
+    """The QueueHandler feeding `log_file`, starting its writer thread on first use"""
+    with _lock:
+        handler = _handlers.get(log_file)
+        if handler is None:
+            records = queue.SimpleQueue()
+            handler = _handlers[log_file] = DeferredQueueHandler(records)
+            listener = QueueListener(records, file_handler(log_file), respect_handler_level=True)
+            listener.start()
+            # Flush what is still queued when the process exits
+            atexit.register(listener.stop)
+        return handler
+
+
+def setup_logger(name, log_file=LOG_FILE, level=LOG_LEVEL):
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    handler = queue_handler(log_file)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    rate = parse_sample_rates(LOG_SAMPLE).get(name)
+    return logger if rate is None else SampledLogger(logger, rate)
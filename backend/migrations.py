@@ -0,0 +1,211 @@
+"""Versioned schema migrations for every storage engine.
+
+Each migration runs once per database and is recorded in `schema_migrations`.
+They are applied automatically when the API server starts, in either
+API_MODE (set DB_AUTO_MIGRATE=0 to opt out), or by hand with:
+
+    python -m backend.migrations
+
+Code that uses the helpers without the server (tests, benchmarks, CLIs)
+calls upgrade() itself.
+"""
+import os
+from backend.logging_setup import setup_logger
+
+logger = setup_logger('migrations')
+
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+
+
+def _create_tables(cursor, storage):
+    if storage.name == "mysql":
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(255) NOT NULL UNIQUE,
+                password_hash CHAR(64) NOT NULL
+            ) ENGINE=InnoDB""")
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS expenses (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                expense_date DATE NOT NULL,
+                amount TEXT NOT NULL,
+                category TEXT NOT NULL,
+                notes TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB""")
+    else:
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL UNIQUE,
+                password_hash TEXT NOT NULL
+            )""")
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS expenses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                expense_date DATE NOT NULL,
+                amount TEXT NOT NULL,
+                category TEXT NOT NULL,
+                notes TEXT NOT NULL
+            )""")
+
+
+def _index_expenses_by_user_and_date(cursor, storage):
+    # Every expenses query filters on user_id and then ranges or sorts on
+    # (expense_date, id), so one composite index serves all of them
+    create_index(cursor, storage, "expenses", "idx_expenses_user_date", "user_id, expense_date, id")
+
+
+def _add_expense_payload(cursor, storage):
+    # Compact single-envelope ciphertext; legacy rows keep their three Fernet columns and a NULL payload
+    cursor.execute("ALTER TABLE expenses ADD COLUMN payload TEXT NULL")
+
+
+def _create_expense_rollups(cursor, storage):
+    # One client-encrypted rollup per (user, month). `generation` counts expense writes to the
+    # month and `built_generation` is the generation the stored payload was computed from
+    if storage.name == "mysql":
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS expense_rollups (
+                user_id INT NOT NULL,
+                month_start DATE NOT NULL,
+                generation INT NOT NULL DEFAULT 0,
+                built_generation INT NOT NULL DEFAULT 0,
+                payload TEXT NULL,
+                PRIMARY KEY (user_id, month_start),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB""")
+        month_start = "DATE_FORMAT(expense_date, '%Y-%m-01')"
+    else:
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS expense_rollups (
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                month_start DATE NOT NULL,
+                generation INTEGER NOT NULL DEFAULT 0,
+                built_generation INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NULL,
+                PRIMARY KEY (user_id, month_start)
+            )""")
+        month_start = "strftime('%Y-%m-01', expense_date)"
+    # Months that already hold expenses start out stale so clients rebuild them on first read
+    cursor.execute(
+        f"""INSERT INTO expense_rollups (user_id, month_start, generation)
+            SELECT DISTINCT user_id, {month_start}, 1 FROM expenses""")
+
+
+def _add_change_log(cursor, storage):
+    # users.data_version counts a user's expense writes; each row and tombstone records
+    # the version that last touched it so clients can fetch only what changed
+    if storage.name == "mysql":
+        cursor.execute("ALTER TABLE users ADD COLUMN data_version BIGINT NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE expenses ADD COLUMN change_version BIGINT NOT NULL DEFAULT 0")
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS expense_tombstones (
+                user_id INT NOT NULL,
+                expense_id INT NOT NULL,
+                change_version BIGINT NOT NULL,
+                PRIMARY KEY (user_id, expense_id),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) ENGINE=InnoDB""")
+    else:
+        cursor.execute("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE expenses ADD COLUMN change_version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS expense_tombstones (
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                expense_id INTEGER NOT NULL,
+                change_version INTEGER NOT NULL,
+                PRIMARY KEY (user_id, expense_id)
+            )""")
+    # Existing history counts as version 1, so a sync from version 0 returns all of it
+    cursor.execute("UPDATE expenses SET change_version = 1")
+    cursor.execute("UPDATE users SET data_version = 1 WHERE id IN (SELECT DISTINCT user_id FROM expenses)")
+    create_index(cursor, storage, "expenses", "idx_expenses_user_change", "user_id, change_version")
+    create_index(cursor, storage, "expense_tombstones", "idx_tombstones_user_change", "user_id, change_version")
+
+
+MIGRATIONS = [
+    (1, "create users and expenses tables", _create_tables),
+    (2, "index expenses by user and date", _index_expenses_by_user_and_date),
+    (3, "add expenses.payload envelope column", _add_expense_payload),
+    (4, "create expense_rollups table", _create_expense_rollups),
+    (5, "add per-user change log", _add_change_log),
+]
+
+
+def create_index(cursor, storage, table, name, columns):
+    """CREATE INDEX that is a no-op when the index already exists (MySQL has no IF NOT EXISTS)"""
+    if storage.name == "mysql":
+        cursor.execute(
+            """SELECT COUNT(*) AS found FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s""",
+            (table, name))
+        if cursor.fetchone()["found"]:
+            return
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    else:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def current_version(cursor):
+    cursor.execute("SELECT MAX(version) AS version FROM schema_migrations")
+    return cursor.fetchone()["version"] or 0
+
+
+def migrate(connection, storage):
+    """Apply all pending migrations on `connection`; returns the resulting schema version"""
+    cursor = storage.dict_cursor(connection)
+    try:
+        cursor.execute(
+            """CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )""")
+        # Serialize concurrent starters (several workers booting at once)
+        if storage.name == "mysql":
+            cursor.execute("SELECT GET_LOCK('expense_manager_migrations', 60) AS locked")
+            cursor.fetchone()
+        else:
+            cursor.execute("BEGIN IMMEDIATE")
+        try:
+            version = current_version(cursor)
+            for migration_version, name, apply in MIGRATIONS:
+                if migration_version <= version:
+                    continue
+                logger.info("Applying migration %s: %s", migration_version, name)
+                apply(cursor, storage)
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                               (migration_version, name))
+                version = migration_version
+            if storage.name != "mysql":
+                cursor.execute("COMMIT")
+        except Exception:
+            if storage.name != "mysql":
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            if storage.name == "mysql":
+                cursor.execute("SELECT RELEASE_LOCK('expense_manager_migrations') AS released")
+                cursor.fetchone()
+        return version
+    finally:
+        cursor.close()
+
+
+def upgrade(storage):
+    """Open a dedicated connection and bring the database up to the latest schema version"""
+    connection = storage.connect()
+    try:
+        return migrate(connection, storage)
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    from backend.storage import get_storage
+
+    print(f"Schema is at version {upgrade(get_storage())}")
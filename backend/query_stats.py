@@ -0,0 +1,215 @@
+"""Per-request database timings: connection checkout, statement execution, rows fetched.
+
+get_db_cursor (sync and async) wraps every cursor it hands out so each
+statement is timed and every fetched row counted. The numbers add up in the
+QueryStats of the request being served, found through a context variable that
+QueryStatsMiddleware sets; the threadpool copies the context, so helpers run
+through ThreadedHelper report into the same request. Statements slower than
+SLOW_QUERY_MS are logged with their route, inside or outside a request. With
+SERVER_TIMING=1 every response carries the totals as a Server-Timing header;
+for streamed responses it covers the work done before the first byte.
+"""
+import os
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+from backend.logging_setup import setup_logger
+
+logger = setup_logger('slow_queries')
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+_current = ContextVar("query_stats", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+# (%s, %s, %s) of any length, and runs of them as written by multi-row INSERTs
+_PLACEHOLDER_LIST = re.compile(r"\(%s(?:, ?%s)*\)")
+_REPEATED_LIST = re.compile(r"\(\.\.\.\)(?:, ?\(\.\.\.\))+")
+_REPEATED_CASE = re.compile(r"(?:WHEN %s THEN %s ?){2,}")
+
+
+# The helpers issue a small fixed set of statements, so each is only normalized once
+@lru_cache(maxsize=256)
+def normalize(operation):
+    """SQL with whitespace collapsed and variable-length placeholder lists folded, to group statements by"""
+    operation = _WHITESPACE.sub(" ", operation).strip()
+    operation = _PLACEHOLDER_LIST.sub("(...)", operation)
+    operation = _REPEATED_LIST.sub("(...), ...", operation)
+    return _REPEATED_CASE.sub("WHEN %s THEN %s ... ", operation)
+
+
+class QueryStats:
+    """Database work done for one request"""
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.acquire_seconds = 0.0
+        self.rows = 0
+        # Normalized SQL -> [executions, seconds]
+        self.statements = {}
+
+    @property
+    def route(self):
+        if self.scope is None:
+            return "-"
+        route = self.scope.get("route")
+        return route.path if route else self.scope["path"]
+
+    def server_timing(self):
+        return (f'db;dur={self.query_seconds * 1000:.1f};desc="{self.queries} queries, {self.rows} rows", '
+                f"db-pool;dur={self.acquire_seconds * 1000:.1f}")
+
+
+def current():
+    """QueryStats of the request being served, or None outside a request"""
+    return _current.get()
+
+
+def record_acquire(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.acquire_seconds += seconds
+
+
+def record_query(operation, seconds, rowcount):
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += seconds
+        entry = stats.statements.setdefault(normalize(operation), [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        logger.warning("Slow query on %s: %.1f ms, rowcount %s: %s",
+                       route, seconds * 1000, rowcount, normalize(operation))
+
+
+def record_rows(count):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += count
+
+
+class InstrumentedCursor:
+    """Cursor that reports each statement's time and the rows fetched to the current request"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=()):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params)
+        finally:
+            record_query(operation, time.perf_counter() - start, self._cursor.rowcount)
+
+    def executemany(self, operation, seq_params):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params)
+        finally:
+            record_query(operation, time.perf_counter() - start, self._cursor.rowcount)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            record_rows(1)
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        record_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        record_rows(len(rows))
+        return rows
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+class AsyncInstrumentedCursor:
+    """InstrumentedCursor for aiomysql cursors"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    async def execute(self, operation, params=()):
+        start = time.perf_counter()
+        try:
+            return await self._cursor.execute(operation, params)
+        finally:
+            record_query(operation, time.perf_counter() - start, self._cursor.rowcount)
+
+    async def executemany(self, operation, seq_params):
+        start = time.perf_counter()
+        try:
+            return await self._cursor.executemany(operation, seq_params)
+        finally:
+            record_query(operation, time.perf_counter() - start, self._cursor.rowcount)
+
+    async def fetchone(self):
+        row = await self._cursor.fetchone()
+        if row is not None:
+            record_rows(1)
+        return row
+
+    async def fetchmany(self, size=1):
+        rows = await self._cursor.fetchmany(size)
+        record_rows(len(rows))
+        return rows
+
+    async def fetchall(self):
+        rows = await self._cursor.fetchall()
+        record_rows(len(rows))
+        return rows
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+
+class QueryStatsMiddleware:
+    """Gives every HTTP request its own QueryStats and, with SERVER_TIMING=1, reports them in a header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats(scope)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if SERVER_TIMING and message["type"] == "http.response.start":
+                timing = f"{stats.server_timing()}, app;dur={(time.perf_counter() - start) * 1000:.1f}"
+                message = {**message, "headers": [*message.get("headers", []),
+                                                  (b"server-timing", timing.encode())]}
+            await send(message)
+
+        token = _current.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,276 @@
+"""Per-user cache of read results for the endpoints that answer the same query over and over.
+
+Entries are keyed by (user_id, query name, args) plus a generation token for every
+month the result depends on. Writes replace the token of the month they touched
+(and a user-wide one), so exactly the entries covering that month stop being
+reachable; they are never served again and age out through LRU and TTL. The
+tokens live in the backend, so with a shared backend every worker sees every
+other worker's invalidations. The local backend only sees its own process, so
+run it with a single worker or accept up to RESULT_CACHE_TTL of staleness.
+The redis client blocks, so calls to the shared backend from the async entry
+points (cached, invalidate_async) run on the threadpool instead of the event loop.
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+from starlette.concurrency import run_in_threadpool
+from backend.logging_setup import setup_logger
+
+logger = setup_logger('result_cache')
+
+# "local" (in-process), "redis" (shared between workers) or "off"
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "local")
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL", "redis://localhost:6379/0")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Results spanning more months than this depend on the user-wide token instead of one per month
+MAX_SCOPED_MONTHS = 24
+ALL_MONTHS = "all"
+
+
+class LocalBackend:
+    """In-process LRU with TTL and a byte cap; also the stand-in for the shared backend in tests.
+
+    Generation tokens are entries of the same LRU, so they count against max_bytes
+    and are evicted like results instead of piling up per user and month.
+    """
+
+    # Only this process sees it, and calls never wait on I/O
+    shared = False
+
+    def __init__(self, max_bytes, ttl, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._set(key, value)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            self._discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._discard(key)
+        self._entries[key] = (self._clock() + self.ttl, value)
+        self.bytes += len(value)
+        while self.bytes > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, key):
+        _, value = self._entries.pop(key)
+        self.bytes -= len(value)
+
+    def tokens(self, names):
+        tokens = []
+        with self._lock:
+            for name in names:
+                token = self._get(name)
+                if token is None:
+                    # Random rather than counted, so a token evicted from the LRU can never
+                    # come back with a value that old entries were keyed by
+                    token = uuid.uuid4().hex.encode()
+                    self._set(name, token)
+                tokens.append(token)
+        return tokens
+
+    def bump(self, names):
+        with self._lock:
+            for name in names:
+                self._set(name, uuid.uuid4().hex.encode())
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "evictions": self.evictions}
+
+
+class RedisBackend:
+    """Shared backend; size and eviction are left to the server's maxmemory policy"""
+
+    # Every worker sees it, and every call is a blocking round trip
+    shared = True
+
+    def __init__(self, url, ttl):
+        import redis  # Optional dependency, only needed with RESULT_CACHE_BACKEND=redis
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value):
+        self._client.set(key, value, ex=max(1, int(self.ttl)))
+
+    def tokens(self, names):
+        tokens = self._client.mget(names)
+        for i, token in enumerate(tokens):
+            if token is None:
+                # Random rather than counted, so a token lost to eviction can never
+                # come back with a value that old entries were keyed by
+                self._client.set(names[i], uuid.uuid4().hex, nx=True)
+                tokens[i] = self._client.get(names[i])
+        return tokens
+
+    def bump(self, names):
+        pipeline = self._client.pipeline()
+        for name in names:
+            pipeline.set(name, uuid.uuid4().hex)
+        pipeline.execute()
+
+    def stats(self):
+        return {}
+
+
+MISS = object()
+
+
+def month_scopes(start_date, end_date):
+    """Invalidation scopes of a result computed over start_date..end_date"""
+    months = []
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        if len(months) == MAX_SCOPED_MONTHS:
+            return [ALL_MONTHS]
+        months.append(month.isoformat()[:7])
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return months
+
+
+class ResultCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Lookups run on threadpool workers too
+        self._lock = threading.Lock()
+
+    def _key(self, user_id, name, args, scopes):
+        tokens = self.backend.tokens([f"rc:gen:{user_id}:{scope}" for scope in scopes])
+        digest = hashlib.sha1(repr((args, tokens)).encode()).hexdigest()
+        return f"rc:{user_id}:{name}:{digest}"
+
+    def lookup(self, user_id, name, args, scopes):
+        """Return (key, value), with value MISS when the result has to be computed and stored under key"""
+        key = self._key(user_id, name, args, scopes)
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            return key, MISS
+        return key, pickle.loads(value)
+
+    def store(self, key, value):
+        self.backend.set(key, pickle.dumps(value))
+
+    def invalidate(self, user_id, expense_date):
+        """Forget every result of `user_id` that depends on the month of `expense_date`"""
+        if isinstance(expense_date, str):
+            expense_date = date.fromisoformat(expense_date)
+        month = expense_date.isoformat()[:7]
+        self.backend.bump([f"rc:gen:{user_id}:{month}", f"rc:gen:{user_id}:{ALL_MONTHS}"])
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            **self.backend.stats(),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Return the process-wide result cache selected by RESULT_CACHE_BACKEND, or None when it is off"""
+    global _cache
+    if _cache is None and RESULT_CACHE_BACKEND != "off":
+        with _cache_lock:
+            if _cache is None:
+                if RESULT_CACHE_BACKEND == "redis":
+                    backend = RedisBackend(RESULT_CACHE_URL, RESULT_CACHE_TTL)
+                else:
+                    backend = LocalBackend(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL)
+                _cache = ResultCache(backend)
+                logger.info("Result cache created: backend=%s, ttl=%ss", RESULT_CACHE_BACKEND, RESULT_CACHE_TTL)
+    return _cache
+
+
+def reset_result_cache():
+    """Drop the process-wide cache so the next call to get_result_cache() starts empty"""
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def is_shared():
+    """True when every worker reads and invalidates the same cache"""
+    cache = get_result_cache()
+    return cache is not None and cache.backend.shared
+
+
+async def _call(cache, func, *args):
+    if cache.backend.shared:
+        return await run_in_threadpool(func, *args)
+    return func(*args)
+
+
+def invalidate(user_id, expense_date):
+    """Called by the write paths once their transaction has committed"""
+    cache = get_result_cache()
+    if cache is not None:
+        cache.invalidate(user_id, expense_date)
+
+
+async def invalidate_async(user_id, expense_date):
+    """invalidate() for the async write paths, off the event loop when the backend blocks"""
+    cache = get_result_cache()
+    if cache is not None:
+        await _call(cache, cache.invalidate, user_id, expense_date)
+
+
+async def cached(user_id, name, args, scopes, load):
+    """Serve `name(*args)` for a user from the cache, awaiting `load()` and storing its result on a miss"""
+    cache = get_result_cache()
+    if cache is None:
+        return await load()
+    key, value = await _call(cache, cache.lookup, user_id, name, args, scopes)
+    if value is MISS:
+        value = await load()
+        await _call(cache, cache.store, key, value)
+    return value
@@ -1,16 +1,111 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from datetime import date
-from backend import db_helper, auth_helper
-from typing import List, Optional
-from pydantic import BaseModel
+import codecs
+import csv
+import importlib.util
+import io
+import json
+import os
+import zlib
+from itertools import islice
+from backend import db_helper, auth_helper, db_pool, async_db_helper, migrations, result_cache
+from backend.async_db_helper import ThreadedHelper
+from backend.metrics import METRICS_ENABLED, Metrics, MetricsMiddleware, render_stats
+from backend.query_stats import QueryStatsMiddleware
+from backend.storage import get_storage
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, TypeAdapter, ValidationError, model_validator
+
+MAX_PAGE_SIZE = 1000
+# Updates plus deletes accepted by one POST /expenses/batch
+MAX_BATCH_OPERATIONS = 500
+# Largest body accepted by POST /expenses/bulk
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(4 * 1024 * 1024)))
+
+# Rows committed per transaction by POST /expenses/import
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Row-level errors listed in an import response; any beyond that are only counted
+MAX_IMPORT_ERRORS = 100
+# Rows read off the database cursor and encoded at a time by GET /expenses/export and
+# GET /expenses/?stream=true, each batch going out as one chunk
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_COLUMNS = ["id", "expense_date", "amount", "category", "notes", "payload"]
+
+# Read responses are per user and change with any write, so browsers and proxies
+# may keep them but must revalidate them with If-None-Match every time
+READ_CACHE_CONTROL = "private, no-cache"
+
+# "sync" runs the blocking helpers in the threadpool, "async" uses the aiomysql data-access layer
+API_MODE = os.getenv("API_MODE", "sync")
+if API_MODE == "async" and get_storage().name != "mysql":
+    API_MODE = "sync"
+if API_MODE == "async":
+    db = auth = async_db_helper
+else:
+    db, auth = ThreadedHelper(db_helper), ThreadedHelper(auth_helper)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Both modes read the same schema, and the async pool never goes through db_pool
+    if migrations.AUTO_MIGRATE:
+        await run_in_threadpool(migrations.upgrade, get_storage())
+    yield
+    if API_MODE == "async":
+        await async_db_helper.close_pool()
+    else:
+        # Closes the pool only if a request created one
+        db_pool.reset_pool()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+metrics = Metrics()
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+# Added last so it runs outermost and the metrics see each request's query counts
+app.add_middleware(QueryStatsMiddleware)
 
 
 class Expense(BaseModel):
-    amount: float
-    category: str
-    notes: str
+    # Encrypted clients send the amount as ciphertext, plain ones as a number.
+    # Envelope-format clients leave the three fields empty and send one `payload`.
+    amount: Union[float, str] = ""
+    category: str = ""
+    notes: str = ""
+    payload: Optional[str] = None
+
+    @model_validator(mode="after")
+    def require_payload_or_fields(self):
+        legacy_fields = {"amount", "category", "notes"}
+        if not self.payload and (not legacy_fields <= self.model_fields_set or self.amount == "" or not self.category):
+            raise ValueError("Expected either a payload or all of amount, category and notes")
+        return self
+
+
+class ImportedExpense(Expense):
+    expense_date: date
+
+
+class ExpenseUpdate(Expense):
+    id: int
+
+
+class ExpenseBatch(BaseModel):
+    updates: List[ExpenseUpdate] = []
+    deletes: List[int] = []
+
+
+ExpensesByDate = TypeAdapter(Dict[date, List[Expense]])
+
+
+class Rollup(BaseModel):
+    # Client-encrypted totals for one month and the month's generation they were built from
+    payload: str
+    generation: int
 
 
 class DateRange(BaseModel):
@@ -29,7 +124,7 @@ class UserLogin(BaseModel):
 
 
 # Enhanced user_id extraction with validation
-def get_user_id(user_id: Optional[str] = Header(None, alias="user-id")):
+async def get_user_id(user_id: Optional[str] = Header(None, alias="user-id")):
     """Extract and validate user_id from header"""
     if not user_id:
         raise HTTPException(status_code=401, detail="Authentication required. Please log in.")
@@ -43,16 +138,46 @@ def get_user_id(user_id: Optional[str] = Header(None, alias="user-id")):
         raise HTTPException(status_code=401, detail="Invalid authentication token.")
 
 
+def etag_matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+async def conditional_read(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    user_id: int = Depends(get_user_id)
+):
+    """Answer 304 when the client's copy is still current, otherwise tag the response.
+
+    The ETag is the user's data version, which every expense write bumps, so a
+    revalidation costs at most one primary-key lookup on users and never reads expenses.
+    Returns the caching headers for endpoints that build their own Response.
+    """
+    # A per-process cache misses other workers' writes, which would answer 304 to stale copies
+    if result_cache.is_shared():
+        version = await result_cache.cached(user_id, "fetch_data_version", (), [result_cache.ALL_MONTHS],
+                                            lambda: db.fetch_data_version(user_id))
+    else:
+        version = await db.fetch_data_version(user_id)
+    headers = {"ETag": f'"{user_id}-{version}"', "Cache-Control": READ_CACHE_CONTROL, "Vary": "user-id"}
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return headers
+
+
 # Public endpoints (no authentication required)
 @app.post("/register")
-def register(user: UserCreate):
+async def register(user: UserCreate):
     """Register a new user"""
     if len(user.username) < 3:
         raise HTTPException(status_code=400, detail="Username must be at least 3 characters long")
     if len(user.password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters long")
 
-    result = auth_helper.create_user(user.username, user.password)
+    result = await auth.create_user(user.username, user.password)
     if result["success"]:
         return {"message": result["message"]}
     else:
@@ -60,9 +185,9 @@ def register(user: UserCreate):
 
 
 @app.post("/login")
-def login(user: UserLogin):
+async def login(user: UserLogin):
     """Authenticate user and return user credentials"""
-    result = auth_helper.verify_user(user.username, user.password)
+    result = await auth.verify_user(user.username, user.password)
     if result["success"]:
         return {"user_id": result["user_id"], "username": result["username"]}
     else:
@@ -70,32 +195,384 @@ def login(user: UserLogin):
 
 
 # Protected endpoints (require authentication)
-@app.get("/expenses/{expense_date}", response_model=List[Expense])
-def get_expense(expense_date: date, user_id: int = Depends(get_user_id)):
+# Declared before /expenses/{expense_date} so "version", "changes", "import", "bulk", "batch" and
+# "export" aren't parsed as dates
+@app.get("/expenses/version")
+async def get_data_version(user_id: int = Depends(get_user_id)):
+    """The user's data version, which every expense write bumps - USER ISOLATED
+
+    Lets clients key their caches on the server's state, so writes made from
+    another session, device or the import CLI are noticed.
+    """
+    return {"version": await db.fetch_data_version(user_id)}
+
+
+@app.get("/expenses/changes")
+async def get_expense_changes(since: int = Query(0, ge=0), user_id: int = Depends(get_user_id)):
+    """Expenses inserted or updated and ids deleted after change version `since` - USER ISOLATED
+
+    Returns {"version", "upserts", "deletes"}; pass `version` as the next `since`.
+    since=0 returns the whole history.
+    """
+    return await db.fetch_changes(since, user_id)
+
+
+async def body_lines(request):
+    """Lines of the request body, decoded as they arrive so the body is never held whole"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def numbered_lines(lines):
+    """(line number, line) for every non-blank line"""
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if line.strip():
+            yield line_number, line
+
+
+async def csv_records(lines):
+    """(first line number, raw lines) per CSV record; a quoted field may span several lines"""
+    record, quotes = [], 0
+    async for line_number, line in numbered_lines(lines):
+        if not record:
+            first_line = line_number
+        record.append(line + "\n")
+        # Quotes balance at the end of a record; an escaped quote ("") counts twice
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield first_line, record
+            record, quotes = [], 0
+    if record:
+        yield first_line, record
+
+
+def describe_import_error(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+@app.post("/expenses/import")
+async def import_expenses(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    user_id: int = Depends(get_user_id)
+):
+    """Add encrypted expenses across many dates from a CSV or NDJSON body - USER ISOLATED
+
+    Each row carries `expense_date` plus the ciphertext fields of an Expense; CSV
+    bodies start with a header naming those columns. The format comes from
+    `format`, else from the Content-Type. Rows are committed every
+    IMPORT_CHUNK_SIZE rows with multi-row inserts. Rows that don't parse are
+    skipped and reported by line number (a CSV record's first line); nothing
+    already in the account is replaced. Progress is reported once, in the
+    summary response; on a storage failure the 500's detail says how many rows
+    were committed and at which line the import stopped.
+    """
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+
+    imported, chunks, failed, errors = 0, 0, 0, []
+    chunk, header, line_number = [], None, 0
+    records = csv_records(body_lines(request)) if format == "csv" else numbered_lines(body_lines(request))
+
+    async def commit():
+        nonlocal imported, chunks
+        try:
+            imported += await db.import_expenses(chunk, user_id)
+        except Exception:
+            # Earlier chunks are committed; tell the client where to resume
+            raise HTTPException(status_code=500, detail={
+                "message": "Failed to store imported expenses.", "imported": imported, "line": line_number})
+        chunks += 1
+        chunk.clear()
+
+    async for line_number, record in records:
+        try:
+            if format == "ndjson":
+                row = json.loads(record)
+            elif header is None:
+                header = next(csv.reader(record))
+                continue
+            else:
+                row = dict(zip(header, next(csv.reader(record))))
+            chunk.append(ImportedExpense.model_validate(row).model_dump())
+        except (ValueError, csv.Error) as e:
+            failed += 1
+            if len(errors) < MAX_IMPORT_ERRORS:
+                errors.append({"line": line_number, "error": describe_import_error(e)})
+            continue
+        if len(chunk) == IMPORT_CHUNK_SIZE:
+            await commit()
+    if chunk:
+        await commit()
+
+    return {"imported": imported, "chunks": chunks, "failed": failed, "errors": errors}
+
+
+async def read_body(request, max_bytes):
+    """The request body, refused with 413 as soon as it turns out larger than max_bytes"""
+    too_large = HTTPException(status_code=413, detail=f"Request body is larger than {max_bytes} bytes.")
+    if request.headers.get("content-length", "").isdigit() and int(request.headers["content-length"]) > max_bytes:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > max_bytes:
+            raise too_large
+    return bytes(body)
+
+
+@app.post("/expenses/bulk")
+async def replace_expenses_bulk(request: Request, user_id: int = Depends(get_user_id)):
+    """Replace the expenses of many dates at once - USER ISOLATED
+
+    The body maps dates to expense lists, e.g. {"2024-08-01": [...], "2024-08-02": []},
+    and is applied like one POST /expenses/{expense_date} per date but in a single
+    transaction. Bodies over BULK_MAX_BYTES are refused with 413.
+    """
+    try:
+        expenses_by_date = ExpensesByDate.validate_json(await read_body(request, BULK_MAX_BYTES))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    await db.replace_expenses_for_dates(
+        {expense_date: [expense.model_dump() for expense in expenses]
+         for expense_date, expenses in expenses_by_date.items()}, user_id)
+    return {"message": "Expenses updated successfully", "dates": len(expenses_by_date),
+            "rows": sum(len(expenses) for expenses in expenses_by_date.values())}
+
+
+@app.post("/expenses/batch")
+async def apply_expense_batch(batch: ExpenseBatch, user_id: int = Depends(get_user_id)):
+    """Apply edits and deletes by id in one transaction - USER ISOLATED
+
+    Returns the status of every operation in request order: "ok", or "not_found"
+    for ids the user doesn't own, which are skipped while the rest still apply.
+    """
+    ids = [update.id for update in batch.updates] + batch.deletes
+    if len(ids) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch.")
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Each expense id may appear only once per batch.")
+
+    found = await db.apply_expense_batch([update.model_dump() for update in batch.updates], batch.deletes, user_id)
+    return {
+        "updates": [{"id": update.id, "status": "ok" if update.id in found else "not_found"}
+                    for update in batch.updates],
+        "deletes": [{"id": expense_id, "status": "ok" if expense_id in found else "not_found"}
+                    for expense_id in batch.deletes],
+    }
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def expense_batches(user_id):
+    """The user's rows newest first, EXPORT_BATCH_SIZE at a time, read off this API_MODE's own cursor"""
+    if API_MODE == "async":
+        return async_db_helper.iter_expense_batches(user_id, EXPORT_BATCH_SIZE)
+    return iterate_in_threadpool(batched(db_helper.iter_all_expenses(user_id, EXPORT_BATCH_SIZE), EXPORT_BATCH_SIZE))
+
+
+class CsvEncoder:
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def encode(self, batch):
+        self.writer.writerows([row[column] for column in EXPORT_COLUMNS] for row in batch)
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def finish(self):
+        return self.buffer.getvalue()
+
+
+class NdjsonEncoder:
+    def encode(self, batch):
+        return "".join(json.dumps(row, default=str) + "\n" for row in batch)
+
+    def finish(self):
+        return ""
+
+
+class ChunkSink:
+    """Write-only file for ParquetWriter that hands over what was written since the last drain()"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        # The writer records page offsets from tell(), so it counts everything ever written
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetEncoder:
+    """One row group per batch, so only one batch is ever held in memory"""
+
+    def __init__(self):
+        import pyarrow as pa  # Optional dependency, only needed for format=parquet
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([("id", pa.int64()), ("expense_date", pa.date32()), ("amount", pa.string()),
+                                 ("category", pa.string()), ("notes", pa.string()), ("payload", pa.string())])
+        self.sink = ChunkSink()
+        self.writer = pq.ParquetWriter(self.sink, self.schema)
+
+    def encode(self, batch):
+        pa = self.pa
+        self.writer.write_table(pa.table({
+            "id": pa.array([row["id"] for row in batch], pa.int64()),
+            "expense_date": pa.array([str(row["expense_date"]) for row in batch]).cast(pa.date32()),
+            **{column: pa.array([row[column] for row in batch], pa.string())
+               for column in ("amount", "category", "notes", "payload")},
+        }, schema=self.schema))
+        return self.sink.drain()
+
+    def finish(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+class GzipEncoder:
+    """Gzips what another encoder produces, batch by batch"""
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def _compress(self, chunk):
+        return self.compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+
+    def encode(self, batch):
+        return self._compress(self.encoder.encode(batch))
+
+    def finish(self):
+        return self._compress(self.encoder.finish()) + self.compressor.flush()
+
+
+async def encode_stream(encoder, batches):
+    """Response chunks of `encoder` over async `batches`, each batch encoded in the threadpool off the event loop"""
+    async for batch in batches:
+        data = await run_in_threadpool(encoder.encode, batch)
+        if data:
+            yield data
+    data = encoder.finish()
+    if data:
+        yield data
+
+
+EXPORT_FORMATS = {
+    "csv": (CsvEncoder, "text/csv"),
+    "ndjson": (NdjsonEncoder, "application/x-ndjson"),
+    "parquet": (ParquetEncoder, "application/vnd.apache.parquet"),
+}
+
+
+def accepts_gzip(accept_encoding):
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip() in ("gzip", "*") and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return True
+    return False
+
+
+@app.get("/expenses/export")
+async def export_expenses(
+    format: str = Query("ndjson", pattern="^(csv|ndjson|parquet)$"),
+    accept_encoding: Optional[str] = Header(None),
+    user_id: int = Depends(get_user_id)
+):
+    """Download the user's whole history as CSV, NDJSON or Parquet - USER ISOLATED
+
+    Rows stay encrypted and come newest first. They are read off the database
+    cursor EXPORT_BATCH_SIZE at a time and encoded batch by batch, so memory
+    doesn't grow with the size of the history. CSV and NDJSON are gzipped for
+    clients that accept it; Parquet is compressed per page already.
+    """
+    if format == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed on the server.")
+    encoder_class, media_type = EXPORT_FORMATS[format]
+    encoder = encoder_class()
+    headers = {"Content-Disposition": f'attachment; filename="expenses.{format}"',
+               "Cache-Control": "private, no-store", "Vary": "user-id, Accept-Encoding"}
+    if format != "parquet" and accepts_gzip(accept_encoding):
+        encoder = GzipEncoder(encoder)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(encode_stream(encoder, expense_batches(user_id)), media_type=media_type, headers=headers)
+
+
+@app.get("/expenses/{expense_date}", response_model=List[Expense], dependencies=[Depends(conditional_read)])
+async def get_expense(expense_date: date, user_id: int = Depends(get_user_id)):
     """Get expenses for a specific date - USER ISOLATED"""
-    expenses = db_helper.fetch_expenses_for_date(expense_date, user_id)
+    expenses = await result_cache.cached(user_id, "fetch_expenses_for_date", (expense_date,),
+                                         result_cache.month_scopes(expense_date, expense_date),
+                                         lambda: db.fetch_expenses_for_date(expense_date, user_id))
     if expenses is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expenses from the database.")
     return expenses
 
 
 @app.post("/expenses/{expense_date}")
-def add_or_update_expense(expense_date: date, expenses: List[Expense], user_id: int = Depends(get_user_id)):
+async def add_or_update_expense(expense_date: date, expenses: List[Expense], user_id: int = Depends(get_user_id)):
     """Add or update expenses - USER ISOLATED"""
-    # Delete only THIS user's expenses for this date
-    db_helper.delete_expense_for_date(expense_date, user_id)
-
-    # Insert expenses only for THIS user
-    for expense in expenses:
-        db_helper.insert_expense(expense_date, expense.amount, expense.category, expense.notes, user_id)
+    # Replace only THIS user's expenses for this date, atomically
+    await db.replace_expenses_for_date(expense_date, [expense.model_dump() for expense in expenses], user_id)
 
     return {"message": "Expenses updated successfully"}
 
 
 @app.post("/analytics/")
-def get_analytics(date_range: DateRange, user_id: int = Depends(get_user_id)):
+async def get_analytics(date_range: DateRange, user_id: int = Depends(get_user_id)):
     """Get expense analytics by category - USER ISOLATED"""
-    data = db_helper.fetch_expense_summary(date_range.start_date, date_range.end_date, user_id)
+    return await category_analytics(date_range.start_date, date_range.end_date, user_id)
+
+
+@app.get("/analytics/", dependencies=[Depends(conditional_read)])
+async def get_analytics_conditional(start_date: date, end_date: date, user_id: int = Depends(get_user_id)):
+    """GET form of POST /analytics/ that supports If-None-Match - USER ISOLATED"""
+    return await category_analytics(start_date, end_date, user_id)
+
+
+async def category_analytics(start_date, end_date, user_id):
+    data = await result_cache.cached(user_id, "fetch_expense_summary", (start_date, end_date),
+                                     result_cache.month_scopes(start_date, end_date),
+                                     lambda: db.fetch_expense_summary(start_date, end_date, user_id))
     if data is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expense summary from the database")
 
@@ -116,9 +593,21 @@ def get_analytics(date_range: DateRange, user_id: int = Depends(get_user_id)):
 
 
 @app.post("/analytics_month/")
-def get_analytics_month(year: int, user_id: int = Depends(get_user_id)):
+async def get_analytics_month(year: int, user_id: int = Depends(get_user_id)):
     """Get monthly expense analytics - USER ISOLATED"""
-    data = db_helper.fetch_monthly_expense_summary(year, user_id)
+    return await monthly_analytics(year, user_id)
+
+
+@app.get("/analytics_month/", dependencies=[Depends(conditional_read)])
+async def get_analytics_month_conditional(year: int, user_id: int = Depends(get_user_id)):
+    """GET form of POST /analytics_month/ that supports If-None-Match - USER ISOLATED"""
+    return await monthly_analytics(year, user_id)
+
+
+async def monthly_analytics(year, user_id):
+    data = await result_cache.cached(user_id, "fetch_monthly_expense_summary", (year,),
+                                     result_cache.month_scopes(date(year, 1, 1), date(year, 12, 31)),
+                                     lambda: db.fetch_monthly_expense_summary(year, user_id))
     if data is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve monthly expense summary from the database")
 
@@ -133,31 +622,146 @@ def get_analytics_month(year: int, user_id: int = Depends(get_user_id)):
     return monthly_data
 
 
+def encode_page_cursor(row):
+    """Opaque keyset cursor pointing just past `row`"""
+    return f"{row['expense_date']}_{row['id']}"
+
+
+def decode_page_cursor(after):
+    try:
+        after_date, after_id = after.split("_")
+        return date.fromisoformat(after_date), int(after_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor.")
+
+
 @app.get("/expenses/")
-def get_all_expenses(user_id: int = Depends(get_user_id)):
-    """Get all expenses for the authenticated user - USER ISOLATED"""
-    expenses = db_helper.fetch_all_expenses_with_id(user_id)
+async def get_all_expenses(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user_id: int = Depends(get_user_id),
+    cache_headers: dict = Depends(conditional_read)
+):
+    """Get all expenses for the authenticated user - USER ISOLATED
+
+    With `limit`/`after` this returns one keyset page (newest first) and sets the
+    `X-Next-After` header when more rows follow. With `stream=true` the whole
+    history is streamed as NDJSON straight off the database cursor, one chunk
+    per EXPORT_BATCH_SIZE rows. With
+    `start_date` and `end_date` only that (inclusive) range is returned.
+    """
+    if start_date is not None or end_date is not None:
+        if start_date is None or end_date is None:
+            raise HTTPException(status_code=400, detail="Both start_date and end_date are required.")
+        return await db.fetch_expenses_between(start_date, end_date, user_id)
+
+    if stream:
+        return StreamingResponse(encode_stream(NdjsonEncoder(), expense_batches(user_id)),
+                                 media_type="application/x-ndjson", headers=cache_headers)
+
+    if limit is not None or after is not None:
+        limit = limit or MAX_PAGE_SIZE
+        after_key = decode_page_cursor(after) if after else None
+        expenses = await db.fetch_expenses_page(user_id, limit, after_key)
+        if len(expenses) == limit:
+            response.headers["X-Next-After"] = encode_page_cursor(expenses[-1])
+        return expenses
+
+    expenses = await db.fetch_all_expenses_with_id(user_id)
     if expenses is None:
         raise HTTPException(status_code=500, detail="Failed to retrieve expenses from the database.")
     return expenses
 
 
 @app.delete("/expenses/{expense_id}")
-def delete_expense(expense_id: int, user_id: int = Depends(get_user_id)):
+async def delete_expense(expense_id: int, user_id: int = Depends(get_user_id)):
     """Delete a specific expense - USER ISOLATED (prevents deleting other users' expenses)"""
-    db_helper.delete_expense_by_id(expense_id, user_id)
+    await db.delete_expense_by_id(expense_id, user_id)
     return {"message": "Expense deleted successfully"}
 
 
 @app.put("/expenses/{expense_id}")
-def update_expense(expense_id: int, expense: Expense, user_id: int = Depends(get_user_id)):
+async def update_expense(expense_id: int, expense: Expense, user_id: int = Depends(get_user_id)):
     """Update a specific expense - USER ISOLATED (prevents updating other users' expenses)"""
-    db_helper.update_expense_by_id(expense_id, expense.amount, expense.category, expense.notes, user_id)
+    await db.update_expense_by_id(expense_id, expense.amount, expense.category, expense.notes, user_id,
+                                  expense.payload)
     return {"message": "Expense updated successfully"}
 
 
+def rollup_months(year, start_date, end_date):
+    """First and last month a rollup request covers, as first days of months"""
+    if year is not None:
+        return date(year, 1, 1), date(year, 12, 1)
+    if start_date is None or end_date is None:
+        raise HTTPException(status_code=400, detail="Pass either year or both start_date and end_date.")
+    return start_date.replace(day=1), end_date.replace(day=1)
+
+
+@app.get("/rollups/")
+async def get_rollups(
+    year: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user_id: int = Depends(get_user_id)
+):
+    """Encrypted per-month rollups for a year or a date range - USER ISOLATED
+
+    Only months that have had expenses are listed. A rollup is `stale` (or has no
+    payload yet) when expenses were written after it was built; the client rebuilds
+    it from that month's expenses and stores it back with PUT /rollups/{month}.
+    """
+    start_month, end_month = rollup_months(year, start_date, end_date)
+    rollups = await db.fetch_rollups(start_month, end_month, user_id)
+    for rollup in rollups:
+        rollup["stale"] = rollup["payload"] is None or rollup["built_generation"] < rollup["generation"]
+    return rollups
+
+
+@app.put("/rollups/{month}")
+async def put_rollup(month: date, rollup: Rollup, user_id: int = Depends(get_user_id)):
+    """Store the encrypted rollup for the month containing `month` - USER ISOLATED"""
+    stored = await db.store_rollup(month.replace(day=1), rollup.payload, rollup.generation, user_id)
+    if not stored:
+        raise HTTPException(status_code=409, detail="A newer rollup is already stored, or the month has no expenses.")
+    return {"message": "Rollup stored successfully"}
+
+
 # Health check endpoint
 @app.get("/")
-def root():
+async def root():
     """API health check"""
-    return {"message": "Expense Tracker API is running", "status": "healthy"}
\ No newline at end of file
+    return {"message": "Expense Tracker API is running", "status": "healthy"}
+
+
+def pool_stats():
+    if API_MODE == "async":
+        return async_db_helper.pool_stats()
+    return db_pool.pool_stats()
+
+
+@app.get("/stats/pool")
+async def get_pool_stats():
+    """Database connection pool statistics"""
+    return pool_stats()
+
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """Result cache hit ratio and size"""
+    cache = result_cache.get_result_cache()
+    return cache.stats() if cache else {"backend": "off"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Request, connection pool and result cache metrics in the Prometheus text format"""
+    lines = metrics.render()
+    lines += render_stats("db_pool", pool_stats(), counters={"checkouts", "timeouts", "discarded"})
+    cache = result_cache.get_result_cache()
+    if cache:
+        lines += render_stats("result_cache", cache.stats(), counters={"hits", "misses", "evictions"})
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,227 @@
+"""Storage engines the helpers can run on.
+
+db_helper and auth_helper write plain SQL with %s placeholders and go through
+db_pool.get_db_cursor. The engine picked by DB_BACKEND supplies connections,
+dictionary cursors, transaction start, query plans and the few SQL fragments
+that differ between dialects. The schema itself lives in backend/migrations.py.
+"""
+import os
+import sqlite3
+from datetime import date
+import mysql.connector
+
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")
+
+# Either engine's duplicate-key error, for callers that need to tell it apart
+IntegrityError = (mysql.connector.IntegrityError, sqlite3.IntegrityError)
+
+
+class PreparedCursor:
+    """Dictionary cursor that keeps one prepared statement per SQL string alive on its connection"""
+
+    def __init__(self, connection, statements, max_statements):
+        self._connection = connection
+        self._statements = statements
+        self._max_statements = max_statements
+        self._current = None
+
+    def _cursor_for(self, operation):
+        cursor = self._statements.pop(operation, None)
+        if cursor is None:
+            cursor = self._connection.cursor(prepared=True, dictionary=True)
+        self._statements[operation] = cursor
+        while len(self._statements) > self._max_statements:
+            _, evicted = self._statements.popitem(last=False)
+            evicted.close()
+        return cursor
+
+    def execute(self, operation, params=()):
+        self._current = self._cursor_for(operation)
+        return self._current.execute(operation, params)
+
+    def executemany(self, operation, seq_params):
+        self._current = self._cursor_for(operation)
+        return self._current.executemany(operation, seq_params)
+
+    def fetchone(self):
+        return self._current.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._current.fetchmany(size)
+
+    def fetchall(self):
+        return self._current.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._current.rowcount if self._current else -1
+
+    @property
+    def lastrowid(self):
+        return self._current.lastrowid if self._current else None
+
+    def close(self):
+        # Prepared cursors live as long as their connection so the next checkout can reuse them
+        self._current = None
+
+
+class MySQLStorage:
+    name = "mysql"
+
+    def connect(self):
+        connection = mysql.connector.connect(
+            host=os.getenv("DB_HOST", "localhost"),
+            user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD"),
+            database=os.getenv("DB_NAME", "expense_manager")
+        )
+        # Reads run outside a transaction; get_db_cursor(commit=True) opens one explicitly
+        connection.autocommit = True
+        return connection
+
+    def is_healthy(self, connection):
+        return connection.is_connected()
+
+    def dict_cursor(self, connection):
+        return connection.cursor(dictionary=True)
+
+    def cursor(self, pooled, prepared=False, max_statements=32):
+        if prepared:
+            return PreparedCursor(pooled.connection, pooled.statements, max_statements)
+        return self.dict_cursor(pooled.connection)
+
+    def begin(self, connection):
+        connection.start_transaction()
+
+    def month_expr(self, column):
+        return f"MONTH({column})"
+
+    def on_conflict_update(self, keys):
+        """Upsert clause; follow it with the column assignments for an existing row"""
+        return "ON DUPLICATE KEY UPDATE"
+
+    def full_scans(self, cursor, operation, params=()):
+        """Tables the statement would read with a full table scan, according to EXPLAIN"""
+        cursor.execute(f"EXPLAIN {operation}", params)
+        return [row["table"] for row in cursor.fetchall() if row["type"] == "ALL"]
+
+
+class SQLiteCursor:
+    """Wraps a sqlite3 cursor so callers can keep using %s placeholders"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=()):
+        return self._cursor.execute(operation.replace("%s", "?"), tuple(params))
+
+    def executemany(self, operation, seq_params):
+        return self._cursor.executemany(operation.replace("%s", "?"), [tuple(p) for p in seq_params])
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def close(self):
+        self._cursor.close()
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+class SQLiteStorage:
+    """Embedded engine for small deployments and tests, one database file in WAL mode"""
+
+    name = "sqlite"
+
+    def __init__(self, path=None, statement_cache_size=32):
+        self.path = path or os.getenv("SQLITE_PATH", "expense_manager.db")
+        self.statement_cache_size = statement_cache_size
+
+    def connect(self):
+        connection = sqlite3.connect(
+            self.path,
+            # Pooled connections are handed to whichever worker thread checks them out
+            check_same_thread=False,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=self.statement_cache_size,
+            # Autocommit; get_db_cursor(commit=True) opens a transaction explicitly
+            isolation_level=None,
+        )
+        connection.row_factory = _dict_row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.execute("PRAGMA busy_timeout=5000")
+        connection.execute("PRAGMA cache_size=-20000")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        return connection
+
+    def is_healthy(self, connection):
+        try:
+            connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def dict_cursor(self, connection):
+        return SQLiteCursor(connection.cursor())
+
+    def cursor(self, pooled, prepared=False, max_statements=32):
+        # sqlite3 already keeps a per-connection statement cache
+        return self.dict_cursor(pooled.connection)
+
+    def begin(self, connection):
+        # Take the write lock up front so concurrent writers queue instead of deadlocking
+        connection.execute("BEGIN IMMEDIATE")
+
+    def month_expr(self, column):
+        return f"CAST(strftime('%m', {column}) AS INTEGER)"
+
+    def on_conflict_update(self, keys):
+        """Upsert clause; follow it with the column assignments for an existing row"""
+        return f"ON CONFLICT ({keys}) DO UPDATE SET"
+
+    def full_scans(self, cursor, operation, params=()):
+        """Tables the statement would read with a full table scan, according to EXPLAIN QUERY PLAN"""
+        cursor.execute(f"EXPLAIN QUERY PLAN {operation}", params)
+        # "SCAN t USING [COVERING] INDEX" walks a whole index, which is just as unbounded
+        return [row["detail"].split()[1] for row in cursor.fetchall() if row["detail"].startswith("SCAN ")]
+
+
+STORAGE_ENGINES = {"mysql": MySQLStorage, "sqlite": SQLiteStorage}
+
+_storage = None
+
+
+def get_storage():
+    """Return the storage engine selected by DB_BACKEND"""
+    global _storage
+    if _storage is None:
+        if DB_BACKEND not in STORAGE_ENGINES:
+            raise ValueError(f"Unknown DB_BACKEND '{DB_BACKEND}', expected one of {sorted(STORAGE_ENGINES)}")
+        _storage = STORAGE_ENGINES[DB_BACKEND]()
+    return _storage
+
+
+def set_storage(storage):
+    """Swap the active engine, e.g. for tests; pass None to go back to DB_BACKEND"""
+    global _storage
+    _storage = storage
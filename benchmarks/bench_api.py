@@ -0,0 +1,278 @@
+"""Latency, throughput and query counts of every API endpoint, checked against a baseline.
+
+Runs backend.server:app in-process over ASGI against a throwaway SQLite database
+seeded with BENCH_USERS users of BENCH_ROWS expenses each, spread over
+BENCH_SPAN_DAYS. Every endpoint is driven by N concurrent clients for each
+concurrency level and gets p50/p95/p99 latency, requests per second and
+database queries per request:
+
+    python -m benchmarks.bench_api --concurrency 1,10,50 --output results.json
+    python -m benchmarks.bench_api --save-baseline     # record benchmarks/baseline.json
+    python -m benchmarks.bench_api --threshold 0.25    # exit 1 on a >25% regression vs. the baseline
+
+Baselines are only comparable on the machine that recorded them.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+import httpx
+from backend import auth_helper, db_helper, db_pool, migrations, result_cache, storage
+from backend.server import app
+
+USERS = int(os.getenv("BENCH_USERS", "3"))
+ROWS = int(os.getenv("BENCH_ROWS", "10000"))
+SPAN_DAYS = int(os.getenv("BENCH_SPAN_DAYS", str(3 * 365)))
+FIRST_DAY = date(2021, 1, 1)
+PASSWORD = "bench_password"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Requests per endpoint used to count queries, run one at a time
+QUERY_SAMPLES = 5
+
+
+def fake_payload(rng):
+    """Random bytes the size of a real envelope (version, nonce, record, tag), base64-encoded"""
+    return base64.urlsafe_b64encode(rng.randbytes(1 + 12 + 14 + rng.randint(8, 60) + 16)).decode()
+
+
+def fake_rows(rng, count):
+    return [{"amount": "", "category": "", "notes": "", "payload": fake_payload(rng)} for _ in range(count)]
+
+
+def random_day(rng):
+    return FIRST_DAY + timedelta(days=rng.randrange(SPAN_DAYS))
+
+
+def seed_users():
+    rng = random.Random(0)
+    users = []
+    for index in range(USERS):
+        name = f"bench_api_{index}"
+        auth_helper.create_user(name, PASSWORD)
+        user_id = auth_helper.verify_user(name, PASSWORD)["user_id"]
+        for start in range(0, ROWS, 5000):
+            db_helper.import_expenses([{"expense_date": random_day(rng), **row}
+                                       for row in fake_rows(rng, min(5000, ROWS - start))], user_id)
+        users.append({"name": name, "id": user_id, "headers": {"user-id": str(user_id)},
+                      "expense_ids": [row["id"] for row in db_helper.iter_all_expenses(user_id)],
+                      "version": db_helper.fetch_data_version(user_id)})
+    return users
+
+
+def scenarios():
+    """name -> build(rng, user) returning (method, url, request kwargs, acceptable statuses)"""
+    ok = {200}
+
+    def import_body(rng):
+        return "".join(json.dumps({"expense_date": str(random_day(rng)), **row}) + "\n" for row in fake_rows(rng, 50))
+
+    return {
+        "GET /": lambda rng, user: ("GET", "/", {}, ok),
+        "POST /register": lambda rng, user: (
+            "POST", "/register", {"json": {"username": f"bench_{uuid.uuid4().hex}", "password": PASSWORD}}, ok),
+        "POST /login": lambda rng, user: (
+            "POST", "/login", {"json": {"username": user["name"], "password": PASSWORD}}, ok),
+        "GET /expenses/version": lambda rng, user: ("GET", "/expenses/version", {}, ok),
+        "GET /expenses/changes": lambda rng, user: (
+            "GET", "/expenses/changes", {"params": {"since": user["version"]}}, ok),
+        "POST /expenses/import": lambda rng, user: (
+            "POST", "/expenses/import", {"content": import_body(rng)}, ok),
+        "POST /expenses/bulk": lambda rng, user: (
+            "POST", "/expenses/bulk", {"json": {str(random_day(rng)): fake_rows(rng, 3) for _ in range(7)}}, ok),
+        "POST /expenses/batch": lambda rng, user: (
+            "POST", "/expenses/batch", {"json": {"updates": [
+                {"id": expense_id, "payload": fake_payload(rng)}
+                for expense_id in rng.sample(user["expense_ids"], 5)]}}, ok),
+        "GET /expenses/export": lambda rng, user: ("GET", "/expenses/export", {"params": {"format": "csv"}}, ok),
+        "GET /expenses/{date}": lambda rng, user: ("GET", f"/expenses/{random_day(rng)}", {}, ok),
+        "POST /expenses/{date}": lambda rng, user: (
+            "POST", f"/expenses/{random_day(rng)}", {"json": fake_rows(rng, 3)}, ok),
+        "POST /analytics/": lambda rng, user: (
+            "POST", "/analytics/", {"json": {"start_date": str(FIRST_DAY), "end_date": str(random_day(rng))}}, ok),
+        "GET /analytics/": lambda rng, user: (
+            "GET", "/analytics/", {"params": {"start_date": str(FIRST_DAY), "end_date": str(random_day(rng))}}, ok),
+        "POST /analytics_month/": lambda rng, user: (
+            "POST", "/analytics_month/", {"params": {"year": random_day(rng).year}}, ok),
+        "GET /analytics_month/": lambda rng, user: (
+            "GET", "/analytics_month/", {"params": {"year": random_day(rng).year}}, ok),
+        "GET /expenses/ (page)": lambda rng, user: ("GET", "/expenses/", {"params": {"limit": 100}}, ok),
+        "GET /expenses/ (month)": lambda rng, user: (
+            "GET", "/expenses/", {"params": {"start_date": str(random_day(rng).replace(day=1)),
+                                             "end_date": str(random_day(rng).replace(day=28))}}, ok),
+        "GET /expenses/ (all)": lambda rng, user: ("GET", "/expenses/", {}, ok),
+        "GET /expenses/ (stream)": lambda rng, user: ("GET", "/expenses/", {"params": {"stream": "true"}}, ok),
+        # Each request deletes a row nothing else picks again, so every one takes the delete path
+        "DELETE /expenses/{id}": lambda rng, user: ("DELETE", f"/expenses/{user['expense_ids'].pop()}", {}, ok),
+        "PUT /expenses/{id}": lambda rng, user: (
+            "PUT", f"/expenses/{rng.choice(user['expense_ids'])}", {"json": fake_rows(rng, 1)[0]}, ok),
+        "GET /rollups/": lambda rng, user: ("GET", "/rollups/", {"params": {"year": random_day(rng).year}}, ok),
+        # Generation 0 is always behind, so this measures the conflict path without changing any rollup
+        "PUT /rollups/{month}": lambda rng, user: (
+            "PUT", f"/rollups/{random_day(rng)}", {"json": {"payload": fake_payload(rng), "generation": 0}},
+            {200, 409}),
+        "GET /stats/pool": lambda rng, user: ("GET", "/stats/pool", {}, ok),
+        "GET /stats/cache": lambda rng, user: ("GET", "/stats/cache", {}, ok),
+    }
+
+
+class QueryCounter:
+    """Counts statements executed on SQLite cursors while installed"""
+
+    def __init__(self):
+        self.count = 0
+        self._original = storage.SQLiteCursor.execute
+
+    def __enter__(self):
+        counter = self
+
+        def execute(cursor, operation, params=()):
+            counter.count += 1
+            return counter._original(cursor, operation, params)
+
+        storage.SQLiteCursor.execute = execute
+        return self
+
+    def __exit__(self, *exc_info):
+        storage.SQLiteCursor.execute = self._original
+
+
+async def send(client, build, rng, users):
+    user = rng.choice(users)
+    method, url, kwargs, statuses = build(rng, user)
+    response = await client.request(method, url, headers=user["headers"], **kwargs)
+    if response.status_code not in statuses:
+        raise RuntimeError(f"{method} {url} answered {response.status_code}: {response.text[:200]}")
+
+
+async def count_queries(client, build, users):
+    rng = random.Random(1)
+    with QueryCounter() as counter:
+        for _ in range(QUERY_SAMPLES):
+            # Count the work behind a request, not a result cache hit
+            result_cache.reset_result_cache()
+            await send(client, build, rng, users)
+    return counter.count / QUERY_SAMPLES
+
+
+async def measure(client, build, users, concurrency, requests):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker(index):
+        rng = random.Random(index)
+        for _ in remaining:
+            start = time.perf_counter()
+            await send(client, build, rng, users)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    cuts = statistics.quantiles(latencies, n=100)
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "rps": requests / elapsed}
+
+
+async def run(users, concurrency_levels, requests, only):
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, build in scenarios().items():
+            if only and only not in name:
+                continue
+            results[name] = {"queries": await count_queries(client, build, users), "latency": {}}
+            for concurrency in concurrency_levels:
+                results[name]["latency"][str(concurrency)] = await measure(
+                    client, build, users, concurrency, max(requests, concurrency * 2))
+            print(format_row(name, results[name]), flush=True)
+    return results
+
+
+def format_row(name, result):
+    cells = [f"{name:<26} {result['queries']:>7.1f}"]
+    for concurrency, stats in result["latency"].items():
+        cells.append(f"c{concurrency}: {stats['p50']:.1f}/{stats['p95']:.1f}/{stats['p99']:.1f} ms "
+                     f"{stats['rps']:.0f} rps")
+    return "  ".join(cells)
+
+
+def find_regressions(results, baseline, threshold):
+    """Human-readable list of everything that got worse than `baseline` by more than `threshold`"""
+    regressions = []
+    for name, result in results["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is None:
+            continue
+        if result["queries"] > before["queries"] + 0.5:
+            regressions.append(f"{name}: {result['queries']:.1f} queries per request, was {before['queries']:.1f}")
+        for concurrency, stats in result["latency"].items():
+            old = before["latency"].get(concurrency)
+            if old is None:
+                continue
+            if stats["p95"] > old["p95"] * (1 + threshold):
+                regressions.append(f"{name} at c{concurrency}: p95 {stats['p95']:.1f} ms, was {old['p95']:.1f} ms")
+            if stats["rps"] < old["rps"] / (1 + threshold):
+                regressions.append(f"{name} at c{concurrency}: {stats['rps']:.0f} rps, was {old['rps']:.0f} rps")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,10,50", help="comma-separated client counts")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--only", help="run only endpoints whose name contains this")
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, as a fraction")
+    args = parser.parse_args(argv)
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.set_storage(storage.SQLiteStorage(os.path.join(tmp, "bench.db")))
+        migrations.upgrade(storage.get_storage())
+        db_pool.reset_pool()
+        result_cache.reset_result_cache()
+        try:
+            users = seed_users()
+            print(f"{'endpoint':<26} {'queries':>7}  p50/p95/p99 and throughput per concurrency level")
+            endpoints = asyncio.run(run(users, concurrency_levels, args.requests, args.only))
+        finally:
+            db_pool.reset_pool()
+            storage.set_storage(None)
+
+    results = {
+        "meta": {"users": USERS, "rows_per_user": ROWS, "span_days": SPAN_DAYS, "requests": args.requests,
+                 "python": platform.python_version(), "machine": platform.machine()},
+        "endpoints": endpoints,
+    }
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(results, out, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as out:
+            json.dump(results, out, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+    with open(args.baseline) as baseline_file:
+        regressions = find_regressions(results, json.load(baseline_file), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Scaling of encrypt_expenses / decrypt_expenses across workers and pool kinds.
+
+    python -m benchmarks.bench_bulk_crypto
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "frontend"))
+import encryption_helper  # noqa: E402
+from encryption_helper import decrypt_expenses, encrypt_expenses, get_encryption_key  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_ROWS", "50000"))
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    key = get_encryption_key("bench_password", "bench_user")
+    expenses = [{"amount": i % 500 + 0.5, "category": "Food", "notes": f"note {i}"} for i in range(ROWS)]
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    print(f"rows: {ROWS}, cpus: {os.cpu_count()}")
+    print(f"{'executor':>9} {'workers':>8} {'encrypt s':>10} {'decrypt s':>10} {'speedup':>8}")
+    for executor in ["process", "thread"]:
+        baseline = None
+        for workers in worker_counts:
+            # Cold caches and fresh pools so every run does the full crypto work
+            encryption_helper.shutdown_executors()
+            encryption_helper.decryption_cache.clear()
+            encrypted, encrypt_time = timed(encrypt_expenses, expenses, key, workers=workers, executor=executor)
+            # The pool is already warm from the encrypt run, so decrypt time excludes worker start-up
+            _, decrypt_time = timed(decrypt_expenses, encrypted, key, workers=workers, executor=executor)
+            baseline = baseline or encrypt_time + decrypt_time
+            speedup = baseline / (encrypt_time + decrypt_time)
+            print(f"{executor:>9} {workers:>8} {encrypt_time:>10.2f} {decrypt_time:>10.2f} {speedup:>7.2f}x")
+    encryption_helper.shutdown_executors()
+
+
+if __name__ == "__main__":
+    main()
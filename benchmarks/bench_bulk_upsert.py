@@ -0,0 +1,113 @@
+"""Back-filling a month: 30 POST /expenses/{date} calls vs. one POST /expenses/bulk.
+
+Times both through FastAPI's TestClient on the embedded SQLite engine, and on
+MySQL when the DB_* environment variables point at a reachable server. Set
+BENCH_API_URL to time a running server over real HTTP instead, round trips included:
+
+    python -m benchmarks.bench_bulk_upsert
+    BENCH_API_URL=http://localhost:8000 python -m benchmarks.bench_bulk_upsert
+"""
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+import requests
+from fastapi.testclient import TestClient
+from backend import auth_helper, db_pool, migrations, result_cache, storage
+from backend.server import app
+
+ROWS_PER_DAY = [1, 5, 20]
+DAYS = 30
+REPEATS = 10
+MONTH = date(1999, 6, 1)
+
+
+def month_of_rows(rows_per_day):
+    return {
+        str(MONTH + timedelta(days=day)): [{"amount": "ciphertext", "category": "ciphertext",
+                                            "notes": f"ciphertext {i}"} for i in range(rows_per_day)]
+        for day in range(DAYS)
+    }
+
+
+def per_date(client, headers, expenses_by_date):
+    for expense_date, expenses in expenses_by_date.items():
+        response = client.post(f"/expenses/{expense_date}", json=expenses, headers=headers)
+        assert response.status_code == 200, response.text
+
+
+def bulk(client, headers, expenses_by_date):
+    response = client.post("/expenses/bulk", json=expenses_by_date, headers=headers)
+    assert response.status_code == 200, response.text
+
+
+def time_ms(func, *args):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def compare(client, headers):
+    results = {}
+    for rows_per_day in ROWS_PER_DAY:
+        expenses_by_date = month_of_rows(rows_per_day)
+        results[rows_per_day] = (time_ms(per_date, client, headers, expenses_by_date),
+                                 time_ms(bulk, client, headers, expenses_by_date))
+    return results
+
+
+def bench_engine(engine):
+    storage.set_storage(engine)
+    migrations.upgrade(engine)
+    db_pool.reset_pool()
+    result_cache.reset_result_cache()
+    auth_helper.create_user("bench_bulk", "bench_password")
+    user_id = auth_helper.verify_user("bench_bulk", "bench_password")["user_id"]
+    results = compare(TestClient(app), {"user-id": str(user_id)})
+    db_pool.reset_pool()
+    storage.set_storage(None)
+    return results
+
+
+class LiveClient:
+    """requests.Session with TestClient's post(path, ...) signature"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def post(self, path, **kwargs):
+        return self.session.post(f"{self.base_url}{path}", **kwargs)
+
+
+def bench_live(base_url):
+    client = LiveClient(base_url)
+    client.post("/register", json={"username": "bench_bulk", "password": "bench_password"})
+    user_id = client.post("/login", json={"username": "bench_bulk", "password": "bench_password"}).json()["user_id"]
+    return compare(client, {"user-id": str(user_id)})
+
+
+def main():
+    engines = {}
+    if os.getenv("BENCH_API_URL"):
+        engines["live"] = bench_live(os.getenv("BENCH_API_URL"))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            engines["sqlite"] = bench_engine(storage.SQLiteStorage(os.path.join(tmp, "bench.db")))
+        try:
+            engines["mysql"] = bench_engine(storage.MySQLStorage())
+        except Exception as e:
+            print(f"Skipping MySQL: {e}")
+
+    print(f"{'engine':<8} {'rows/day':>8} {f'{DAYS} calls ms':>14} {'bulk ms':>10} {'speedup':>8}")
+    for name, results in engines.items():
+        for rows_per_day, (separate, together) in results.items():
+            print(f"{name:<8} {rows_per_day:>8} {separate:>14.2f} {together:>10.2f} {separate / together:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
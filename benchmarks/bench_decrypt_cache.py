@@ -0,0 +1,51 @@
+"""Per-row decrypt cost on a 50k-row history: fresh Fernet per field vs. shared cipher + LRU cache.
+
+    python -m benchmarks.bench_decrypt_cache
+"""
+import base64
+import os
+import sys
+import time
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "frontend"))
+from encryption_helper import decrypt_expense, decryption_cache, encrypt_expense, get_encryption_key  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_ROWS", "50000"))
+
+
+def decrypt_expense_uncached(expense, key):
+    """decrypt_expense as it was before: a new Fernet object per field and no cache"""
+    def decrypt(value):
+        return Fernet(key).decrypt(base64.urlsafe_b64decode(value.encode())).decode()
+
+    return {"amount": float(decrypt(expense["amount"])), "category": decrypt(expense["category"]),
+            "notes": decrypt(expense["notes"])}
+
+
+def per_row_us(func, rows, key):
+    start = time.perf_counter()
+    for row in rows:
+        func(row, key)
+    return (time.perf_counter() - start) / len(rows) * 1_000_000
+
+
+def main():
+    key = get_encryption_key("bench_password", "bench_user")
+    rows = [encrypt_expense({"amount": i % 500 + 0.5, "category": "Food", "notes": f"note {i}"}, key)
+            for i in range(ROWS)]
+
+    baseline = per_row_us(decrypt_expense_uncached, rows, key)
+    decryption_cache.clear()
+    cold = per_row_us(decrypt_expense, rows, key)
+    warm = per_row_us(decrypt_expense, rows, key)
+
+    print(f"rows: {ROWS}")
+    print(f"uncached (Fernet per field): {baseline:8.2f} us/row")
+    print(f"cold cache:                  {cold:8.2f} us/row")
+    print(f"warm cache:                  {warm:8.2f} us/row")
+    print(f"cache: {decryption_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Stored bytes per row and decode throughput: legacy three-token rows vs. the compact envelope.
+
+    python -m benchmarks.bench_envelope
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "frontend"))
+import encryption_helper  # noqa: E402
+from encryption_helper import decrypt_expense, encrypt_data, encrypt_envelope, get_encryption_key  # noqa: E402
+
+ROWS = int(os.getenv("BENCH_ROWS", "20000"))
+CATEGORIES = ["Rent", "Food", "Shopping", "Entertainment", "Other"]
+
+
+def make_expenses():
+    rng = random.Random(7)
+    return [{"amount": round(rng.uniform(1, 500), 2), "category": rng.choice(CATEGORIES),
+             "notes": "x" * rng.randint(0, 40)} for _ in range(ROWS)]
+
+
+def stored_bytes(row):
+    return sum(len(row[field] or "") for field in ("amount", "category", "notes", "payload"))
+
+
+def decode_rows_per_s(rows, key):
+    encryption_helper.decryption_cache.clear()
+    start = time.perf_counter()
+    for row in rows:
+        decrypt_expense(row, key)
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main():
+    key = get_encryption_key("bench_password", "bench_user")
+    expenses = make_expenses()
+    legacy = [{"amount": encrypt_data(str(e["amount"]), key), "category": encrypt_data(e["category"], key),
+               "notes": encrypt_data(e["notes"], key), "payload": None} for e in expenses]
+    envelope = [{"amount": "", "category": "", "notes": "", "payload": encrypt_envelope(e, key)} for e in expenses]
+
+    for name, rows in [("legacy", legacy), ("envelope", envelope)]:
+        column_bytes = sum(stored_bytes(row) for row in rows) / ROWS
+        wire_bytes = len(json.dumps(rows)) / ROWS
+        print(f"{name:>9}: {column_bytes:7.1f} stored B/row  {wire_bytes:7.1f} JSON B/row  "
+              f"{decode_rows_per_s(rows, key):9.0f} rows/s decoded (cold cache)")
+
+
+if __name__ == "__main__":
+    main()
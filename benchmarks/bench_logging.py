@@ -0,0 +1,64 @@
+"""What the backend's logging costs the thread serving a request.
+
+Times a db_helper-style fetch_* INFO line through setup_logger, and
+db_helper.fetch_expenses_for_date on SQLite (the work behind GET
+/expenses/{date}, one INFO line per call) with logging on and disabled.
+Each figure is the best of ROUNDS, so the writer thread's share is included
+but scheduler noise mostly isn't:
+
+    python -m benchmarks.bench_logging
+    LOG_SAMPLE=db_helper=0.1 python -m benchmarks.bench_logging
+"""
+import logging
+import os
+import tempfile
+import time
+from datetime import date
+
+# Keep the benchmark's lines out of the real server.log
+os.environ.setdefault("LOG_FILE", os.path.join(tempfile.gettempdir(), "bench_logging.log"))
+from backend import auth_helper, db_helper, db_pool, migrations, storage  # noqa: E402
+from backend.logging_setup import setup_logger  # noqa: E402
+
+LOG_CALLS = 100_000
+HELPER_CALLS = 5000
+ROUNDS = 5
+DAY = date(2024, 5, 1)
+
+
+def best_us(func, calls):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        samples.append((time.perf_counter() - start) / calls * 1_000_000)
+    return min(samples)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        logger = setup_logger("bench_logging")
+        storage.set_storage(storage.SQLiteStorage(os.path.join(tmp, "bench.db")))
+        migrations.upgrade(storage.get_storage())
+        db_pool.reset_pool()
+        auth_helper.create_user("bench_logging", "bench_password")
+        user_id = auth_helper.verify_user("bench_logging", "bench_password")["user_id"]
+        db_helper.replace_expenses_for_date(DAY, [{"amount": "a", "category": "c", "notes": "n"}], user_id)
+
+        log_line = best_us(lambda: logger.info("fetch_expenses_for_date: %s, user_id: %s", DAY, user_id),
+                           LOG_CALLS // ROUNDS)
+        with_logging = best_us(lambda: db_helper.fetch_expenses_for_date(DAY, user_id), HELPER_CALLS)
+        logging.disable(logging.INFO)
+        without_logging = best_us(lambda: db_helper.fetch_expenses_for_date(DAY, user_id), HELPER_CALLS)
+        logging.disable(logging.NOTSET)
+        db_pool.reset_pool()
+        storage.set_storage(None)
+
+    print(f"fetch_* INFO line: {log_line:.2f} us per call")
+    print(f"fetch_expenses_for_date: {with_logging:.1f} us with logging, {without_logging:.1f} us without, "
+          f"{with_logging - without_logging:.1f} us spent logging")
+
+
+if __name__ == "__main__":
+    main()
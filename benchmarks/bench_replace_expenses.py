@@ -0,0 +1,58 @@
+"""Latency of replacing one day's expenses: per-row loop vs. single-transaction batch.
+
+Runs against the database configured through the usual DB_* environment variables:
+
+    python -m benchmarks.bench_replace_expenses
+"""
+import statistics
+import time
+from datetime import date
+from backend import auth_helper, db_helper
+
+ROW_COUNTS = [1, 5, 10, 50, 100, 500]
+REPEATS = 20
+BENCH_DATE = date(1999, 1, 1)
+
+
+def get_bench_user():
+    auth_helper.create_user("bench_replace", "bench_password")
+    return auth_helper.verify_user("bench_replace", "bench_password")["user_id"]
+
+
+def make_rows(count):
+    return [{"amount": "ciphertext-amount", "category": "ciphertext-category", "notes": f"ciphertext-notes-{i}"}
+            for i in range(count)]
+
+
+def loop_replace(rows, user_id):
+    db_helper.delete_expense_for_date(BENCH_DATE, user_id)
+    for row in rows:
+        db_helper.insert_expense(BENCH_DATE, row["amount"], row["category"], row["notes"], user_id)
+
+
+def batch_replace(rows, user_id):
+    db_helper.replace_expenses_for_date(BENCH_DATE, rows, user_id)
+
+
+def time_ms(func, rows, user_id):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(rows, user_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    user_id = get_bench_user()
+    print(f"{'rows':>6} {'loop ms':>10} {'batch ms':>10} {'speedup':>8}")
+    for count in ROW_COUNTS:
+        rows = make_rows(count)
+        loop = time_ms(loop_replace, rows, user_id)
+        batch = time_ms(batch_replace, rows, user_id)
+        print(f"{count:>6} {loop:>10.2f} {batch:>10.2f} {loop / batch:>7.1f}x")
+    db_helper.delete_expense_for_date(BENCH_DATE, user_id)
+
+
+if __name__ == "__main__":
+    main()
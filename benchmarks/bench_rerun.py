@@ -0,0 +1,108 @@
+"""Wall time of a Streamlit rerun with every tab rendered (st.tabs) and with only the selected one.
+
+A fresh SQLite database gets one synthetic user with BENCH_ROWS encrypted rows
+and `uvicorn backend.server:app` is started on it. The app is then driven
+headless with streamlit.testing's AppTest, logged in as that user, once as the
+old st.tabs layout that runs all four tab bodies and once as frontend/app.py,
+which runs only the selected section. Each timed rerun is what a change to the
+Add/Update date picker triggers:
+
+    python -m benchmarks.bench_rerun
+    BENCH_ROWS=500 python -m benchmarks.bench_rerun
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from backend import db_pool, migrations, storage
+from benchmarks import load_test
+from benchmarks.synthetic_data import PASSWORD, load_user
+
+# View & Manage renders an edit form per row, so the eager layout's rerun grows
+# quickly with history size; a couple of hundred rows already show the difference
+ROWS = int(os.getenv("BENCH_ROWS", "200"))
+RERUNS = int(os.getenv("BENCH_RERUNS", "5"))
+START, END = date(2020, 1, 1), date(2025, 12, 31)
+USERNAME = "bench_rerun"
+FRONTEND = os.path.join(os.path.dirname(__file__), "..", "frontend")
+
+# The frontend reads API_URL when it is imported
+os.environ["API_URL"] = load_test.BASE_URL
+sys.path.insert(0, FRONTEND)
+from streamlit.testing.v1 import AppTest  # noqa: E402
+import encryption_helper  # noqa: E402
+from encryption_helper import get_encryption_key  # noqa: E402
+
+# How app.py laid the sections out before it rendered only the selected one
+EAGER_APP = """
+import streamlit as st
+from add_update_ui import add_update_tab
+from analytics_ui import analytics_tab
+from monthly_analytics_ui import monthly_analytics_tab
+from view_manage_ui import view_manage_tab
+
+tab1, tab2, tab3, tab4 = st.tabs(["Add/Update", "Analytics", "Monthly Analytics", "View & Manage"])
+with tab1:
+    add_update_tab()
+with tab2:
+    analytics_tab()
+with tab3:
+    monthly_analytics_tab()
+with tab4:
+    view_manage_tab()
+"""
+
+
+def logged_in(app, user_id):
+    app.session_state["authenticated"] = True
+    app.session_state["user_id"] = user_id
+    app.session_state["username"] = USERNAME
+    app.session_state["encryption_key"] = get_encryption_key(PASSWORD, USERNAME)
+    return app
+
+
+def rerun_ms(app):
+    """Median wall time of RERUNS date-picker reruns, after a first run that loads everything"""
+    app.run(timeout=300)
+    samples = []
+    for index in range(RERUNS):
+        app.date_input[0].set_value(END - timedelta(days=index % 7))
+        start = time.perf_counter()
+        app.run(timeout=300)
+        samples.append((time.perf_counter() - start) * 1000)
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+    return statistics.median(samples)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "rerun.db")
+        storage.set_storage(storage.SQLiteStorage(path))
+        migrations.upgrade(storage.get_storage())
+        db_pool.reset_pool()
+        user_id = load_user(USERNAME, ROWS, START, END)
+        db_pool.reset_pool()
+        storage.set_storage(None)
+
+        os.environ.update(DB_BACKEND="sqlite", SQLITE_PATH=path)
+        server = load_test.start_server("sync")
+        try:
+            eager = rerun_ms(logged_in(AppTest.from_string(EAGER_APP, default_timeout=300), user_id))
+            encryption_helper.decryption_cache.clear()
+            lazy = rerun_ms(logged_in(AppTest.from_file(os.path.join(FRONTEND, "app.py"), default_timeout=300),
+                                      user_id))
+        finally:
+            server.terminate()
+            server.wait()
+    encryption_helper.shutdown_executors()
+
+    print(f"Add/Update rerun with {ROWS} rows, median of {RERUNS}:")
+    print(f"  every tab rendered (st.tabs): {eager:8.1f} ms")
+    print(f"  selected tab only:            {lazy:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""How the View & Manage and Analytics data paths scale with a user's history.
+
+For each size, a fresh SQLite database gets one synthetic user with that many
+genuinely encrypted rows (benchmarks.synthetic_data) and `uvicorn
+backend.server:app` is started on it. The frontend's own functions are then
+timed against it, the way a freshly logged-in session calls them:
+
+    python -m benchmarks.bench_scaling
+    BENCH_SCALES=1000,10000 python -m benchmarks.bench_scaling
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from backend import db_pool, migrations, storage
+from benchmarks import load_test
+from benchmarks.synthetic_data import PASSWORD, load_user
+
+SCALES = [int(rows) for rows in os.getenv("BENCH_SCALES", "1000,10000,100000").split(",")]
+START, END = date(2016, 1, 1), date(2025, 12, 31)
+USERNAME = "bench_scaling"
+
+# The frontend reads API_URL when it is imported
+os.environ["API_URL"] = load_test.BASE_URL
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "frontend"))
+import pandas as pd  # noqa: E402
+import streamlit as st  # noqa: E402
+import encryption_helper  # noqa: E402
+from analytics_engine import run_query  # noqa: E402
+from encryption_helper import decrypt_expenses, get_encryption_key  # noqa: E402
+from view_manage_ui import sync_expenses  # noqa: E402
+
+
+def new_session(user_id):
+    """Session state of a fresh login, with nothing fetched or decrypted yet"""
+    for name in list(st.session_state):
+        del st.session_state[name]
+    st.session_state.user_id = user_id
+    st.session_state.encryption_key = get_encryption_key(PASSWORD, USERNAME)
+    encryption_helper.decryption_cache.clear()
+
+
+def timed_ms(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def view_table():
+    """What view_manage_tab does with the synced rows on every rerun"""
+    expenses = st.session_state.expenses_data
+    decrypted = decrypt_expenses(expenses, st.session_state.encryption_key)
+    return pd.DataFrame([{**expense, **plain} for expense, plain in zip(expenses, decrypted)])
+
+
+def bench_scale(rows, path):
+    storage.set_storage(storage.SQLiteStorage(path))
+    migrations.upgrade(storage.get_storage())
+    db_pool.reset_pool()
+    user_id = load_user(USERNAME, rows, START, END)
+    db_pool.reset_pool()
+    storage.set_storage(None)
+
+    os.environ.update(DB_BACKEND="sqlite", SQLITE_PATH=path)
+    server = load_test.start_server("sync")
+    try:
+        timings = {}
+        new_session(user_id)
+        timings["view: first sync"] = timed_ms(sync_expenses)
+        timings["view: decrypt + table"] = timed_ms(view_table)
+        timings["view: re-sync"] = timed_ms(sync_expenses)
+        # The first analytics question of all builds and stores every month's rollup
+        new_session(user_id)
+        timings["analytics: first ever"] = timed_ms(run_query, "category_breakdown", START, END)
+        new_session(user_id)
+        timings["analytics: all years"] = timed_ms(run_query, "category_breakdown", START, END)
+        new_session(user_id)
+        timings["analytics: one year"] = timed_ms(run_query, "monthly_totals", END.year)
+        return timings
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in SCALES:
+            results[rows] = bench_scale(rows, os.path.join(tmp, f"scale_{rows}.db"))
+    encryption_helper.shutdown_executors()
+
+    print(f"{'ms':<24}" + "".join(f"{rows:>12}" for rows in SCALES))
+    for step in results[SCALES[0]]:
+        print(f"{step:<24}" + "".join(f"{results[rows][step]:>12.1f}" for rows in SCALES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Endpoint latency on the MySQL and embedded SQLite storage engines.
+
+Seeds one user with ROWS expenses spread over two years on each engine and
+times the existing endpoints through FastAPI's TestClient. MySQL uses the DB_*
+environment variables and is skipped if it can't be reached:
+
+    python -m benchmarks.bench_storage
+"""
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from backend import auth_helper, db_helper, db_pool, migrations, result_cache, storage
+from backend.server import app
+
+ROWS = int(os.getenv("BENCH_ROWS", "5000"))
+REPEATS = 30
+
+
+def seed(user_id):
+    start = date(2023, 1, 1)
+    for day in range(730):
+        expense_date = start + timedelta(days=day)
+        rows = [{"amount": "ciphertext", "category": "ciphertext", "notes": f"ciphertext {i}"}
+                for i in range(ROWS // 730 + 1)]
+        db_helper.replace_expenses_for_date(expense_date, rows, user_id)
+
+
+def time_endpoint(client, method, url, **kwargs):
+    samples = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples)
+
+
+def bench_engine(engine):
+    storage.set_storage(engine)
+    migrations.upgrade(engine)
+    db_pool.reset_pool()
+    result_cache.reset_result_cache()
+    auth_helper.create_user("bench_storage", "bench_password")
+    user_id = auth_helper.verify_user("bench_storage", "bench_password")["user_id"]
+    seed(user_id)
+    headers = {"user-id": str(user_id)}
+    client = TestClient(app)
+    results = {
+        "GET /expenses/{date}": time_endpoint(client, "GET", "/expenses/2024-06-01", headers=headers),
+        "POST /expenses/{date}": time_endpoint(client, "POST", "/expenses/2024-06-01", headers=headers,
+                                               json=[{"amount": "ct", "category": "ct", "notes": "ct"}] * 5),
+        "GET /expenses/?limit=100": time_endpoint(client, "GET", "/expenses/", params={"limit": 100},
+                                                  headers=headers),
+        "GET /expenses/": time_endpoint(client, "GET", "/expenses/", headers=headers),
+        "POST /analytics/": time_endpoint(client, "POST", "/analytics/", headers=headers,
+                                          json={"start_date": "2024-01-01", "end_date": "2024-03-31"}),
+        "POST /analytics_month/": time_endpoint(client, "POST", "/analytics_month/", params={"year": 2024},
+                                                headers=headers),
+    }
+    db_pool.reset_pool()
+    storage.set_storage(None)
+    return results
+
+
+def main():
+    engines = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        engines["sqlite"] = bench_engine(storage.SQLiteStorage(os.path.join(tmp, "bench.db")))
+    try:
+        engines["mysql"] = bench_engine(storage.MySQLStorage())
+    except Exception as e:
+        print(f"Skipping MySQL: {e}")
+
+    names = list(engines)
+    print(f"{'endpoint (median ms)':<28}" + "".join(f"{name:>10}" for name in names))
+    for endpoint in engines["sqlite"]:
+        print(f"{endpoint:<28}" + "".join(f"{engines[name][endpoint]:>10.2f}" for name in names))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Throughput of the API in sync and async mode at increasing client concurrency.
+
+Starts `uvicorn backend.server:app` once per API_MODE against the database
+configured through the DB_* environment variables, with the result cache off
+so reads reach the database, seeds a year of rows and drives a mix of
+per-date reads, writes and analytics over random dates with N concurrent
+clients:
+
+    python -m benchmarks.load_test
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+import httpx
+
+CONCURRENCY_LEVELS = [50, 200, 1000]
+REQUESTS_PER_CLIENT = 20
+PORT = int(os.getenv("LOAD_TEST_PORT", "8765"))
+BASE_URL = f"http://127.0.0.1:{PORT}"
+# Days the seeded rows and the requests are spread over
+FIRST_DAY = date(1999, 1, 1)
+SPAN_DAYS = 365
+ROWS_PER_DAY = 3
+
+
+def start_server(mode, **env):
+    """uvicorn in API_MODE `mode`, with any extra environment variables"""
+    env = dict(os.environ, API_MODE=mode, **env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.server:app", "--port", str(PORT), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{BASE_URL}/").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server in {mode} mode did not start")
+
+
+def get_bench_user():
+    httpx.post(f"{BASE_URL}/register", json={"username": "bench_load", "password": "bench_password"})
+    response = httpx.post(f"{BASE_URL}/login", json={"username": "bench_load", "password": "bench_password"})
+    return response.json()["user_id"]
+
+
+def random_day(rng):
+    return FIRST_DAY + timedelta(days=rng.randrange(SPAN_DAYS))
+
+
+def seed_rows(headers):
+    """ROWS_PER_DAY rows on every day of the span, one bulk request per month"""
+    rows = [{"amount": "ct", "category": "ct", "notes": "ct"}] * ROWS_PER_DAY
+    by_month = {}
+    for offset in range(SPAN_DAYS):
+        day = FIRST_DAY + timedelta(days=offset)
+        by_month.setdefault(day.month, {})[str(day)] = rows
+    for by_date in by_month.values():
+        httpx.post(f"{BASE_URL}/expenses/bulk", headers=headers, json=by_date, timeout=60).raise_for_status()
+
+
+def next_request(rng, i):
+    """(method, path, request kwargs) of a client's i-th request"""
+    if i % 10 == 0:
+        return "POST", f"/expenses/{random_day(rng)}", {"json": [{"amount": "ct", "category": "ct", "notes": "ct"}]}
+    if i % 10 in (3, 7):
+        start, end = sorted([random_day(rng), random_day(rng)])
+        return "GET", "/analytics/", {"params": {"start_date": str(start), "end_date": str(end)}}
+    if i % 10 == 5:
+        return "GET", "/analytics_month/", {"params": {"year": FIRST_DAY.year}}
+    return "GET", f"/expenses/{random_day(rng)}", {}
+
+
+async def client_loop(client, headers, latencies, errors, rng):
+    for i in range(REQUESTS_PER_CLIENT):
+        method, path, kwargs = next_request(rng, i)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, headers=headers, **kwargs)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_level(concurrency, headers):
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=60) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, headers, latencies, errors, random.Random(index))
+                               for index in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": len(errors),
+    }
+
+
+def main():
+    print(f"{'mode':>6} {'clients':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>7}")
+    for mode in ["sync", "async"]:
+        # Every GET would otherwise be a result cache hit that never reaches the database
+        server = start_server(mode, RESULT_CACHE_BACKEND="off")
+        try:
+            headers = {"user-id": str(get_bench_user())}
+            seed_rows(headers)
+            for concurrency in CONCURRENCY_LEVELS:
+                result = asyncio.run(run_level(concurrency, headers))
+                print(f"{mode:>6} {concurrency:>8} {result['rps']:>10.1f} {result['p50_ms']:>10.1f} "
+                      f"{result['p99_ms']:>10.1f} {result['errors']:>7}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Synthetic users with realistic, genuinely encrypted expense histories, loaded straight into the database.
+
+Rows are generated per user over a date span with a weighted category mix and
+random-length notes, encrypted with the key the app derives from that user's
+password (encrypt_expenses, spread over the crypto pool) and written
+with db_helper.import_expenses, so a million rows don't go through the API.
+The users can log in to the app afterwards with the printed password:
+
+    DB_BACKEND=sqlite SQLITE_PATH=scale.db python -m benchmarks.synthetic_data --users 5 --rows 100000
+    python -m benchmarks.synthetic_data --rows 20000 --start 2010-01-01 --categories Food=60,Rent=5,Other=35 --notes 0-80
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from backend import auth_helper, db_helper, migrations
+from backend.storage import get_storage
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "frontend"))
+from encryption_helper import encrypt_expenses, get_encryption_key, shutdown_executors  # noqa: E402
+
+PASSWORD = "synthetic_password"
+# Category -> share of rows, in the categories the app offers
+DEFAULT_CATEGORIES = {"Food": 45, "Shopping": 20, "Entertainment": 15, "Other": 15, "Rent": 5}
+# Median amount per category; amounts are log-normal around it
+MEDIAN_AMOUNTS = {"Food": 18.0, "Shopping": 45.0, "Entertainment": 30.0, "Other": 25.0, "Rent": 1200.0}
+NOTE_WORDS = ("groceries", "lunch", "coffee", "with", "friends", "online", "order", "refund", "monthly",
+              "gift", "tickets", "taxi", "market", "shared", "bill", "card", "cash", "weekend", "trip")
+# Rows encrypted and inserted at a time, so memory stays flat for large users
+LOAD_BATCH_SIZE = 20000
+
+
+def parse_categories(text):
+    """"Food=45,Rent=5" -> {"Food": 45.0, "Rent": 5.0}"""
+    categories = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        categories[name.strip()] = float(weight or 1)
+    return categories
+
+
+def random_note(rng, min_length, max_length):
+    length = rng.randint(min_length, max_length)
+    words = []
+    while sum(len(word) + 1 for word in words) < length:
+        words.append(rng.choice(NOTE_WORDS))
+    return " ".join(words)[:length]
+
+
+def generate_expenses(rng, rows, start, end, categories=None, note_lengths=(0, 40)):
+    """`rows` plaintext (expense_date, expense) pairs spread uniformly between start and end"""
+    categories = categories or DEFAULT_CATEGORIES
+    names, weights = list(categories), list(categories.values())
+    span = (end - start).days + 1
+    expenses = []
+    for category in rng.choices(names, weights, k=rows):
+        amount = round(rng.lognormvariate(0, 0.8) * MEDIAN_AMOUNTS.get(category, 25.0), 2)
+        expenses.append((start + timedelta(days=rng.randrange(span)),
+                         {"amount": amount, "category": category, "notes": random_note(rng, *note_lengths)}))
+    return expenses
+
+
+def load_user(username, rows, start, end, categories=None, note_lengths=(0, 40), seed=0, password=PASSWORD):
+    """Create `username` and give it `rows` encrypted expenses; returns its user id"""
+    auth_helper.create_user(username, password)
+    user = auth_helper.verify_user(username, password)
+    if user is None:
+        raise RuntimeError(f"{username} already exists with another password")
+    key = get_encryption_key(password, username)
+    rng = random.Random(f"{seed}:{username}")
+    for done in range(0, rows, LOAD_BATCH_SIZE):
+        plain = generate_expenses(rng, min(LOAD_BATCH_SIZE, rows - done), start, end, categories, note_lengths)
+        encrypted = encrypt_expenses([expense for _, expense in plain], key)
+        db_helper.import_expenses([{"expense_date": expense_date, **expense}
+                                   for (expense_date, _), expense in zip(plain, encrypted)], user["user_id"])
+    return user["user_id"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load synthetic encrypted expense histories")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--rows", type=int, default=10000, help="expenses per user")
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2016, 1, 1))
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2025, 12, 31))
+    parser.add_argument("--categories", type=parse_categories, default=DEFAULT_CATEGORIES,
+                        help="weighted mix, e.g. Food=45,Rent=5")
+    parser.add_argument("--notes", default="0-40", help="note length range in characters")
+    parser.add_argument("--prefix", default="synthetic", help="usernames are <prefix>_<n>")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    note_lengths = tuple(int(length) for length in args.notes.split("-"))
+
+    migrations.upgrade(get_storage())
+    try:
+        for index in range(args.users):
+            username = f"{args.prefix}_{index}"
+            start = time.perf_counter()
+            user_id = load_user(username, args.rows, args.start, args.end, args.categories, note_lengths, args.seed)
+            print(f"{username} (id {user_id}): {args.rows} rows in {time.perf_counter() - start:.1f} s")
+    finally:
+        shutdown_executors()
+    print(f"Password for every user: {PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
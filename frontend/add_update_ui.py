@@ -2,24 +2,21 @@ import streamlit as st
 from datetime import datetime
 import requests
 import time
-from encryption_helper import encrypt_expense, decrypt_expense
+import api_client
+from api_client import bump_data_version
+from encryption_helper import encrypt_expenses, decrypt_expenses
+from rollup_helper import refresh_rollup
 import os
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
 
-
-def get_headers():
-    """Get headers with user authentication"""
-    return {"user-id": str(st.session_state.user_id)}
-
-
 def add_update_tab():
     # Check if encryption key exists
     if "encryption_key" not in st.session_state:
         st.error("🔒 Encryption key not found. Please log out and log in again.")
         return
 
-    selected_date = st.date_input("Enter date", datetime(2024, 8, 1), label_visibility="collapsed")
+    selected_date = st.date_input("Enter date", datetime.today(), label_visibility="collapsed")
 
     # Initialize session state
     if "num_expense_rows" not in st.session_state:
@@ -30,13 +27,13 @@ def add_update_tab():
         st.session_state.show_submit_confirm = False
 
     # Fetch and decrypt existing expenses
-    response = requests.get(f"{API_URL}/expenses/{selected_date}", headers=get_headers())
-    if response.status_code == 200:
-        encrypted_expenses = response.json()
+    try:
+        # Memoized per data version, so reruns of this tab don't refetch the day
+        encrypted_expenses = api_client.cached_get(f"/expenses/{selected_date}")
         # Decrypt expenses
-        existing_expenses = [decrypt_expense(exp, st.session_state.encryption_key) for exp in encrypted_expenses]
+        existing_expenses = decrypt_expenses(encrypted_expenses, st.session_state.encryption_key)
         st.write(f"🔓 Loaded {len(existing_expenses)} expenses for {selected_date}")
-    else:
+    except requests.RequestException:
         st.error("Failed to retrieve expenses")
         existing_expenses = []
 
@@ -129,12 +126,12 @@ def add_update_tab():
         with col1:
             if st.button("✅ Yes, Submit", type="primary", use_container_width=True):
                 # Encrypt expenses before sending
-                encrypted_expenses = [encrypt_expense(exp, st.session_state.encryption_key) for exp in
-                                      filtered_expenses]
+                encrypted_expenses = encrypt_expenses(filtered_expenses, st.session_state.encryption_key)
 
-                response = requests.post(f"{API_URL}/expenses/{selected_date}", json=encrypted_expenses,
-                                         headers=get_headers())
+                response = api_client.post(f"/expenses/{selected_date}", json=encrypted_expenses)
                 if response.status_code == 200:
+                    refresh_rollup(selected_date, st.session_state.encryption_key)
+                    bump_data_version()
                     st.success("✅ Successfully submitted expenses! (Encrypted)")
                     time.sleep(1.5)
                     st.session_state.num_expense_rows = 5
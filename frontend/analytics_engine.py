@@ -0,0 +1,113 @@
+import calendar
+from datetime import date
+import numpy as np
+import pandas as pd
+import streamlit as st
+from api_client import data_version
+from rollup_helper import load_rollups
+import os
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+# Amounts and categories are encrypted end-to-end, so the server can't total them.
+# The engine loads the encrypted per-month rollups a question needs, decrypts them
+# into a columnar frame of daily category totals and answers it locally with
+# vectorized group-bys.
+
+
+def rollup_frame(rollups):
+    """Frame of daily category totals (expense_date, amount, category) from decrypted monthly rollups"""
+    days, amounts, categories = [], [], []
+    for month, rollup in rollups.items():
+        for day, totals in rollup["days"].items():
+            for category, total in totals.items():
+                days.append(month.replace(day=int(day)).isoformat())
+                amounts.append(total)
+                categories.append(category)
+
+    return pd.DataFrame({
+        "expense_date": pd.to_datetime(pd.Series(days, dtype="object"), format="%Y-%m-%d"),
+        "amount": np.array(amounts, dtype=np.float64),
+        "category": pd.Categorical(categories),
+    })
+
+
+def date_mask(frame, start_date, end_date):
+    dates = frame["expense_date"].values
+    return (dates >= np.datetime64(start_date, "D")) & (dates <= np.datetime64(end_date, "D"))
+
+
+def expenses_between(frame, start_date, end_date):
+    """Rows with start_date <= expense_date <= end_date"""
+    return frame.loc[date_mask(frame, start_date, end_date)]
+
+
+def category_breakdown(frame, start_date, end_date):
+    """Totals and share per category, in the same shape as POST /analytics/"""
+    subset = expenses_between(frame, start_date, end_date)
+    totals = subset.groupby("category", observed=True)["amount"].sum()
+    grand_total = totals.sum()
+    percentages = totals / grand_total * 100 if grand_total != 0 else totals * 0
+    return {
+        category: {"total": float(totals[category]), "percentage": float(percentages[category])}
+        for category in totals.index
+    }
+
+
+def monthly_totals(frame, year):
+    """Totals per month of `year`, in the same shape as POST /analytics_month/"""
+    subset = expenses_between(frame, f"{year}-01-01", f"{year}-12-31")
+    totals = subset.groupby(subset["expense_date"].dt.month)["amount"].sum()
+    return [
+        {"month": int(month), "month_name": calendar.month_name[month], "total": float(total)}
+        for month, total in totals.items()
+    ]
+
+
+QUERIES = {
+    "category_breakdown": category_breakdown,
+    "monthly_totals": monthly_totals,
+}
+
+# Dates each query reads, so only the rollups of those months are loaded
+QUERY_RANGES = {
+    "category_breakdown": lambda start_date, end_date: (start_date, end_date),
+    "monthly_totals": lambda year: (date(year, 1, 1), date(year, 12, 31)),
+}
+
+
+def months_between(start_date, end_date):
+    month = start_date.replace(day=1)
+    while month <= end_date:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def get_analytics_cache():
+    """Decrypted rollups and memoized results for the current user and data version"""
+    cache_key = (st.session_state.user_id, data_version())
+    cache = st.session_state.get("analytics_cache")
+    if cache is None or cache["key"] != cache_key:
+        cache = {"key": cache_key, "rollups": {}, "loaded_months": set(), "results": {}}
+        st.session_state.analytics_cache = cache
+    return cache
+
+
+def rollups_between(cache, start_date, end_date):
+    """Rollups for the months between the two dates, fetching only months not loaded yet"""
+    months = list(months_between(start_date, end_date))
+    missing = [month for month in months if month not in cache["loaded_months"]]
+    if missing:
+        cache["rollups"].update(load_rollups(missing[0], missing[-1], st.session_state.encryption_key))
+        cache["loaded_months"].update(missing)
+    return {month: cache["rollups"][month] for month in months if month in cache["rollups"]}
+
+
+def run_query(name, *args):
+    """Answer one of QUERIES from the cached rollups, loading the months it needs on first use"""
+    cache = get_analytics_cache()
+    result_key = (name,) + args
+    if result_key not in cache["results"]:
+        start_date, end_date = QUERY_RANGES[name](*args)
+        frame = rollup_frame(rollups_between(cache, start_date, end_date))
+        cache["results"][result_key] = QUERIES[name](frame, *args)
+    return cache["results"][result_key]
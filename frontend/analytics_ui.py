@@ -2,14 +2,11 @@ import streamlit as st
 from datetime import datetime
 import requests
 import pandas as pd
+from analytics_engine import run_query
 
 import os
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
-def get_headers():
-    """Get headers with user authentication"""
-    return {"user-id": str(st.session_state.user_id)}
-
 def analytics_tab():
     col1, col2 = st.columns(2)
     with col1:
@@ -18,12 +15,12 @@ def analytics_tab():
         end_date = st.date_input("End Date", datetime(2024,8,5))
 
     if st.button("Get Analytics"):
-        payload = {
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date.strftime("%Y-%m-%d")
-        }
-        response = requests.post(f"{API_URL}/analytics/", json=payload, headers=get_headers())
-        response = response.json()
+        # Amounts are encrypted, so totals are computed client-side from the decrypted monthly rollups
+        try:
+            response = run_query("category_breakdown", start_date, end_date)
+        except requests.RequestException as e:
+            st.error(f"Error connecting to server: {str(e)}")
+            return
 
         data = {
             "Category": list(response.keys()),
@@ -0,0 +1,111 @@
+"""The one HTTP client every tab talks to the API through.
+
+A single pooled requests.Session keeps connections alive across reruns, every
+call has a timeout, idempotent calls are retried with backoff, and GETs can be
+memoized per user and data version with st.cache_data. The data version is
+the server's, so a write from any session, device or the import CLI makes the
+memoized GETs stale within API_VERSION_TTL.
+"""
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import os
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+# (connect, read) seconds per call
+API_TIMEOUT = (float(os.getenv("API_CONNECT_TIMEOUT", "3.05")), float(os.getenv("API_READ_TIMEOUT", "30")))
+# Retries for idempotent calls on connection errors and 502/503/504, with exponential backoff
+API_RETRIES = int(os.getenv("API_RETRIES", "3"))
+API_RETRY_BACKOFF = float(os.getenv("API_RETRY_BACKOFF", "0.3"))
+# Keep-alive connections held open to the API, shared by every browser session
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "10"))
+# Memoized GETs: seconds an entry may be served and entries kept
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "300"))
+API_CACHE_ENTRIES = int(os.getenv("API_CACHE_ENTRIES", "256"))
+# Seconds the server's data version is trusted before it is asked again
+API_VERSION_TTL = float(os.getenv("API_VERSION_TTL", "2"))
+
+
+@st.cache_resource
+def get_session():
+    """Process-wide session, so every rerun and browser session reuses the same keep-alive pool"""
+    retry = Retry(
+        total=API_RETRIES,
+        backoff_factor=API_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        # POST isn't retried once the request was sent; a connect failure is retried for any method
+        allowed_methods=frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_headers():
+    """Get headers with user authentication"""
+    if st.session_state.get("user_id") is None:
+        return {}
+    return {"user-id": str(st.session_state.user_id)}
+
+
+def request(method, path, **kwargs):
+    """Call the API with the session's pool, the user's headers and the default timeout"""
+    kwargs.setdefault("timeout", API_TIMEOUT)
+    headers = {**get_headers(), **kwargs.pop("headers", {})}
+    return get_session().request(method, f"{API_URL}{path}", headers=headers, **kwargs)
+
+
+def get(path, **kwargs):
+    return request("GET", path, **kwargs)
+
+
+def post(path, **kwargs):
+    return request("POST", path, **kwargs)
+
+
+def put(path, **kwargs):
+    return request("PUT", path, **kwargs)
+
+
+def delete(path, **kwargs):
+    return request("DELETE", path, **kwargs)
+
+
+@st.cache_data(ttl=API_VERSION_TTL, show_spinner=False)
+def _server_data_version(user_id):
+    response = request("GET", "/expenses/version", headers={"user-id": str(user_id)})
+    response.raise_for_status()
+    return response.json()["version"]
+
+
+def data_version():
+    """The user's data version on the server, which every expense write from anywhere bumps.
+
+    Raises requests.HTTPError when the server can't be asked.
+    """
+    return _server_data_version(st.session_state.user_id)
+
+
+def bump_data_version():
+    """Mark memoized GETs and cached analytics as stale after this session wrote expenses"""
+    # The next read asks the server rather than trusting the version for the rest of its TTL
+    _server_data_version.clear(st.session_state.user_id)
+
+
+@st.cache_data(ttl=API_CACHE_TTL, max_entries=API_CACHE_ENTRIES, show_spinner=False)
+def _cached_get(path, params, user_id, version):
+    response = request("GET", path, params=dict(params), headers={"user-id": str(user_id)})
+    response.raise_for_status()
+    return response.json()
+
+
+def cached_get(path, params=None):
+    """JSON body of a GET, memoized per user and data version so reruns don't refetch it.
+
+    Raises requests.HTTPError for error responses, which are never memoized.
+    """
+    return _cached_get(path, tuple(sorted((params or {}).items())), st.session_state.user_id, data_version())
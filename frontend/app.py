@@ -4,6 +4,7 @@ from analytics_ui import analytics_tab
 from monthly_analytics_ui import monthly_analytics_tab
 from view_manage_ui import view_manage_tab
 from auth_ui import login_page, logout
+from prefetch import prefetch_tab_data
 import os
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
@@ -36,16 +37,16 @@ else:
         if st.button("Logout", use_container_width=True):
             logout()
 
-    tab1, tab2, tab3, tab4 = st.tabs(["Add/Update", "Analytics", "Monthly Analytics", "View & Manage"])
-
-    with tab1:
-        add_update_tab()
-
-    with tab2:
-        analytics_tab()
-
-    with tab3:
-        monthly_analytics_tab()
-
-    with tab4:
-        view_manage_tab()
+    # Warm every tab's data in parallel right after login
+    prefetch_tab_data()
+
+    # st.tabs runs the body of every tab on each rerun, hidden or not, so only the
+    # selected section is rendered instead
+    tabs = {
+        "Add/Update": add_update_tab,
+        "Analytics": analytics_tab,
+        "Monthly Analytics": monthly_analytics_tab,
+        "View & Manage": view_manage_tab,
+    }
+    selected_tab = st.radio("Section", list(tabs), horizontal=True, key="active_tab", label_visibility="collapsed")
+    tabs[selected_tab]()
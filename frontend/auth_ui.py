@@ -1,7 +1,7 @@
 import streamlit as st
-import requests
 import time
-from encryption_helper import get_encryption_key
+import api_client
+from encryption_helper import get_encryption_key, decryption_cache
 
 import os
 API_URL = os.getenv("API_URL", "http://localhost:8000")
@@ -23,7 +23,7 @@ def login_page():
         if st.button("Login", type="primary", use_container_width=True):
             if username and password:
                 try:
-                    response = requests.post(f"{API_URL}/login", json={
+                    response = api_client.post("/login", json={
                         "username": username,
                         "password": password
                     })
@@ -67,7 +67,7 @@ def login_page():
                     st.error("❌ Password must be at least 8 characters long for security")
                 else:
                     try:
-                        response = requests.post(f"{API_URL}/register", json={
+                        response = api_client.post("/register", json={
                             "username": new_username,
                             "password": new_password
                         })
@@ -85,6 +85,9 @@ def login_page():
 
 
 def logout():
+    # Drop this user's decrypted plaintext from the shared decryption cache
+    if st.session_state.get("encryption_key"):
+        decryption_cache.clear(st.session_state.encryption_key)
     st.session_state.authenticated = False
     st.session_state.user_id = None
     st.session_state.username = None
@@ -93,5 +96,15 @@ def logout():
     # Clear expenses data on logout
     if "expenses_data" in st.session_state:
         del st.session_state.expenses_data
+    if "expenses_version" in st.session_state:
+        del st.session_state.expenses_version
+    if "pending_changes" in st.session_state:
+        del st.session_state.pending_changes
+    # Drop decrypted analytics so plaintext doesn't outlive the session
+    if "analytics_cache" in st.session_state:
+        del st.session_state.analytics_cache
+    # Prefetch again for whoever logs in next
+    if "prefetched" in st.session_state:
+        del st.session_state.prefetched
 
     st.rerun()
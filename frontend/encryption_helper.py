@@ -1,12 +1,39 @@
 import base64
 import hashlib
+import json
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 #from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import os
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
+# Upper bound on ciphertext + plaintext characters kept by the decryption cache
+DECRYPT_CACHE_MAX_BYTES = int(os.getenv("DECRYPT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Bulk encrypt/decrypt: rows per unit of work, pool kind ("thread" or "process") and size.
+# Threads share decryption_cache; worker processes only get the rows it misses.
+CRYPTO_CHUNK_SIZE = int(os.getenv("CRYPTO_CHUNK_SIZE", "2000"))
+CRYPTO_EXECUTOR = os.getenv("CRYPTO_EXECUTOR", "thread")
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", str(os.cpu_count() or 1)))
+
+# Row envelope: version byte | 12-byte nonce | AES-GCM(packed amount, category, notes).
+# Set ENVELOPE_WRITES=0 to keep writing the legacy three-Fernet-token rows.
+ENVELOPE_VERSION = 1
+ENVELOPE_WRITES = os.getenv("ENVELOPE_WRITES", "1") == "1"
+_RECORD_HEADER = struct.Struct("<dHI")
+
+# Monthly rollup blobs: version byte | 12-byte nonce | AES-GCM(JSON), bound to their month
+ROLLUP_VERSION = 1
+
 
 def derive_key_from_password(password: str, salt: bytes) -> bytes:
     """Derive an encryption key from user's password"""
@@ -26,24 +53,158 @@ def get_encryption_key(password: str, username: str) -> bytes:
     salt = hashlib.sha256(username.encode()).digest()[:16]
     return derive_key_from_password(password, salt)
 
+@lru_cache(maxsize=16)
+def get_cipher(key: bytes) -> Fernet:
+    """Fernet instance for a key, built once and reused for every field"""
+    return Fernet(key)
+
+
+class DecryptionCache:
+    """Thread-safe LRU map from (key, ciphertext) to plaintext, bounded by total size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, encrypted_data):
+        with self._lock:
+            plaintext = self._entries.get((key, encrypted_data))
+            if plaintext is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((key, encrypted_data))
+            self.hits += 1
+            return plaintext
+
+    def __contains__(self, entry):
+        """(key, encrypted_data) in cache, without counting a lookup or touching recency"""
+        with self._lock:
+            return entry in self._entries
+
+    def put(self, key, encrypted_data, plaintext):
+        size = len(encrypted_data) + len(plaintext)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if (key, encrypted_data) in self._entries:
+                return
+            self._entries[(key, encrypted_data)] = plaintext
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                (_, old_data), old_plaintext = self._entries.popitem(last=False)
+                self.bytes -= len(old_data) + len(old_plaintext)
+                self.evictions += 1
+
+    def clear(self, key=None):
+        """Forget every entry, or only those decrypted with `key`"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.bytes = 0
+                return
+            for entry_key in [k for k in self._entries if k[0] == key]:
+                plaintext = self._entries.pop(entry_key)
+                self.bytes -= len(entry_key[1]) + len(plaintext)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+decryption_cache = DecryptionCache(DECRYPT_CACHE_MAX_BYTES)
+
+
 def encrypt_data(data: str, key: bytes) -> str:
     """Encrypt data using Fernet symmetric encryption"""
-    f = Fernet(key)
+    f = get_cipher(key)
     encrypted = f.encrypt(data.encode())
     return base64.urlsafe_b64encode(encrypted).decode()
 
 def decrypt_data(encrypted_data: str, key: bytes) -> str:
     """Decrypt data using Fernet symmetric encryption"""
+    cached = decryption_cache.get(key, encrypted_data)
+    if cached is not None:
+        return cached
     try:
-        f = Fernet(key)
+        f = get_cipher(key)
         decoded = base64.urlsafe_b64decode(encrypted_data.encode())
-        decrypted = f.decrypt(decoded)
-        return decrypted.decode()
+        decrypted = f.decrypt(decoded).decode()
     except Exception as e:
         return f"[DECRYPTION ERROR: {str(e)}]"
+    decryption_cache.put(key, encrypted_data, decrypted)
+    return decrypted
+
+@lru_cache(maxsize=16)
+def get_envelope_cipher(key: bytes) -> AESGCM:
+    """AES-256-GCM cipher for row envelopes, keyed separately from the Fernet key via HKDF"""
+    envelope_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"expense-envelope-v1",
+    ).derive(base64.urlsafe_b64decode(key))
+    return AESGCM(envelope_key)
+
+def encrypt_envelope(expense: dict, key: bytes) -> str:
+    """Pack amount, category and notes into one versioned AEAD envelope"""
+    category = expense["category"].encode()
+    notes = expense["notes"].encode()
+    record = _RECORD_HEADER.pack(float(expense["amount"]), len(category), len(notes)) + category + notes
+    header = bytes([ENVELOPE_VERSION])
+    nonce = os.urandom(12)
+    sealed = get_envelope_cipher(key).encrypt(nonce, record, header)
+    return base64.urlsafe_b64encode(header + nonce + sealed).decode()
+
+def decrypt_envelope(payload: str, key: bytes) -> dict:
+    """Open an envelope written by encrypt_envelope; raises if it is corrupt or for another key"""
+    record = decryption_cache.get(key, payload)
+    if record is None:
+        raw = base64.urlsafe_b64decode(payload.encode())
+        if raw[0] != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported envelope version {raw[0]}")
+        record = get_envelope_cipher(key).decrypt(raw[1:13], raw[13:], raw[:1])
+        decryption_cache.put(key, payload, record)
+    amount, category_length, notes_length = _RECORD_HEADER.unpack_from(record)
+    offset = _RECORD_HEADER.size
+    return {
+        "amount": amount,
+        "category": record[offset:offset + category_length].decode(),
+        "notes": record[offset + category_length:offset + category_length + notes_length].decode()
+    }
+
+def encrypt_rollup(rollup: dict, month: str, key: bytes) -> str:
+    """Seal a monthly rollup; `month` ("YYYY-MM-01") is authenticated so blobs can't be swapped between months"""
+    header = bytes([ROLLUP_VERSION])
+    nonce = os.urandom(12)
+    data = json.dumps(rollup, separators=(",", ":")).encode()
+    sealed = get_envelope_cipher(key).encrypt(nonce, data, header + b"rollup:" + month.encode())
+    return base64.urlsafe_b64encode(header + nonce + sealed).decode()
+
+def decrypt_rollup(payload: str, month: str, key: bytes) -> dict:
+    """Open a rollup written by encrypt_rollup for the same month; raises if it doesn't verify"""
+    raw = base64.urlsafe_b64decode(payload.encode())
+    if raw[0] != ROLLUP_VERSION:
+        raise ValueError(f"Unsupported rollup version {raw[0]}")
+    data = get_envelope_cipher(key).decrypt(raw[1:13], raw[13:], raw[:1] + b"rollup:" + month.encode())
+    return json.loads(data)
 
 def encrypt_expense(expense: dict, key: bytes) -> dict:
     """Encrypt sensitive fields in an expense"""
+    if ENVELOPE_WRITES:
+        return {"amount": "", "category": "", "notes": "", "payload": encrypt_envelope(expense, key)}
     return {
         "amount": encrypt_data(str(expense["amount"]), key),
         "category": encrypt_data(expense["category"], key),
@@ -51,8 +212,10 @@ def encrypt_expense(expense: dict, key: bytes) -> dict:
     }
 
 def decrypt_expense(expense: dict, key: bytes) -> dict:
-    """Decrypt sensitive fields in an expense"""
+    """Decrypt sensitive fields in an expense, in whichever format the row was stored"""
     try:
+        if expense.get("payload"):
+            return decrypt_envelope(expense["payload"], key)
         return {
             "amount": float(decrypt_data(expense["amount"], key)),
             "category": decrypt_data(expense["category"], key),
@@ -65,3 +228,103 @@ def decrypt_expense(expense: dict, key: bytes) -> dict:
             "notes": "[ENCRYPTED]"
         }
 
+def upgrade_expenses(expenses, key: bytes) -> list:
+    """Re-encrypt legacy rows as envelopes; returns (id, encrypted expense) for each row that changed.
+
+    Rows that don't decrypt cleanly are left alone rather than overwritten with placeholders.
+    """
+    upgraded = []
+    for expense in expenses:
+        if expense.get("payload"):
+            continue
+        try:
+            plain = {
+                "amount": float(decrypt_data(expense["amount"], key)),
+                "category": decrypt_data(expense["category"], key),
+                "notes": decrypt_data(expense["notes"], key)
+            }
+        except ValueError:
+            continue
+        if any(value.startswith("[DECRYPTION ERROR") for value in (plain["category"], plain["notes"])):
+            continue
+        upgraded.append((expense["id"], {"amount": "", "category": "", "notes": "",
+                                         "payload": encrypt_envelope(plain, key)}))
+    return upgraded
+
+
+def _encrypt_chunk(expenses, key):
+    return [encrypt_expense(expense, key) for expense in expenses]
+
+
+def _decrypt_chunk(expenses, key):
+    return [decrypt_expense(expense, key) for expense in expenses]
+
+
+def _encrypted_fields(expense):
+    return [expense["payload"]] if expense.get("payload") else [expense["amount"], expense["category"], expense["notes"]]
+
+
+def _open_chunk(expenses, key):
+    """Decrypt in a worker process; returns the (ciphertext, plaintext) entries for the parent's cache"""
+    entries = []
+    for expense in expenses:
+        decrypt_expense(expense, key)
+        for field in _encrypted_fields(expense):
+            plaintext = decryption_cache.get(key, field)
+            if plaintext is not None:
+                entries.append((field, plaintext))
+    return entries
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(kind, workers):
+    """Long-lived pool shared by bulk calls, so workers aren't re-spawned per call"""
+    with _executors_lock:
+        executor = _executors.get((kind, workers))
+        if executor is None:
+            executor_class = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+            executor = _executors[(kind, workers)] = executor_class(max_workers=workers)
+        return executor
+
+
+def shutdown_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
+
+
+def _map_chunks(func, expenses, key, workers, chunk_size, executor):
+    expenses = list(expenses)
+    workers = workers or CRYPTO_WORKERS
+    chunk_size = chunk_size or CRYPTO_CHUNK_SIZE
+    # Small batches aren't worth the hand-off to a pool
+    if workers <= 1 or len(expenses) <= chunk_size:
+        return func(expenses, key)
+
+    chunks = [expenses[start:start + chunk_size] for start in range(0, len(expenses), chunk_size)]
+    pool = get_executor(executor or CRYPTO_EXECUTOR, workers)
+    # map() yields chunk results in submission order, so row order is preserved
+    return [row for chunk in pool.map(func, chunks, repeat(key)) for row in chunk]
+
+
+def encrypt_expenses(expenses, key: bytes, workers=None, chunk_size=None, executor=None) -> list:
+    """Encrypt many expenses, split into chunks across a process or thread pool"""
+    return _map_chunks(_encrypt_chunk, expenses, key, workers, chunk_size, executor)
+
+
+def decrypt_expenses(expenses, key: bytes, workers=None, chunk_size=None, executor=None) -> list:
+    """Decrypt many expenses in parallel chunks; rows that fail decrypt as decrypt_expense would"""
+    if (executor or CRYPTO_EXECUTOR) != "process":
+        return _map_chunks(_decrypt_chunk, expenses, key, workers, chunk_size, executor)
+    # Worker processes can't see decryption_cache: send them only its misses, then
+    # keep what they decrypted so the next rerun is served from the cache
+    expenses = list(expenses)
+    misses = [expense for expense in expenses
+              if not all((key, field) in decryption_cache for field in _encrypted_fields(expense))]
+    for field, plaintext in _map_chunks(_open_chunk, misses, key, workers, chunk_size, "process"):
+        decryption_cache.put(key, field, plaintext)
+    return _decrypt_chunk(expenses, key)
@@ -0,0 +1,47 @@
+"""Plaintext download of a user's whole history, decrypted as it streams in from GET /expenses/export.
+
+The CSV written here has the columns import_expenses.py reads, so an export can be imported again.
+"""
+import csv
+import io
+import json
+import tempfile
+from itertools import islice
+import api_client
+from encryption_helper import decrypt_expenses
+import os
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+# Encrypted rows decrypted and written at a time
+EXPORT_DECRYPT_BATCH = int(os.getenv("EXPORT_DECRYPT_BATCH", "5000"))
+
+
+def write_plaintext_csv(lines, key, out, batch_size=EXPORT_DECRYPT_BATCH):
+    """Decrypt NDJSON export lines into CSV rows on `out`, one batch at a time; returns the rows written"""
+    writer = csv.writer(out)
+    writer.writerow(["date", "amount", "category", "notes"])
+    rows = (json.loads(line) for line in lines if line)
+    written = 0
+    while batch := list(islice(rows, batch_size)):
+        for row, expense in zip(batch, decrypt_expenses(batch, key)):
+            writer.writerow([row["expense_date"], expense["amount"], expense["category"], expense["notes"]])
+        written += len(batch)
+    return written
+
+
+def export_to_file(session, user_id, key):
+    """Stream the export into a temporary plaintext CSV and return it, rewound, for st.download_button.
+
+    Called on a thread without a script context, so everything it needs is passed in.
+    """
+    response = session.get(f"{API_URL}/expenses/export", params={"format": "ndjson"},
+                           headers={"user-id": str(user_id)}, stream=True, timeout=api_client.API_TIMEOUT)
+    response.raise_for_status()
+    file = tempfile.TemporaryFile()
+    with response:
+        text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+        write_plaintext_csv(response.iter_lines(chunk_size=64 * 1024), key, text)
+        text.flush()
+        text.detach()
+    file.seek(0)
+    return file
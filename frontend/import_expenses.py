@@ -0,0 +1,169 @@
+"""Import a plaintext expense export (CSV) into an account, encrypting it on this machine.
+
+    python frontend/import_expenses.py bank_export.csv --username alice
+
+The file needs a header with `date` (or `expense_date`), `amount`, `category`
+and `notes` columns. Rows are read and encrypted a batch at a time with the
+key derived from the account password, and each encrypted batch is uploaded to
+POST /expenses/import while the next one is being encrypted. If the server
+fails an upload or can't be reached, no further batches are sent, the ones in flight finish, and
+the import exits non-zero with the rows imported so far.
+"""
+import argparse
+import csv
+import getpass
+import json
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from itertools import islice
+import requests
+from encryption_helper import encrypt_expenses, get_encryption_key, shutdown_executors
+import os
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+# Batches uploading at once while the next one is encrypted
+IMPORT_IN_FLIGHT = int(os.getenv("IMPORT_IN_FLIGHT", "2"))
+IMPORT_TIMEOUT = (3.05, 300)
+
+
+def parse_row(row):
+    """Plaintext expense of one CSV row; raises ValueError for rows that can't be imported"""
+    expense_date = row.get("expense_date") or row.get("date")
+    if not expense_date:
+        raise ValueError("missing date")
+    return date.fromisoformat(expense_date.strip()), {
+        "amount": float(row.get("amount") or ""),
+        "category": (row.get("category") or "Other").strip(),
+        "notes": (row.get("notes") or "").strip(),
+    }
+
+
+def read_batches(lines, batch_size):
+    """Yield (dates, expenses, errors) per batch of CSV rows; errors are (line number, message)"""
+    reader = csv.DictReader(lines)
+    while True:
+        rows = [(reader.line_num, row) for row in islice(reader, batch_size)]
+        if not rows:
+            return
+        dates, expenses, errors = [], [], []
+        for line_number, row in rows:
+            try:
+                expense_date, expense = parse_row(row)
+            except ValueError as e:
+                errors.append((line_number, str(e)))
+                continue
+            dates.append(expense_date)
+            expenses.append(expense)
+        yield dates, expenses, errors
+
+
+def to_ndjson(dates, encrypted):
+    return "".join(json.dumps({"expense_date": str(expense_date), **expense}) + "\n"
+                   for expense_date, expense in zip(dates, encrypted))
+
+
+class ImportStopped(Exception):
+    """An upload failed; rows counted in `imported` are stored, the rest of the file isn't"""
+
+    def __init__(self, imported, rejected, detail):
+        super().__init__(detail.get("message", "upload failed"))
+        self.imported = imported
+        self.rejected = rejected
+        self.detail = detail
+
+
+def failure_detail(error):
+    """The server's `detail` of a failed upload ({"message", "imported", "line"}), or one made from the error"""
+    try:
+        detail = error.response.json()["detail"]
+    except (AttributeError, ValueError, KeyError, TypeError):
+        detail = None
+    if not isinstance(detail, dict):
+        detail = {"message": str(detail or error), "imported": 0}
+    return detail
+
+
+def upload(session, user_id, body):
+    response = session.post(f"{API_URL}/expenses/import", data=body.encode(), timeout=IMPORT_TIMEOUT,
+                            headers={"user-id": str(user_id), "content-type": "application/x-ndjson"})
+    response.raise_for_status()
+    return response.json()
+
+
+def import_file(path, user_id, key, batch_size=IMPORT_BATCH_SIZE, in_flight=IMPORT_IN_FLIGHT, out=sys.stdout):
+    """Encrypt and upload every row of `path`; returns (rows imported, rows rejected).
+
+    Raises ImportStopped once the uploads in flight have finished if one of them failed,
+    whether the server answered with an error or couldn't be reached.
+    """
+    imported = rejected = 0
+    failures = []
+    session = requests.Session()
+
+    def report(future):
+        nonlocal imported, rejected
+        try:
+            result = future.result()
+        except requests.RequestException as e:
+            # Transport errors have no server body: nothing from that batch is counted as stored
+            detail = failure_detail(e)
+            failures.append(detail)
+            # The chunks committed before the failure are kept by the server
+            result = {"imported": detail.get("imported", 0), "failed": 0}
+            where = f" at line {detail['line']} of its batch" if "line" in detail else ""
+            print(f"upload failed{where}: {detail.get('message')}", file=out)
+        imported += result["imported"]
+        rejected += result["failed"]
+        print(f"{imported} rows imported, {rejected} rejected", file=out)
+
+    with open(path, newline="", encoding="utf-8") as lines, ThreadPoolExecutor(max_workers=in_flight) as pool:
+        pending = deque()
+        for dates, expenses, errors in read_batches(lines, batch_size):
+            for line_number, message in errors:
+                print(f"line {line_number}: {message}", file=out)
+            rejected += len(errors)
+            if not expenses:
+                continue
+            body = to_ndjson(dates, encrypt_expenses(expenses, key))
+            # Wait for the oldest upload once the pipeline is full, so memory stays bounded
+            if len(pending) == in_flight:
+                report(pending.popleft())
+            if failures:
+                break
+            pending.append(pool.submit(upload, session, user_id, body))
+        while pending:
+            report(pending.popleft())
+    if failures:
+        raise ImportStopped(imported, rejected, failures[0])
+    return imported, rejected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encrypt and import a plaintext expense CSV")
+    parser.add_argument("path")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--in-flight", type=int, default=IMPORT_IN_FLIGHT)
+    args = parser.parse_args(argv)
+
+    password = os.getenv("EXPENSE_PASSWORD") or getpass.getpass("Password: ")
+    response = requests.post(f"{API_URL}/login", json={"username": args.username, "password": password},
+                             timeout=IMPORT_TIMEOUT)
+    if response.status_code != 200:
+        sys.exit("Invalid username or password")
+
+    key = get_encryption_key(password, args.username)
+    try:
+        imported, rejected = import_file(args.path, response.json()["user_id"], key, args.batch_size, args.in_flight)
+    except ImportStopped as e:
+        sys.exit(f"Import stopped: {e} ({e.imported} rows imported, {e.rejected} rejected)")
+    finally:
+        shutdown_executors()
+    print(f"Done: {imported} rows imported, {rejected} rejected")
+
+
+if __name__ == "__main__":
+    main()
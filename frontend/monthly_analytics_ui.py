@@ -2,18 +2,11 @@ import streamlit as st
 from datetime import datetime
 import requests
 import pandas as pd
+from analytics_engine import run_query
 import os
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
 
-def get_headers():
-    """Get headers with user authentication"""
-    if "user_id" not in st.session_state or st.session_state.user_id is None:
-        st.error("User not authenticated. Please log in again.")
-        return None
-    return {"user-id": str(st.session_state.user_id)}
-
-
 def monthly_analytics_tab():
     st.title("Monthly Expense Analytics")
 
@@ -22,34 +15,33 @@ def monthly_analytics_tab():
     selected_year = st.selectbox("Select Year", years, index=len(years) - 1)
 
     if st.button("Get Monthly Analytics"):
-        headers = get_headers()
-        if headers is None:
+        if st.session_state.get("user_id") is None:
+            st.error("User not authenticated. Please log in again.")
             return
 
         try:
-            response = requests.post(f"{API_URL}/analytics_month/", params={"year": selected_year}, headers=headers)
+            # Amounts are encrypted, so totals are computed client-side from the decrypted monthly rollups
+            data = run_query("monthly_totals", selected_year)
 
-            if response.status_code == 200:
-                data = response.json()
-
-                if len(data) == 0:
-                    st.warning(f"No expense data found for {selected_year}. Add some expenses first!")
-                else:
-                    df = pd.DataFrame(data)
+            if len(data) == 0:
+                st.warning(f"No expense data found for {selected_year}. Add some expenses first!")
+            else:
+                df = pd.DataFrame(data)
 
-                    st.subheader(f"Monthly Expenses for {selected_year}")
-                    st.bar_chart(data=df.set_index("month_name")["total"], use_container_width=True)
+                st.subheader(f"Monthly Expenses for {selected_year}")
+                st.bar_chart(data=df.set_index("month_name")["total"], use_container_width=True)
 
-                    st.subheader("Monthly Breakdown")
-                    display_df = df[["month_name", "total"]].copy()
-                    display_df.columns = ["Month", "Total (USD)"]
-                    display_df["Total (USD)"] = display_df["Total (USD)"].map("${:,.2f}".format)
+                st.subheader("Monthly Breakdown")
+                display_df = df[["month_name", "total"]].copy()
+                display_df.columns = ["Month", "Total (USD)"]
+                display_df["Total (USD)"] = display_df["Total (USD)"].map("${:,.2f}".format)
 
-                    st.table(display_df)
+                st.table(display_df)
 
-                    total_year = df["total"].sum()
-                    st.metric("Total Expenses for year", f"${total_year:,.2f}")
-            elif response.status_code == 401:
+                total_year = df["total"].sum()
+                st.metric("Total Expenses for year", f"${total_year:,.2f}")
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 401:
                 st.error("❌ Authentication failed. Please log out and log in again.")
             else:
                 st.error(f"Failed to retrieve monthly analytics.")
@@ -0,0 +1,55 @@
+"""Warm the data every tab opens with, once per login, so switching tabs doesn't wait on the API.
+
+The fetches run side by side in a thread pool. Each worker is attached to the
+browser session's script context so it can read st.session_state and fill the
+same caches the tabs read (st.cache_data, expenses_data, analytics_cache). The
+workers do run at the same time: each writes its own session key, and the one
+thing they all read, the server's data version, is fetched on the script
+thread before they start. The script thread blocks until all of them finish.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import requests
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import api_client
+from analytics_engine import run_query
+from view_manage_ui import sync_expenses
+import os
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+# Prefetch workers; each task is one or a few round trips to the API
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "3"))
+
+
+def run_concurrently(tasks, workers=PREFETCH_WORKERS):
+    """Run callables in a thread pool attached to this session; returns {name: result or exception}"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        futures = {name: pool.submit(task) for name, task in tasks.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # A failed prefetch only costs the warm start; the tab fetches again and reports the error
+                results[name] = e
+    return results
+
+
+def prefetch_tab_data():
+    """Fetch today's expenses, the full expense list and this year's monthly totals, once per login"""
+    if st.session_state.get("prefetched"):
+        return
+    today = date.today()
+    # Fetched here so the workers don't each ask the server for it
+    try:
+        api_client.data_version()
+    except requests.RequestException:
+        pass  # The tabs ask again and report the error
+    run_concurrently({
+        "expenses_today": lambda: api_client.cached_get(f"/expenses/{today}"),
+        "expenses_all": sync_expenses,
+        "monthly_totals": lambda: run_query("monthly_totals", today.year),
+    })
+    st.session_state.prefetched = True
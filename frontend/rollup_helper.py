@@ -0,0 +1,140 @@
+"""Encrypted per-month rollups of a user's expenses.
+
+The server keeps one opaque blob per (user, month) holding totals by day and
+category, so analytics read O(months) blobs instead of every ciphertext row.
+Every expense write bumps the month's generation on the server; a rollup built
+from an older generation is stale and gets rebuilt here from that month's rows.
+"""
+import calendar
+from datetime import date
+import requests
+import api_client
+from encryption_helper import decrypt_expenses, decrypt_rollup, encrypt_rollup
+import os
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def day_totals(expenses):
+    """Totals per category for decrypted expenses"""
+    totals = {}
+    for expense in expenses:
+        totals[expense["category"]] = totals.get(expense["category"], 0.0) + float(expense["amount"])
+    return totals
+
+
+def set_day(rollup, day, expenses):
+    """Replace one day's totals in a rollup with those of `expenses`"""
+    totals = day_totals(expenses)
+    if totals:
+        rollup["days"][str(day.day)] = totals
+    else:
+        rollup["days"].pop(str(day.day), None)
+    return rollup
+
+
+def build_rollup(rows, key):
+    """Rollup ({"days": {day of month: {category: total}}}) of one month's ciphertext rows"""
+    rows = list(rows)
+    rollup = {"days": {}}
+    by_day = {}
+    for row, expense in zip(rows, decrypt_expenses(rows, key)):
+        by_day.setdefault(date.fromisoformat(str(row["expense_date"])), []).append(expense)
+    for day, expenses in by_day.items():
+        set_day(rollup, day, expenses)
+    return rollup
+
+
+def fetch_rollup_rows(start_date, end_date):
+    response = api_client.get("/rollups/", params={"start_date": start_date, "end_date": end_date})
+    response.raise_for_status()
+    return response.json()
+
+
+def store_rollup(month, rollup, generation, key):
+    """Upload a rollup; False when the server already has a newer one"""
+    response = api_client.put(f"/rollups/{month}",
+                              json={"payload": encrypt_rollup(rollup, month.isoformat(), key), "generation": generation})
+    if response.status_code == 409:
+        return False
+    response.raise_for_status()
+    return True
+
+
+def rebuild_rollup(month, generation, key):
+    """Recompute a month's rollup from its expenses and store it back"""
+    response = api_client.get("/expenses/", params={"start_date": month, "end_date": month_end(month)})
+    response.raise_for_status()
+    rollup = build_rollup(response.json(), key)
+    store_rollup(month, rollup, generation, key)
+    return rollup
+
+
+def open_rollup(row, key):
+    """Decrypted rollup for a row of GET /rollups/, or None when it has to be rebuilt"""
+    if row["payload"] is None:
+        return None
+    try:
+        return decrypt_rollup(row["payload"], row["month_start"], key)
+    except Exception:
+        return None
+
+
+def load_rollups(start_date, end_date, key):
+    """Rollups for every month with expenses between the two dates, keyed by first day of month.
+
+    Stale, missing or unreadable rollups are rebuilt from their month's expenses on the way.
+    """
+    rollups = {}
+    for row in fetch_rollup_rows(start_date, end_date):
+        month = date.fromisoformat(row["month_start"])
+        rollup = None if row["stale"] else open_rollup(row, key)
+        if rollup is None:
+            rollup = rebuild_rollup(month, row["generation"], key)
+        rollups[month] = rollup
+    return rollups
+
+
+def refresh_rollup(expense_date, key):
+    """Bring the rollup of `expense_date`'s month up to date after this session wrote that date"""
+    refresh_rollups([expense_date], key)
+
+
+def refresh_rollups(expense_dates, key):
+    """Bring rollups up to date after one write of this session touched `expense_dates`.
+
+    That write raised the generation of each month it touched by one. When it is
+    the only write since a month's rollup was built, only the touched days are
+    re-read; otherwise the whole month is rebuilt. Failures leave the rollup stale
+    for the next reader to rebuild.
+    """
+    by_month = {}
+    for expense_date in expense_dates:
+        by_month.setdefault(month_start(expense_date), set()).add(expense_date)
+    for month, days in sorted(by_month.items()):
+        try:
+            rows = fetch_rollup_rows(month, month)
+            if not rows:
+                continue
+            row = rows[0]
+            rollup = open_rollup(row, key)
+            if rollup is None or row["built_generation"] != row["generation"] - 1:
+                rebuild_rollup(month, row["generation"], key)
+                continue
+            response = api_client.get("/expenses/", params={"start_date": min(days), "end_date": max(days)})
+            response.raise_for_status()
+            expenses_by_day = {day: [] for day in days}
+            for expense in response.json():
+                expenses_by_day.get(date.fromisoformat(str(expense["expense_date"])), []).append(expense)
+            for day, expenses in expenses_by_day.items():
+                set_day(rollup, day, decrypt_expenses(expenses, key))
+            store_rollup(month, rollup, row["generation"], key)
+        except requests.RequestException:
+            pass
@@ -1,27 +1,85 @@
 import streamlit as st
-import requests
 import pandas as pd
 from datetime import datetime
 import time
+import api_client
+from api_client import bump_data_version
+from encryption_helper import decrypt_expenses, encrypt_expense, upgrade_expenses
+from export_helper import export_to_file
+from rollup_helper import refresh_rollups
 import os
 API_URL = os.getenv("API_URL", "http://localhost:8000")
 
-def get_headers():
-    """Get headers with user authentication"""
-    return {"user-id": str(st.session_state.user_id)}
+# Operations per POST /expenses/batch, the server's limit
+MAX_BATCH_OPERATIONS = 500
+
+def apply_changes(expenses, changes):
+    """Merge a GET /expenses/changes response into a list of expenses, keeping newest first"""
+    rows = {expense["id"]: expense for expense in expenses}
+    for expense_id in changes["deletes"]:
+        rows.pop(expense_id, None)
+    for expense in changes["upserts"]:
+        rows[expense["id"]] = expense
+    return sorted(rows.values(), key=lambda expense: (expense["expense_date"], expense["id"]), reverse=True)
+
+
+def sync_expenses():
+    """Pull only what changed since the last sync into st.session_state.expenses_data"""
+    expenses = st.session_state.get("expenses_data")
+    since = st.session_state.get("expenses_version", 0) if expenses is not None else 0
+    response = api_client.get("/expenses/changes", params={"since": since})
+    if response.status_code != 200:
+        return False
+    changes = response.json()
+    st.session_state.expenses_data = apply_changes(expenses or [], changes)
+    st.session_state.expenses_version = changes["version"]
+    return True
+
+
+def get_pending_changes():
+    """Edits ({id: encrypted expense}) and deletes (ids) queued in this session, with each id's date"""
+    if "pending_changes" not in st.session_state:
+        st.session_state.pending_changes = {"updates": {}, "deletes": set(), "dates": {}}
+    return st.session_state.pending_changes
+
+
+def save_changes(updates, deletes):
+    """Send edits and deletes with POST /expenses/batch; returns the ids that were applied.
+
+    Each request is one transaction on the server. Ids that no longer exist and
+    operations in a request that failed are left out of the result.
+    """
+    operations = [("updates", {**expense, "id": expense_id}) for expense_id, expense in updates.items()]
+    operations += [("deletes", expense_id) for expense_id in deletes]
+    applied = set()
+    for start in range(0, len(operations), MAX_BATCH_OPERATIONS):
+        body = {"updates": [], "deletes": []}
+        for kind, operation in operations[start:start + MAX_BATCH_OPERATIONS]:
+            body[kind].append(operation)
+        response = api_client.post("/expenses/batch", json=body)
+        if response.status_code != 200:
+            continue
+        results = response.json()
+        applied.update(result["id"] for result in results["updates"] + results["deletes"] if result["status"] == "ok")
+    return applied
+
 
 def view_manage_tab():
     st.title("View & Manage Expenses")
 
+    # The export is only fetched and decrypted when the button is clicked, on a thread
+    # of its own that can't see session state, so it gets what it needs up front
+    session, user_id, key = api_client.get_session(), st.session_state.user_id, st.session_state.encryption_key
+    st.download_button("⬇️ Download all expenses (CSV)", data=lambda: export_to_file(session, user_id, key),
+                       file_name="expenses.csv", mime="text/csv", on_click="ignore")
+
     # Initialize session state for delete confirmation
     if "delete_confirm" not in st.session_state:
         st.session_state.delete_confirm = None
 
     # Fetch all expenses
     if st.button("Refresh Data") or "expenses_data" not in st.session_state:
-        response = requests.get(f"{API_URL}/expenses/", headers=get_headers())
-        if response.status_code == 200:
-            st.session_state.expenses_data = response.json()
+        if sync_expenses():
             st.success("Data refreshed!")
             time.sleep(0.5)
             st.rerun()
@@ -29,11 +87,51 @@ def view_manage_tab():
             st.error("Failed to load expenses")
             return
 
+    # Edits and deletes are queued and saved together in one transaction
+    pending = get_pending_changes()
+    queued = len(pending["updates"]) + len(pending["deletes"])
+    if queued:
+        st.info(f"📝 {queued} queued changes")
+        col_save, col_discard = st.columns(2)
+        with col_save:
+            save = st.button(f"💾 Save {queued} changes", type="primary", use_container_width=True)
+        with col_discard:
+            if st.button("↩️ Discard queued changes", use_container_width=True):
+                del st.session_state.pending_changes
+                st.rerun()
+        if save:
+            applied = save_changes(pending["updates"], pending["deletes"])
+            if applied:
+                refresh_rollups({pending["dates"][expense_id] for expense_id in applied},
+                                st.session_state.encryption_key)
+                bump_data_version()
+            for expense_id in applied:
+                pending["updates"].pop(expense_id, None)
+                pending["deletes"].discard(expense_id)
+                pending["dates"].pop(expense_id)
+            sync_expenses()
+            if len(applied) == queued:
+                del st.session_state.pending_changes
+                st.rerun()
+            st.error(f"❌ {queued - len(applied)} changes could not be saved and are still queued")
+
     if "expenses_data" in st.session_state and len(st.session_state.expenses_data) > 0:
         expenses = st.session_state.expenses_data
 
-        # Convert to DataFrame for better display
-        df = pd.DataFrame(expenses)
+        # Rows written before the compact envelope format can be re-encrypted in one go
+        legacy_count = sum(1 for expense in expenses if not expense.get("payload"))
+        if legacy_count and st.button(f"🔐 Upgrade {legacy_count} expenses to compact encryption"):
+            upgraded = dict(upgrade_expenses(expenses, st.session_state.encryption_key))
+            applied = save_changes(upgraded, [])
+            bump_data_version()
+            if len(applied) < len(upgraded):
+                st.error(f"Failed to upgrade {len(upgraded) - len(applied)} expenses")
+            sync_expenses()
+            st.rerun()
+
+        # Decrypt and convert to DataFrame for better display
+        decrypted = decrypt_expenses(expenses, st.session_state.encryption_key)
+        df = pd.DataFrame([{**expense, **plain} for expense, plain in zip(expenses, decrypted)])
         df['expense_date'] = pd.to_datetime(df['expense_date'])
         df['year_month'] = df['expense_date'].dt.to_period('M')
 
@@ -76,6 +174,10 @@ def view_manage_tab():
                     col1, col2, col3 = st.columns([3, 3, 1])
 
                     with col1:
+                        if int(row['id']) in pending["deletes"]:
+                            st.caption("🗑️ Delete queued")
+                        elif int(row['id']) in pending["updates"]:
+                            st.caption("✏️ Edit queued")
                         st.write(f"**Category:** {row['category']}")
                         st.write(f"**Amount:** ${row['amount']:.2f}")
                         st.write(f"**Notes:** {row['notes']}")
@@ -90,23 +192,15 @@ def view_manage_tab():
                             new_category = st.selectbox("Category", categories_list, index=categories_list.index(row['category']) if row['category'] in categories_list else 0, key=f"cat_{row['id']}")
                             new_notes = st.text_input("Notes", value=row['notes'], key=f"notes_{row['id']}")
 
-                            if st.form_submit_button("Update", use_container_width=True):
-                                update_data = {
+                            if st.form_submit_button("Queue update", use_container_width=True):
+                                pending["updates"][int(row['id'])] = encrypt_expense({
                                     "amount": new_amount,
                                     "category": new_category,
                                     "notes": new_notes
-                                }
-                                response = requests.put(f"{API_URL}/expenses/{row['id']}", json=update_data, headers=get_headers())
-                                if response.status_code == 200:
-                                    st.success("✅ Expense updated successfully!")
-                                    time.sleep(1.5)
-                                    # Refresh data
-                                    response = requests.get(f"{API_URL}/expenses/", headers=get_headers())
-                                    if response.status_code == 200:
-                                        st.session_state.expenses_data = response.json()
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to update expense")
+                                }, st.session_state.encryption_key)
+                                pending["deletes"].discard(int(row['id']))
+                                pending["dates"][int(row['id'])] = row['expense_date'].date()
+                                st.rerun()
 
                     with col3:
                         st.write("")
@@ -121,18 +215,11 @@ def view_manage_tab():
                             col_yes, col_no = st.columns(2)
                             with col_yes:
                                 if st.button("✅ Yes", key=f"confirm_yes_{row['id']}"):
-                                    response = requests.delete(f"{API_URL}/expenses/{row['id']}", headers=get_headers())
-                                    if response.status_code == 200:
-                                        st.success("🗑️ Expense deleted!")
-                                        time.sleep(1.5)
-                                        # Refresh data
-                                        response = requests.get(f"{API_URL}/expenses/", headers=get_headers())
-                                        if response.status_code == 200:
-                                            st.session_state.expenses_data = response.json()
-                                        st.session_state.delete_confirm = None
-                                        st.rerun()
-                                    else:
-                                        st.error("Failed to delete expense")
+                                    pending["updates"].pop(int(row['id']), None)
+                                    pending["deletes"].add(int(row['id']))
+                                    pending["dates"][int(row['id'])] = row['expense_date'].date()
+                                    st.session_state.delete_confirm = None
+                                    st.rerun()
                             with col_no:
                                 if st.button("❌ No", key=f"confirm_no_{row['id']}"):
                                     st.session_state.delete_confirm = None
@@ -1,24 +1,189 @@
-from backend import db_helper
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from backend import auth_helper, db_helper
 
 import os
 import sys
 
 
+@pytest.fixture
+def user_id(sqlite_db):
+    auth_helper.create_user("potato_fan", "password123")
+    user_id = auth_helper.verify_user("potato_fan", "password123")["user_id"]
+    db_helper.insert_expense("2024-08-15", 10.0, "Shopping", "Bought potatoes", user_id)
+    return user_id
 
-def test_fetch_expense_for_date_aug_15():
-    expenses= db_helper.fetch_expenses_for_date("2024-08-15")
+
+def test_fetch_expense_for_date_aug_15(user_id):
+    expenses= db_helper.fetch_expenses_for_date("2024-08-15", user_id)
 
     assert len(expenses) == 1
-    assert expenses[0]["amount"] == 10.0
+    assert float(expenses[0]["amount"]) == 10.0
     assert expenses[0]["category"] == "Shopping"
     assert expenses[0]["notes"] == "Bought potatoes"
 
-def test_fetch_expenses_for_invalid_date():
-    expenses= db_helper.fetch_expenses_for_date("9999-08-15")
+def test_fetch_expenses_for_invalid_date(user_id):
+    expenses= db_helper.fetch_expenses_for_date("9999-08-15", user_id)
 
     assert len(expenses) == 0
 
-def test_fetch_expense_summary_invalid_range():
+def test_fetch_expense_summary_invalid_range(user_id):
 
-    summary = db_helper.fetch_expense_summary("2099-01-01", "2099-12-31")
+    summary = db_helper.fetch_expense_summary("2099-01-01", "2099-12-31", user_id)
     assert len(summary) == 0
+
+
+def test_replace_expenses_for_date_replaces_the_day(user_id):
+    rows = [{"amount": "a1", "category": "c1", "notes": "n1", "payload": None},
+            {"amount": "", "category": "", "notes": "", "payload": "envelope"}]
+
+    db_helper.replace_expenses_for_date("2024-08-15", rows, user_id)
+
+    assert db_helper.fetch_expenses_for_date("2024-08-15", user_id) == rows
+
+
+def test_fetch_monthly_expense_summary_names_months(user_id):
+    summary = db_helper.fetch_monthly_expense_summary(2024, user_id)
+
+    assert [(row["month"], row["month_name"]) for row in summary] == [(8, "August")]
+
+
+def test_fetch_expenses_page_walks_history(user_id):
+    for day in range(1, 6):
+        db_helper.insert_expense(f"2024-07-0{day}", 1.0, "Food", f"day {day}", user_id)
+
+    first = db_helper.fetch_expenses_page(user_id, 3)
+    last = first[-1]
+    second = db_helper.fetch_expenses_page(user_id, 3, (last["expense_date"], last["id"]))
+
+    assert [row["notes"] for row in first + second] == [
+        "Bought potatoes", "day 5", "day 4", "day 3", "day 2", "day 1"
+    ]
+    assert list(db_helper.iter_all_expenses(user_id, batch_size=2)) == first + second
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, operation, params=()):
+        self.statements.append((" ".join(operation.split()), list(params)))
+
+    def fetchone(self):
+        return {"data_version": 3}
+
+    def fetchall(self):
+        return []
+
+
+def test_replace_expenses_for_date_uses_one_transaction(monkeypatch):
+    cursor = RecordingCursor()
+    commits = []
+
+    @contextmanager
+    def fake_cursor(commit=False):
+        yield cursor
+        commits.append(commit)
+
+    monkeypatch.setattr(db_helper, "get_db_cursor", fake_cursor)
+    rows = [{"amount": "a1", "category": "c1", "notes": "n1"}, {"amount": "", "category": "", "notes": "", "payload": "p2"}]
+
+    db_helper.replace_expenses_for_date("2024-08-15", rows, 7)
+
+    assert commits == [True]
+    assert cursor.statements[0][0].startswith("UPDATE users SET data_version")
+    assert cursor.statements[2][0].startswith("INSERT INTO expense_tombstones")
+    assert cursor.statements[3][0].startswith("DELETE FROM expenses")
+    insert, params = cursor.statements[4]
+    assert insert.count("(%s, %s, %s, %s, %s, %s, %s)") == 2
+    assert params == ["2024-08-15", "a1", "c1", "n1", None, 7, 3, "2024-08-15", "", "", "", "p2", 7, 3]
+
+
+def test_expense_writes_mark_the_month_rollup_stale(user_id):
+    (rollup,) = db_helper.fetch_rollups("2024-08-01", "2024-08-01", user_id)
+    assert db_helper.store_rollup("2024-08-01", "blob", rollup["generation"], user_id)
+
+    db_helper.replace_expenses_for_date("2024-08-20", [{"amount": "a", "category": "c", "notes": "n"}], user_id)
+    expense_id = db_helper.fetch_expenses_between("2024-08-20", "2024-08-20", user_id)[0]["id"]
+    db_helper.delete_expense_by_id(expense_id, user_id)
+
+    (rollup,) = db_helper.fetch_rollups("2024-08-01", "2024-08-01", user_id)
+    assert (rollup["payload"], rollup["generation"] - rollup["built_generation"]) == ("blob", 2)
+
+
+def test_store_rollup_keeps_the_newest_build(user_id):
+    db_helper.insert_expense("2024-08-16", 5.0, "Food", "Lunch", user_id)
+
+    assert db_helper.store_rollup("2024-08-01", "second", 2, user_id)
+    assert not db_helper.store_rollup("2024-08-01", "first", 1, user_id)
+    assert not db_helper.store_rollup("2024-08-01", "future", 3, user_id)
+    assert not db_helper.store_rollup("2024-09-01", "empty month", 1, user_id)
+    assert db_helper.fetch_rollups("2024-01-01", "2024-12-01", user_id)[0]["payload"] == "second"
+
+
+def test_import_expenses_spans_dates_in_one_change(user_id):
+    before = db_helper.fetch_changes(0, user_id)["version"]
+
+    imported = db_helper.import_expenses([
+        {"expense_date": date(2024, 8, 15), "amount": "a", "category": "c", "notes": "n"},
+        {"expense_date": date(2024, 10, 1), "amount": "", "category": "", "notes": "", "payload": "p"},
+    ], user_id)
+
+    changes = db_helper.fetch_changes(before, user_id)
+    assert imported == 2
+    assert changes["version"] == before + 1
+    assert len(db_helper.fetch_expenses_for_date("2024-08-15", user_id)) == 2
+    assert [(str(row["month_start"]), row["generation"])
+            for row in db_helper.fetch_rollups("2024-08-01", "2024-10-01", user_id)] == [
+        ("2024-08-01", 2), ("2024-10-01", 1)]
+
+
+def test_apply_expense_batch_updates_and_deletes_in_one_change(user_id):
+    db_helper.replace_expenses_for_date("2024-09-03", [{"amount": "a", "category": "c", "notes": "n"}], user_id)
+    (august, september) = sorted(db_helper.fetch_changes(0, user_id)["upserts"], key=lambda row: row["id"])
+    before = db_helper.fetch_changes(0, user_id)["version"]
+
+    found = db_helper.apply_expense_batch(
+        [{"id": august["id"], "amount": "", "category": "", "notes": "", "payload": "edited"},
+         {"id": 9999, "amount": "x", "category": "x", "notes": "x"}],
+        [september["id"]], user_id)
+
+    changes = db_helper.fetch_changes(before, user_id)
+    assert found == {august["id"], september["id"]}
+    assert changes["version"] == before + 1
+    assert [row["payload"] for row in changes["upserts"]] == ["edited"]
+    assert changes["deletes"] == [september["id"]]
+
+
+def test_fetch_changes_returns_only_what_changed(user_id):
+    everything = db_helper.fetch_changes(0, user_id)
+    (potatoes,) = everything["upserts"]
+
+    db_helper.insert_expense("2024-08-16", 5.0, "Food", "Lunch", user_id)
+    lunch = db_helper.fetch_expenses_for_date("2024-08-16", user_id)
+    db_helper.update_expense_by_id(potatoes["id"], 12.0, "Shopping", "More potatoes", user_id)
+    db_helper.replace_expenses_for_date("2024-08-16", [{"amount": 6.0, "category": "Food", "notes": "Dinner"}],
+                                        user_id)
+    changes = db_helper.fetch_changes(everything["version"], user_id)
+
+    assert changes["version"] == everything["version"] + 3
+    assert [row["notes"] for row in changes["upserts"]] == ["More potatoes", "Dinner"]
+    assert len(changes["deletes"]) == len(lunch) == 1
+    assert db_helper.fetch_changes(changes["version"], user_id) == {
+        "version": changes["version"], "upserts": [], "deletes": []}
+
+
+def test_replace_expenses_for_dates_replaces_only_those_dates(user_id):
+    db_helper.replace_expenses_for_date("2024-08-16", [{"amount": "a", "category": "c", "notes": "old"}], user_id)
+    before = db_helper.fetch_changes(0, user_id)["version"]
+
+    db_helper.replace_expenses_for_dates({
+        date(2024, 8, 16): [{"amount": "b", "category": "c", "notes": "new"}],
+        date(2024, 9, 20): [{"amount": "c", "category": "c", "notes": "september"}],
+    }, user_id)
+
+    changes = db_helper.fetch_changes(before, user_id)
+    assert changes["version"] == before + 1
+    assert [row["notes"] for row in changes["upserts"]] == ["new", "september"]
+    assert len(changes["deletes"]) == 1
+    assert [row["notes"] for row in db_helper.fetch_expenses_for_date("2024-08-15", user_id)] == ["Bought potatoes"]
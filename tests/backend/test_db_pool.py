@@ -0,0 +1,65 @@
+import threading
+import pytest
+from backend.db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def is_connected(self):
+        return self.healthy
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_connections():
+    opened = []
+    pool = ConnectionPool(lambda: opened.append(FakeConnection()) or opened[-1], size=2)
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert second is first
+    assert len(opened) == 1
+    assert pool.stats()["in_use"] == 1
+
+
+def test_pool_times_out_when_exhausted():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+    pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_pool_waiter_gets_released_connection():
+    pool = ConnectionPool(FakeConnection, size=1, timeout=2)
+    held = pool.acquire()
+    result = {}
+
+    waiter = threading.Thread(target=lambda: result.setdefault("conn", pool.acquire()))
+    waiter.start()
+    while pool.stats()["waiters"] == 0:
+        pass
+    pool.release(held)
+    waiter.join()
+
+    assert result["conn"] is held
+
+
+def test_pool_replaces_unhealthy_connection():
+    pool = ConnectionPool(FakeConnection, size=1, ping_after=0)
+    stale = pool.acquire()
+    stale.connection.healthy = False
+    pool.release(stale)
+
+    fresh = pool.acquire()
+
+    assert fresh is not stale
+    assert stale.connection.closed
+    assert pool.stats()["discarded"] == 1
@@ -0,0 +1,63 @@
+import json
+import logging
+import time
+from backend import logging_setup
+from backend.logging_setup import JsonFormatter, SampledLogger, parse_sample_rates, setup_logger
+
+
+def wait_for_text(path, text, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if path.exists() and text in path.read_text():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_setup_logger_is_idempotent_and_writes_on_a_background_thread(tmp_path):
+    log_file = str(tmp_path / "app.log")
+
+    logger = setup_logger("test_idempotent", log_file=log_file)
+    setup_logger("test_idempotent", log_file=log_file)
+    logger.info("fetch_rows: %s", 42)
+
+    assert len(logger.handlers) == 1
+    assert wait_for_text(tmp_path / "app.log", "test_idempotent - INFO - fetch_rows: 42")
+
+
+def test_sampled_logger_only_thins_out_fetch_info_lines(caplog):
+    logger = SampledLogger(logging.getLogger("test_sampled"), rate=0.0)
+
+    with caplog.at_level(logging.DEBUG, logger="test_sampled"):
+        logger.info("fetch_expenses_for_date: %s", "2024-01-01")
+        logger.info("replace_expenses_for_dates: dates: 1")
+        logger.warning("fetch_rollups failed")
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "replace_expenses_for_dates: dates: 1", "fetch_rollups failed"]
+
+
+def test_setup_logger_samples_only_the_configured_loggers(monkeypatch, tmp_path):
+    monkeypatch.setattr(logging_setup, "LOG_SAMPLE", "test_busy=0.25")
+
+    busy = setup_logger("test_busy", log_file=str(tmp_path / "app.log"))
+    quiet = setup_logger("test_quiet", log_file=str(tmp_path / "app.log"))
+
+    assert isinstance(busy, SampledLogger) and busy.rate == 0.25
+    assert isinstance(quiet, logging.Logger)
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates(" db_helper=0.1, async_db_helper=0.5 ,") == {"db_helper": 0.1, "async_db_helper": 0.5}
+    assert parse_sample_rates("") == {}
+
+
+def test_json_formatter_writes_one_object_per_record():
+    record = logging.LogRecord("db_helper", logging.INFO, __file__, 1, "fetch_changes: since: %s", (7,), None)
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["logger"] == "db_helper"
+    assert entry["level"] == "INFO"
+    assert entry["message"] == "fetch_changes: since: 7"
+    assert entry["time"].endswith("+00:00")
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from backend.metrics import Metrics, MetricsMiddleware, labels, render_stats
+
+
+class Route:
+    path = "/expenses/{expense_date}"
+
+
+def run(app, metrics, path="/expenses/2024-01-01"):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path}
+    asyncio.run(MetricsMiddleware(app, metrics)(scope, None, send))
+    return sent
+
+
+def test_middleware_records_route_template_status_and_size():
+    metrics = Metrics()
+
+    async def app(scope, receive, send):
+        scope["route"] = Route()
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b"abc", "more_body": True})
+        await send({"type": "http.response.body", "body": b"de"})
+
+    run(app, metrics)
+
+    assert metrics.requests == {("GET", "/expenses/{expense_date}", 404): 1}
+    assert metrics.in_flight == {"GET": 0}
+    assert metrics.sizes[("GET", "/expenses/{expense_date}")].sum == 5
+
+
+def test_middleware_counts_unhandled_errors_as_500_unmatched():
+    metrics = Metrics()
+
+    async def app(scope, receive, send):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        run(app, metrics, "/nowhere")
+
+    assert metrics.requests == {("GET", "unmatched", 500): 1}
+    assert metrics.in_flight == {"GET": 0}
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Metrics()
+    for seconds in (0.001, 0.02, 0.02, 30.0):
+        metrics.started("GET")
+        metrics.finished("GET", "/", 200, seconds, 10)
+
+    lines = metrics.render()
+
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="0.005"} 1' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="0.025"} 3' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="10.0"} 3' in lines
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/",le="+Inf"} 4' in lines
+    assert 'http_request_duration_seconds_count{method="GET",route="/"} 4' in lines
+
+
+def test_labels_escape_quotes_and_backslashes():
+    assert labels(route='a"b\\c') == '{route="a\\"b\\\\c"}'
+
+
+def test_render_stats_skips_non_numeric_fields():
+    lines = render_stats("db_pool", {"in_use": 2, "checkouts": 7, "backend": "LocalBackend"}, counters={"checkouts"})
+
+    assert lines == ["# TYPE db_pool_in_use gauge", "db_pool_in_use 2",
+                     "# TYPE db_pool_checkouts_total counter", "db_pool_checkouts_total 7"]
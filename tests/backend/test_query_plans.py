@@ -0,0 +1,68 @@
+import inspect
+from datetime import date
+from backend import auth_helper, db_helper, storage
+
+# One representative call per public db_helper function
+DB_HELPER_CALLS = {
+    "fetch_expenses_for_date": lambda user_id: db_helper.fetch_expenses_for_date(date(2024, 8, 15), user_id),
+    "insert_expense": lambda user_id: db_helper.insert_expense(date(2024, 8, 15), "a", "c", "n", user_id),
+    "delete_expense_for_date": lambda user_id: db_helper.delete_expense_for_date(date(2024, 8, 14), user_id),
+    "replace_expenses_for_date": lambda user_id: db_helper.replace_expenses_for_date(
+        date(2024, 8, 16), [{"amount": "a", "category": "c", "notes": "n"}], user_id),
+    "replace_expenses_for_dates": lambda user_id: db_helper.replace_expenses_for_dates(
+        {date(2024, 8, 17): [{"amount": "a", "category": "c", "notes": "n"}], date(2024, 9, 1): []}, user_id),
+    "import_expenses": lambda user_id: db_helper.import_expenses(
+        [{"expense_date": date(2024, 9, 2), "amount": "a", "category": "c", "notes": "n"}], user_id),
+    "fetch_expense_summary": lambda user_id: db_helper.fetch_expense_summary(
+        date(2024, 8, 1), date(2024, 8, 31), user_id),
+    "fetch_monthly_expense_summary": lambda user_id: db_helper.fetch_monthly_expense_summary(2024, user_id),
+    "fetch_all_expenses_with_id": lambda user_id: db_helper.fetch_all_expenses_with_id(user_id),
+    "fetch_expenses_page": lambda user_id: db_helper.fetch_expenses_page(user_id, 10, (date(2024, 8, 16), 5)),
+    "fetch_expenses_between": lambda user_id: db_helper.fetch_expenses_between(
+        date(2024, 8, 1), date(2024, 8, 31), user_id),
+    "iter_all_expenses": lambda user_id: list(db_helper.iter_all_expenses(user_id)),
+    "delete_expense_by_id": lambda user_id: db_helper.delete_expense_by_id(1, user_id),
+    "update_expense_by_id": lambda user_id: db_helper.update_expense_by_id(2, "a", "c", "n", user_id),
+    "apply_expense_batch": lambda user_id: db_helper.apply_expense_batch(
+        [{"id": 3, "amount": "a", "category": "c", "notes": "n"}], [4], user_id),
+    "fetch_data_version": lambda user_id: db_helper.fetch_data_version(user_id),
+    "fetch_changes": lambda user_id: db_helper.fetch_changes(1, user_id),
+    "fetch_rollups": lambda user_id: db_helper.fetch_rollups(date(2024, 1, 1), date(2024, 12, 1), user_id),
+    "store_rollup": lambda user_id: db_helper.store_rollup(date(2024, 8, 1), "blob", 1, user_id),
+}
+
+
+def test_every_db_helper_query_is_covered():
+    public = {name for name, func in inspect.getmembers(db_helper, inspect.isfunction)
+              if func.__module__ == db_helper.__name__ and not name.startswith("_")}
+
+    assert public == set(DB_HELPER_CALLS)
+
+
+def test_no_db_helper_query_does_a_full_table_scan(sqlite_db, monkeypatch):
+    auth_helper.create_user("planner", "password123")
+    user_id = auth_helper.verify_user("planner", "password123")["user_id"]
+
+    executed = []
+    original_execute = storage.SQLiteCursor.execute
+
+    def recording_execute(self, operation, params=()):
+        executed.append((operation, tuple(params)))
+        return original_execute(self, operation, params)
+
+    monkeypatch.setattr(storage.SQLiteCursor, "execute", recording_execute)
+    for call in DB_HELPER_CALLS.values():
+        call(user_id)
+    monkeypatch.undo()
+
+    connection = sqlite_db.connect()
+    cursor = sqlite_db.dict_cursor(connection)
+    offenders = {}
+    for operation, params in executed:
+        if operation.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            scans = sqlite_db.full_scans(cursor, operation, params)
+            if scans:
+                offenders[" ".join(operation.split())] = scans
+    connection.close()
+
+    assert offenders == {}
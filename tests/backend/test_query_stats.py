@@ -0,0 +1,48 @@
+import logging
+from datetime import date
+from fastapi.testclient import TestClient
+from backend import auth_helper, db_helper, query_stats, server
+
+
+def test_normalize_folds_variable_length_lists():
+    assert query_stats.normalize("SELECT id FROM expenses\n   WHERE id IN (%s, %s, %s)") == \
+        "SELECT id FROM expenses WHERE id IN (...)"
+    assert query_stats.normalize("INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)") == \
+        "INSERT INTO t (a, b) VALUES (...), ..."
+    assert query_stats.normalize("UPDATE t SET a = CASE id WHEN %s THEN %s WHEN %s THEN %s END") == \
+        "UPDATE t SET a = CASE id WHEN %s THEN %s ... END"
+
+
+def test_request_queries_reach_server_timing_and_metrics(sqlite_db, monkeypatch):
+    monkeypatch.setattr(query_stats, "SERVER_TIMING", True)
+    auth_helper.create_user("timed", "password123")
+    user_id = auth_helper.verify_user("timed", "password123")["user_id"]
+    db_helper.replace_expenses_for_date(date(2024, 5, 1), [{"amount": "a", "category": "c", "notes": "n"}], user_id)
+
+    response = TestClient(server.app).get("/expenses/2024-05-01", headers={"user-id": str(user_id)})
+
+    assert response.status_code == 200
+    # The data version for the ETag, then the rows; both helpers ran in the threadpool
+    assert 'desc="2 queries, 2 rows"' in response.headers["server-timing"]
+    assert "db-pool;dur=" in response.headers["server-timing"]
+    histogram = server.metrics.queries[("GET", "/expenses/{expense_date}")]
+    assert histogram.sum >= 1
+
+
+def test_slow_queries_are_logged_with_their_route(sqlite_db, monkeypatch, caplog):
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="slow_queries"):
+        TestClient(server.app).get("/expenses/2024-05-01", headers={"user-id": "1"})
+
+    assert any("Slow query on /expenses/{expense_date}" in record.message for record in caplog.records)
+
+
+def test_queries_outside_a_request_are_logged_without_a_route(sqlite_db, monkeypatch, caplog):
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="slow_queries"):
+        auth_helper.create_user("background", "password123")
+
+    assert query_stats.current() is None
+    assert any(record.message.startswith("Slow query on -:") for record in caplog.records)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from datetime import date
+from backend import auth_helper, db_helper, result_cache
+from backend.result_cache import MISS, LocalBackend, ResultCache, month_scopes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_local_backend_expires_and_evicts_least_recently_used():
+    clock = FakeClock()
+    backend = LocalBackend(max_bytes=10, ttl=60, clock=clock)
+    backend.set("a", b"aaaa")
+    backend.set("b", b"bbbb")
+    backend.get("a")
+    backend.set("c", b"cccc")
+
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (b"aaaa", None, b"cccc")
+    clock.now = 61
+    assert backend.get("a") is None
+    assert backend.stats() == {"entries": 1, "bytes": 4, "evictions": 1}
+
+
+def test_invalidation_only_reaches_results_covering_the_month():
+    cache = ResultCache(LocalBackend(max_bytes=1024, ttl=60))
+    for name, scopes in [("january", month_scopes(date(2024, 1, 1), date(2024, 1, 31))),
+                         ("year", month_scopes(date(2024, 1, 1), date(2024, 12, 31))),
+                         ("decade", month_scopes(date(2015, 1, 1), date(2024, 12, 31)))]:
+        key, _ = cache.lookup(1, name, (), scopes)
+        cache.store(key, name)
+
+    cache.invalidate(1, date(2024, 8, 15))
+    cache.invalidate(2, date(2024, 1, 15))
+
+    assert cache.lookup(1, "january", (), ["2024-01"])[1] == "january"
+    assert cache.lookup(1, "year", (), month_scopes(date(2024, 1, 1), date(2024, 12, 31)))[1] is MISS
+    assert cache.lookup(1, "decade", (), [result_cache.ALL_MONTHS])[1] is MISS
+    assert cache.stats()["hit_ratio"] == 1 / 6
+
+
+def test_write_paths_invalidate_the_month(sqlite_db):
+    auth_helper.create_user("cache_fan", "password123")
+    user_id = auth_helper.verify_user("cache_fan", "password123")["user_id"]
+    cache = result_cache.get_result_cache()
+    scopes = month_scopes(date(2024, 8, 1), date(2024, 8, 31))
+    key, _ = cache.lookup(user_id, "fetch_expenses_for_date", (date(2024, 8, 15),), scopes)
+    cache.store(key, [])
+
+    db_helper.insert_expense(date(2024, 8, 15), 1.0, "Food", "Lunch", user_id)
+
+    assert cache.lookup(user_id, "fetch_expenses_for_date", (date(2024, 8, 15),), scopes)[1] is MISS
+
+
+class SharedBackend(LocalBackend):
+    """LocalBackend that records the thread of every call, as a blocking shared backend would be used"""
+
+    shared = True
+
+    def __init__(self):
+        super().__init__(max_bytes=1024, ttl=60)
+        self.threads = set()
+
+    def tokens(self, names):
+        self.threads.add(threading.get_ident())
+        return super().tokens(names)
+
+    def bump(self, names):
+        self.threads.add(threading.get_ident())
+        super().bump(names)
+
+
+def test_shared_backend_is_called_off_the_event_loop(monkeypatch):
+    backend = SharedBackend()
+    monkeypatch.setattr(result_cache, "_cache", ResultCache(backend))
+
+    async def load():
+        return "loaded"
+
+    async def run():
+        await result_cache.cached(1, "name", (), ["2024-08"], load)
+        await result_cache.invalidate_async(1, date(2024, 8, 1))
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    assert backend.threads and loop_thread not in backend.threads
+    assert result_cache.is_shared()
+
+
+def test_local_generation_tokens_share_the_byte_cap():
+    backend = LocalBackend(max_bytes=100, ttl=60)
+    original = backend.tokens(["rc:gen:0:2024-08"])
+
+    for user_id in range(1, 50):
+        backend.tokens([f"rc:gen:{user_id}:2024-08"])
+
+    assert backend.stats()["bytes"] <= 100
+    # An evicted token comes back as a new random value, never as one old entries were keyed by
+    recreated = backend.tokens(["rc:gen:0:2024-08"])
+    assert recreated != original
+    assert backend.tokens(["rc:gen:0:2024-08"]) == recreated
@@ -0,0 +1,306 @@
+import io
+import json
+from datetime import date
+import pytest
+from fastapi.testclient import TestClient
+from backend import db_helper, result_cache, server
+
+client = TestClient(server.app)
+HEADERS = {"user-id": "1"}
+ROWS = [
+    {"id": 3, "expense_date": date(2024, 8, 2), "amount": "a", "category": "c", "notes": "n"},
+    {"id": 2, "expense_date": date(2024, 8, 1), "amount": "a", "category": "c", "notes": "n"},
+]
+
+
+@pytest.fixture(autouse=True)
+def data_version(monkeypatch):
+    monkeypatch.setattr(db_helper, "fetch_data_version", lambda user_id: 5)
+    result_cache.reset_result_cache()
+    yield
+    result_cache.reset_result_cache()
+
+
+def test_get_all_expenses_page_sets_next_cursor(monkeypatch):
+    calls = []
+    monkeypatch.setattr(db_helper, "fetch_expenses_page",
+                        lambda user_id, limit, after: calls.append((user_id, limit, after)) or ROWS)
+
+    response = client.get("/expenses/", params={"limit": 2, "after": "2024-08-03_9"}, headers=HEADERS)
+
+    assert response.status_code == 200
+    assert calls == [(1, 2, (date(2024, 8, 3), 9))]
+    assert response.headers["X-Next-After"] == "2024-08-01_2"
+
+
+def test_get_all_expenses_rejects_bad_cursor():
+    response = client.get("/expenses/", params={"after": "garbage"}, headers=HEADERS)
+
+    assert response.status_code == 400
+
+
+def test_get_all_expenses_streams_ndjson(monkeypatch):
+    monkeypatch.setattr(db_helper, "iter_all_expenses", lambda user_id, batch_size: iter(ROWS))
+
+    response = client.get("/expenses/", params={"stream": "true"}, headers=HEADERS)
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [3, 2]
+    assert lines[0]["expense_date"] == "2024-08-02"
+
+
+def test_get_rollups_for_a_year_flags_stale_months(monkeypatch):
+    calls = []
+    rows = [{"month_start": date(2024, 1, 1), "generation": 2, "built_generation": 2, "payload": "a"},
+            {"month_start": date(2024, 3, 1), "generation": 3, "built_generation": 1, "payload": "b"}]
+    monkeypatch.setattr(db_helper, "fetch_rollups", lambda *args: calls.append(args) or rows)
+
+    response = client.get("/rollups/", params={"year": 2024}, headers=HEADERS)
+
+    assert calls == [(date(2024, 1, 1), date(2024, 12, 1), 1)]
+    assert [row["stale"] for row in response.json()] == [False, True]
+
+
+def test_put_rollup_conflicts_with_newer_build(monkeypatch):
+    monkeypatch.setattr(db_helper, "store_rollup", lambda *args: False)
+
+    response = client.put("/rollups/2024-03-17", json={"payload": "blob", "generation": 1}, headers=HEADERS)
+
+    assert response.status_code == 409
+
+
+def test_expense_changes_route_is_not_taken_for_a_date(monkeypatch):
+    monkeypatch.setattr(db_helper, "fetch_changes",
+                        lambda since, user_id: {"version": 4, "upserts": ROWS, "deletes": [1]})
+
+    response = client.get("/expenses/changes", params={"since": 2}, headers=HEADERS)
+
+    assert response.status_code == 200
+    assert response.json()["deletes"] == [1]
+
+
+def test_data_version_route_is_not_taken_for_a_date():
+    response = client.get("/expenses/version", headers=HEADERS)
+
+    assert response.json() == {"version": 5}
+
+
+def test_read_is_tagged_with_the_data_version(monkeypatch):
+    monkeypatch.setattr(db_helper, "fetch_expenses_for_date", lambda expense_date, user_id: [])
+
+    response = client.get("/expenses/2024-08-01", headers=HEADERS)
+
+    assert response.headers["ETag"] == '"1-5"'
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_matching_if_none_match_skips_the_query(monkeypatch):
+    calls = []
+    monkeypatch.setattr(db_helper, "fetch_monthly_expense_summary", lambda *args: calls.append(args) or [])
+
+    response = client.get("/analytics_month/", params={"year": 2024},
+                          headers={**HEADERS, "If-None-Match": 'W/"1-4", "1-5"'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == '"1-5"'
+    assert calls == []
+
+
+def test_stale_if_none_match_gets_a_full_response(monkeypatch):
+    monkeypatch.setattr(db_helper, "iter_all_expenses", lambda user_id, batch_size: iter(ROWS))
+
+    response = client.get("/expenses/", params={"stream": "true"}, headers={**HEADERS, "If-None-Match": '"1-4"'})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"1-5"'
+    assert len(response.text.splitlines()) == 2
+
+
+def test_repeated_read_is_served_from_the_result_cache(monkeypatch):
+    calls = []
+    monkeypatch.setattr(db_helper, "fetch_expenses_for_date", lambda *args: calls.append(args) or [])
+
+    for _ in range(3):
+        assert client.get("/expenses/2024-08-01", headers=HEADERS).status_code == 200
+    db_helper.result_cache.invalidate(1, date(2024, 8, 20))
+    client.get("/expenses/2024-08-01", headers=HEADERS)
+
+    assert len(calls) == 2
+    assert client.get("/stats/cache").json()["hits"] >= 2
+
+
+def test_local_result_cache_never_answers_for_the_data_version(monkeypatch):
+    versions = iter([5, 6])
+    monkeypatch.setattr(db_helper, "fetch_data_version", lambda user_id: next(versions))
+    monkeypatch.setattr(db_helper, "fetch_expenses_for_date", lambda *args: [])
+
+    client.get("/expenses/2024-08-01", headers=HEADERS)
+    # Another worker wrote in between; its local cache can't tell this one
+    response = client.get("/expenses/2024-08-01", headers={**HEADERS, "If-None-Match": '"1-5"'})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"1-6"'
+
+
+def test_import_commits_in_chunks_and_reports_bad_rows(monkeypatch):
+    chunks = []
+    monkeypatch.setattr(db_helper, "import_expenses", lambda rows, user_id: chunks.append(list(rows)) or len(rows))
+    monkeypatch.setattr(server, "IMPORT_CHUNK_SIZE", 2)
+    body = "\n".join([
+        "expense_date,amount,category,notes,payload",
+        "2024-08-01,a1,c1,n1",
+        "not-a-date,a2,c2,n2",
+        "2024-09-30,a3,c3,n3",
+        "2023-01-05,,,,p4",
+    ])
+
+    response = client.post("/expenses/import", content=body, headers={**HEADERS, "content-type": "text/csv"})
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 3
+    assert response.json()["chunks"] == 2
+    assert [error["line"] for error in response.json()["errors"]] == [3]
+    assert [[row["expense_date"] for row in chunk] for chunk in chunks] == [
+        [date(2024, 8, 1), date(2024, 9, 30)], [date(2023, 1, 5)]]
+
+
+def test_import_csv_keeps_newlines_inside_quoted_fields(monkeypatch):
+    chunks = []
+    monkeypatch.setattr(db_helper, "import_expenses", lambda rows, user_id: chunks.append(list(rows)) or len(rows))
+    body = 'expense_date,amount,category,notes\r\n2024-08-01,a1,c1,"two\r\nlines, ""quoted"""\r\nbad,a2,c2,n2\r\n'
+
+    response = client.post("/expenses/import", content=body, headers={**HEADERS, "content-type": "text/csv"})
+
+    assert response.json()["imported"] == 1
+    assert chunks[0][0]["notes"] == 'two\r\nlines, "quoted"'
+    assert [error["line"] for error in response.json()["errors"]] == [4]
+
+
+def test_import_reads_ndjson(monkeypatch):
+    monkeypatch.setattr(db_helper, "import_expenses", lambda rows, user_id: len(rows))
+    body = '{"expense_date": "2024-08-01", "payload": "p1"}\n{"expense_date": "2024-08-02"\n'
+
+    response = client.post("/expenses/import", content=body, headers=HEADERS)
+
+    assert response.json()["imported"] == 1
+    assert response.json()["failed"] == 1
+
+
+def test_export_streams_csv_batches_gzipped(monkeypatch):
+    rows = [{**row, "payload": None} for row in ROWS]
+    monkeypatch.setattr(db_helper, "iter_all_expenses", lambda user_id, batch_size: iter(rows))
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 1)
+
+    response = client.get("/expenses/export", params={"format": "csv"},
+                          headers={**HEADERS, "accept-encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.text.splitlines() == ["id,expense_date,amount,category,notes,payload",
+                                          "3,2024-08-02,a,c,n,", "2,2024-08-01,a,c,n,"]
+
+
+def test_export_writes_parquet_row_groups(monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [{**row, "payload": "p"} for row in ROWS]
+    monkeypatch.setattr(db_helper, "iter_all_expenses", lambda user_id, batch_size: iter(rows))
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 1)
+
+    response = client.get("/expenses/export", params={"format": "parquet"}, headers=HEADERS)
+
+    parquet = pq.ParquetFile(io.BytesIO(response.content))
+    assert "content-encoding" not in response.headers
+    assert parquet.num_row_groups == 2
+    assert parquet.read().column("expense_date").to_pylist() == [date(2024, 8, 2), date(2024, 8, 1)]
+
+
+def test_async_mode_exports_off_the_async_cursor(monkeypatch):
+    async def batches(user_id, batch_size):
+        for row in ROWS:
+            yield [row]
+
+    monkeypatch.setattr(server, "API_MODE", "async")
+    monkeypatch.setattr(server.async_db_helper, "iter_expense_batches", batches)
+    monkeypatch.setattr(db_helper, "iter_all_expenses", lambda user_id, batch_size: pytest.fail("sync cursor used"))
+
+    response = client.get("/expenses/export", params={"format": "ndjson"}, headers=HEADERS)
+
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [3, 2]
+
+
+def test_batch_reports_every_operation(monkeypatch):
+    calls = []
+    monkeypatch.setattr(db_helper, "apply_expense_batch",
+                        lambda updates, deletes, user_id: calls.append((updates, deletes)) or {3, 4})
+
+    response = client.post("/expenses/batch", headers=HEADERS,
+                           json={"updates": [{"id": 3, "payload": "p"}, {"id": 8, "payload": "q"}], "deletes": [4]})
+
+    assert [update["id"] for update in calls[0][0]] == [3, 8]
+    assert response.json() == {"updates": [{"id": 3, "status": "ok"}, {"id": 8, "status": "not_found"}],
+                               "deletes": [{"id": 4, "status": "ok"}]}
+
+
+def test_batch_rejects_an_id_twice():
+    response = client.post("/expenses/batch", headers=HEADERS, json={"updates": [{"id": 3, "payload": "p3"}], "deletes": [3]})
+
+    assert response.status_code == 400
+
+
+def test_bulk_replaces_many_dates_in_one_call(monkeypatch):
+    calls = []
+    monkeypatch.setattr(db_helper, "replace_expenses_for_dates", lambda by_date, user_id: calls.append(by_date))
+
+    response = client.post("/expenses/bulk", headers=HEADERS,
+                           json={"2024-08-01": [{"payload": "p1"}, {"payload": "p2"}], "2024-08-02": []})
+
+    assert response.json()["rows"] == 2
+    assert list(calls[0]) == [date(2024, 8, 1), date(2024, 8, 2)]
+    assert calls[0][date(2024, 8, 2)] == []
+
+
+def test_rows_without_payload_or_fields_are_rejected(monkeypatch):
+    monkeypatch.setattr(db_helper, "import_expenses", lambda rows, user_id: len(rows))
+
+    assert client.post("/expenses/2024-08-01", headers=HEADERS, json=[{}]).status_code == 422
+    assert client.post("/expenses/bulk", headers=HEADERS, json={"2024-08-01": [{"notes": "n"}]}).status_code == 422
+    assert client.post("/expenses/batch", headers=HEADERS, json={"updates": [{"id": 1}]}).status_code == 422
+    response = client.post("/expenses/import", headers=HEADERS, content='{"expense_date": "2024-08-01"}\n')
+    assert response.json()["failed"] == 1
+    assert "payload" in response.json()["errors"][0]["error"]
+
+
+def test_bulk_refuses_bodies_over_the_limit(monkeypatch):
+    monkeypatch.setattr(server, "BULK_MAX_BYTES", 64)
+
+    response = client.post("/expenses/bulk", headers=HEADERS, json={"2024-08-01": [{"payload": "p" * 100}]})
+
+    assert response.status_code == 413
+    assert client.post("/expenses/bulk", headers=HEADERS, json={"not-a-date": []}).status_code == 422
+
+
+def test_metrics_exposes_route_latency_and_pool_stats(monkeypatch):
+    monkeypatch.setattr(server, "pool_stats", lambda: {"size": 5, "in_use": 1, "checkouts": 9})
+    client.get("/")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="GET",route="/",status="200"}' in response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/"}' in response.text
+    assert "db_pool_checkouts_total 9" in response.text
+    assert "result_cache_hits_total 0" in response.text
+
+
+def test_startup_migrates_without_creating_a_pool(monkeypatch):
+    calls = []
+    monkeypatch.setattr(server.migrations, "upgrade", lambda storage: calls.append(storage) or 0)
+    monkeypatch.setattr(server.db_pool, "reset_pool", lambda: calls.append("reset"))
+    monkeypatch.setattr(server.db_pool, "get_pool", lambda: pytest.fail("shutdown must not create a pool"))
+
+    with TestClient(server.app):
+        assert len(calls) == 1
+
+    assert calls[-1] == "reset"
@@ -1,8 +1,28 @@
 import sys
 import os
+import tempfile
 
 
 project_root = os.path.join(os.path.dirname(__file__), "..")
 print("Project root: ", project_root)
 sys.path.insert(0, project_root)
 print(sys.path)
+
+# Set before any backend module creates its logger, so test runs never write the repo's server.log
+os.environ["LOG_FILE"] = os.path.join(tempfile.mkdtemp(prefix="expense_tests_"), "server.log")
+
+import pytest
+from backend import db_pool, migrations, result_cache, storage
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """Point the helpers at a fresh embedded SQLite database for the duration of a test"""
+    storage.set_storage(storage.SQLiteStorage(str(tmp_path / "expense_manager.db")))
+    migrations.upgrade(storage.get_storage())
+    db_pool.reset_pool()
+    result_cache.reset_result_cache()
+    yield storage.get_storage()
+    db_pool.reset_pool()
+    result_cache.reset_result_cache()
+    storage.set_storage(None)
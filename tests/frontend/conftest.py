@@ -0,0 +1,7 @@
+import sys
+import os
+
+
+# The Streamlit app imports its modules by bare name (streamlit run frontend/app.py)
+frontend_root = os.path.join(os.path.dirname(__file__), "..", "..", "frontend")
+sys.path.insert(0, frontend_root)
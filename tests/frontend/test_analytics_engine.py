@@ -0,0 +1,59 @@
+from datetime import date
+import pytest
+from analytics_engine import category_breakdown, monthly_totals, rollup_frame
+from encryption_helper import encrypt_expense, get_encryption_key
+from rollup_helper import build_rollup
+
+KEY = get_encryption_key("password123", "analyst")
+
+
+@pytest.fixture
+def frame():
+    plain = [
+        (1, "2024-01-05", 10.0, "Food"),
+        (2, "2024-01-20", 30.0, "Rent"),
+        (3, "2024-02-03", 15.0, "Food"),
+        (4, "2023-12-31", 99.0, "Food"),
+    ]
+    rows = []
+    for expense_id, expense_date, amount, category in plain:
+        row = encrypt_expense({"amount": amount, "category": category, "notes": ""}, KEY)
+        row.update(id=expense_id, expense_date=expense_date)
+        rows.append(row)
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(date.fromisoformat(row["expense_date"]).replace(day=1), []).append(row)
+    # The path the views take: ciphertext rows -> per-month rollups -> frame of daily totals
+    return rollup_frame({month: build_rollup(month_rows, KEY) for month, month_rows in by_month.items()})
+
+
+def test_category_breakdown_totals_decrypted_amounts(frame):
+    breakdown = category_breakdown(frame, date(2024, 1, 1), date(2024, 1, 31))
+
+    assert breakdown == {"Food": {"total": 10.0, "percentage": 25.0}, "Rent": {"total": 30.0, "percentage": 75.0}}
+
+
+def test_monthly_totals_only_counts_selected_year(frame):
+    assert monthly_totals(frame, 2024) == [
+        {"month": 1, "month_name": "January", "total": 40.0},
+        {"month": 2, "month_name": "February", "total": 15.0},
+    ]
+
+
+def test_empty_history_has_no_breakdown():
+    empty = rollup_frame({})
+
+    assert category_breakdown(empty, date(2024, 1, 1), date(2024, 12, 31)) == {}
+    assert monthly_totals(empty, 2024) == []
+
+
+def test_rollup_frame_answers_the_same_queries():
+    rollups = {
+        date(2024, 1, 1): {"days": {"5": {"Food": 10.0}, "20": {"Rent": 30.0}}},
+        date(2024, 2, 1): {"days": {"3": {"Food": 15.0}}},
+    }
+    frame = rollup_frame(rollups)
+
+    assert category_breakdown(frame, date(2024, 1, 1), date(2024, 1, 31)) == {
+        "Food": {"total": 10.0, "percentage": 25.0}, "Rent": {"total": 30.0, "percentage": 75.0}}
+    assert [row["total"] for row in monthly_totals(frame, 2024)] == [40.0, 15.0]
@@ -0,0 +1,47 @@
+import streamlit as st
+import api_client
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+def test_cached_get_is_memoized_until_the_server_data_version_changes(monkeypatch):
+    server = {"version": 7}
+    calls = []
+
+    def request(method, path, **kwargs):
+        if path == "/expenses/version":
+            return FakeResponse({"version": server["version"]})
+        calls.append((path, kwargs["params"]))
+        return FakeResponse(calls[:])
+
+    monkeypatch.setattr(api_client, "request", request)
+    st.session_state.user_id = 42
+    api_client._cached_get.clear()
+    api_client._server_data_version.clear()
+
+    first = api_client.cached_get("/expenses/2024-08-01")
+    assert api_client.cached_get("/expenses/2024-08-01") == first
+    # Written from another device; noticed once this session asks the server again
+    server["version"] = 8
+    api_client.bump_data_version()
+    api_client.cached_get("/expenses/2024-08-01")
+    api_client.bump_data_version()
+    api_client.cached_get("/expenses/2024-08-01")
+
+    assert calls == [("/expenses/2024-08-01", {})] * 2
+
+
+def test_session_retries_idempotent_calls_only():
+    retry = api_client.get_session().get_adapter("http://localhost").max_retries
+
+    assert retry.total == api_client.API_RETRIES
+    assert "PUT" in retry.allowed_methods and "POST" not in retry.allowed_methods
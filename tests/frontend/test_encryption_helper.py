@@ -0,0 +1,124 @@
+import pytest
+import encryption_helper
+from encryption_helper import (DecryptionCache, decrypt_data, decrypt_expense, decrypt_expenses, decryption_cache,
+                               encrypt_data, encrypt_expense, encrypt_expenses, get_encryption_key,
+                               upgrade_expenses)
+
+KEY = get_encryption_key("password123", "alice")
+OTHER_KEY = get_encryption_key("password123", "bob")
+
+
+def test_expense_round_trip():
+    expense = {"amount": 12.5, "category": "Food", "notes": "Lunch"}
+
+    assert decrypt_expense(encrypt_expense(expense, KEY), KEY) == expense
+
+
+def test_decrypt_data_serves_repeats_from_cache():
+    token = encrypt_data("groceries", KEY)
+    before = decryption_cache.stats()
+
+    assert decrypt_data(token, KEY) == "groceries"
+    assert decrypt_data(token, KEY) == "groceries"
+
+    after = decryption_cache.stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_cached_plaintext_is_not_served_for_another_key():
+    token = encrypt_data("secret", KEY)
+    decrypt_data(token, KEY)
+
+    assert decrypt_data(token, OTHER_KEY).startswith("[DECRYPTION ERROR")
+
+
+def test_cache_evicts_least_recently_used_by_size():
+    cache = DecryptionCache(max_bytes=20)
+    cache.put(KEY, "aaaa", "1111")
+    cache.put(KEY, "bbbb", "2222")
+    cache.get(KEY, "aaaa")
+    cache.put(KEY, "cccc", "3333")
+
+    assert cache.get(KEY, "bbbb") is None
+    assert cache.get(KEY, "aaaa") == "1111"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_clear_for_one_key_keeps_other_entries():
+    cache = DecryptionCache(max_bytes=1000)
+    cache.put(KEY, "aaaa", "1111")
+    cache.put(OTHER_KEY, "bbbb", "2222")
+
+    cache.clear(KEY)
+
+    assert cache.get(KEY, "aaaa") is None
+    assert cache.get(OTHER_KEY, "bbbb") == "2222"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_bulk_round_trip_preserves_order_across_chunks():
+    expenses = [{"amount": float(i), "category": "Food", "notes": f"row {i}"} for i in range(25)]
+
+    for executor in ["thread", "process"]:
+        encrypted = encrypt_expenses(expenses, KEY, workers=2, chunk_size=4, executor=executor)
+        assert decrypt_expenses(encrypted, KEY, workers=2, chunk_size=4, executor=executor) == expenses
+
+
+def test_process_decrypt_fills_the_parent_cache_and_skips_cached_rows(monkeypatch):
+    expenses = [{"amount": float(i), "category": "Food", "notes": f"row {i}"} for i in range(12)]
+    encrypted = encrypt_expenses(expenses, KEY, workers=1)
+    encrypted.append(legacy_row(expenses[0], KEY))
+    decryption_cache.clear(KEY)
+
+    assert decrypt_expenses(encrypted, KEY, workers=2, chunk_size=4, executor="process") == expenses + expenses[:1]
+    assert all((KEY, row["payload"]) in decryption_cache for row in encrypted[:-1])
+
+    monkeypatch.setattr(encryption_helper, "get_executor", lambda *args: pytest.fail("every row was cached"))
+    assert decrypt_expenses(encrypted, KEY, workers=2, chunk_size=4, executor="process") == expenses + expenses[:1]
+
+
+def test_bulk_decrypt_handles_bad_rows_like_decrypt_expense():
+    rows = encrypt_expenses([{"amount": 1.0, "category": "Rent", "notes": ""}] * 3, KEY)
+    rows[1] = {"amount": "garbage", "category": "garbage", "notes": "garbage"}
+
+    decrypted = decrypt_expenses(rows, KEY, workers=2, chunk_size=1, executor="thread")
+
+    assert decrypted[1] == decrypt_expense(rows[1], KEY)
+    assert decrypted[1]["category"] == "[ENCRYPTED]"
+    assert decrypted[2]["category"] == "Rent"
+
+
+def legacy_row(expense, key):
+    return {"amount": encrypt_data(str(expense["amount"]), key), "category": encrypt_data(expense["category"], key),
+            "notes": encrypt_data(expense["notes"], key), "payload": None}
+
+
+def test_envelope_rows_are_compact_and_round_trip():
+    expense = {"amount": 42.0, "category": "Shopping", "notes": "Shoes 👟"}
+
+    row = encrypt_expense(expense, KEY)
+    legacy = legacy_row(expense, KEY)
+
+    assert row["amount"] == row["category"] == row["notes"] == ""
+    assert len(row["payload"]) * 3 < sum(len(legacy[field]) for field in ("amount", "category", "notes"))
+    assert decrypt_expense(row, KEY) == expense
+
+
+def test_legacy_and_envelope_rows_coexist():
+    expense = {"amount": 5.0, "category": "Food", "notes": "Tea"}
+    rows = [legacy_row(expense, KEY), encrypt_expense(expense, KEY)]
+
+    assert decrypt_expenses(rows, KEY) == [expense, expense]
+    assert decrypt_expense(rows[1], OTHER_KEY)["category"] == "[ENCRYPTED]"
+
+
+def test_upgrade_expenses_rewrites_only_readable_legacy_rows():
+    expense = {"amount": 5.0, "category": "Food", "notes": "Tea"}
+    rows = [dict(legacy_row(expense, KEY), id=1), dict(encrypt_expense(expense, KEY), id=2),
+            dict(legacy_row(expense, OTHER_KEY), id=3)]
+
+    upgraded = upgrade_expenses(rows, KEY)
+
+    assert [expense_id for expense_id, _ in upgraded] == [1]
+    assert decrypt_expense(upgraded[0][1], KEY) == expense
@@ -0,0 +1,22 @@
+import io
+import json
+from encryption_helper import encrypt_expenses, get_encryption_key
+from export_helper import write_plaintext_csv
+from import_expenses import read_batches
+
+
+def test_plaintext_export_reads_back_with_the_importer():
+    key = get_encryption_key("password123", "exporter")
+    expenses = [{"amount": 12.5, "category": "Food", "notes": "Lunch, late"},
+                {"amount": 3.0, "category": "Other", "notes": ""}]
+    lines = [json.dumps({"id": i, "expense_date": f"2024-08-0{i + 1}", **row}).encode()
+             for i, row in enumerate(encrypt_expenses(expenses, key))]
+    out = io.StringIO()
+
+    assert write_plaintext_csv(lines, key, out, batch_size=1) == 2
+
+    out.seek(0)
+    ((dates, imported, errors),) = read_batches(out, batch_size=10)
+    assert [str(day) for day in dates] == ["2024-08-01", "2024-08-02"]
+    assert imported == expenses
+    assert errors == []
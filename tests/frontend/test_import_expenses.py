@@ -0,0 +1,95 @@
+import io
+import json
+import pytest
+import requests
+import import_expenses
+from datetime import date
+from import_expenses import read_batches
+
+
+def test_read_batches_splits_rows_and_reports_bad_lines():
+    lines = io.StringIO("date,amount,category,notes\n"
+                        "2024-08-01,12.5,Food,Lunch\n"
+                        "2024-13-01,3,Food,Bad month\n"
+                        "2024-08-02,oops,Rent,\n"
+                        "2024-08-03,7,,Bus\n")
+
+    batches = list(read_batches(lines, batch_size=2))
+
+    assert [batch[0] for batch in batches] == [[date(2024, 8, 1)], [date(2024, 8, 3)]]
+    assert batches[1][1] == [{"amount": 7.0, "category": "Other", "notes": "Bus"}]
+    assert [line for batch in batches for line, _ in batch[2]] == [3, 4]
+
+
+def write_csv(tmp_path, rows):
+    path = tmp_path / "export.csv"
+    path.write_text("date,amount,category,notes\n" + "".join(f"2024-08-{day:02d},{day},Food,\n"
+                                                             for day in range(1, rows + 1)))
+    return str(path)
+
+
+def failed_upload(detail):
+    response = requests.Response()
+    response.status_code = 500
+    response._content = json.dumps({"detail": detail}).encode()
+    return requests.HTTPError("500 Server Error", response=response)
+
+
+def test_import_file_pipelines_batches_and_totals_them(monkeypatch, tmp_path):
+    bodies = []
+
+    def upload(session, user_id, body):
+        bodies.append(body)
+        return {"imported": len(body.splitlines()), "failed": 0}
+
+    monkeypatch.setattr(import_expenses, "encrypt_expenses", lambda expenses, key: expenses)
+    monkeypatch.setattr(import_expenses, "upload", upload)
+
+    result = import_expenses.import_file(write_csv(tmp_path, 5), 1, b"key", batch_size=2, in_flight=2,
+                                         out=io.StringIO())
+
+    assert result == (5, 0)
+    assert [len(body.splitlines()) for body in bodies] == [2, 2, 1]
+    assert json.loads(bodies[0].splitlines()[0])["expense_date"] == "2024-08-01"
+
+
+def test_import_file_stops_after_a_failed_upload_and_reports_progress(monkeypatch, tmp_path):
+    calls = []
+
+    def upload(session, user_id, body):
+        calls.append(body)
+        if len(calls) == 2:
+            raise failed_upload({"message": "Failed to store imported expenses.", "imported": 1, "line": 2})
+        return {"imported": len(body.splitlines()), "failed": 0}
+
+    monkeypatch.setattr(import_expenses, "encrypt_expenses", lambda expenses, key: expenses)
+    monkeypatch.setattr(import_expenses, "upload", upload)
+    out = io.StringIO()
+
+    with pytest.raises(import_expenses.ImportStopped) as stopped:
+        import_expenses.import_file(write_csv(tmp_path, 9), 1, b"key", batch_size=2, in_flight=1, out=out)
+
+    assert len(calls) == 2
+    assert stopped.value.imported == 3
+    assert "upload failed at line 2 of its batch: Failed to store imported expenses." in out.getvalue()
+
+
+def test_import_file_stops_when_the_server_cant_be_reached(monkeypatch, tmp_path):
+    calls = []
+
+    def upload(session, user_id, body):
+        calls.append(body)
+        if len(calls) == 2:
+            raise requests.ConnectionError("connection refused")
+        return {"imported": len(body.splitlines()), "failed": 0}
+
+    monkeypatch.setattr(import_expenses, "encrypt_expenses", lambda expenses, key: expenses)
+    monkeypatch.setattr(import_expenses, "upload", upload)
+    out = io.StringIO()
+
+    with pytest.raises(import_expenses.ImportStopped) as stopped:
+        import_expenses.import_file(write_csv(tmp_path, 9), 1, b"key", batch_size=2, in_flight=1, out=out)
+
+    assert stopped.value.imported == 2
+    assert stopped.value.detail == {"message": "connection refused", "imported": 0}
+    assert "upload failed: connection refused" in out.getvalue()
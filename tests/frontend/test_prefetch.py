@@ -0,0 +1,34 @@
+import threading
+import streamlit as st
+import prefetch
+from prefetch import run_concurrently
+
+
+def test_run_concurrently_runs_tasks_side_by_side_and_keeps_failures():
+    # Both tasks have to be running at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fetch():
+        barrier.wait()
+        return [1, 2]
+
+    def fail():
+        barrier.wait()
+        raise ConnectionError("api down")
+
+    results = run_concurrently({"rows": fetch, "broken": fail}, workers=2)
+
+    assert results["rows"] == [1, 2]
+    assert isinstance(results["broken"], ConnectionError)
+
+
+def test_prefetch_fetches_the_data_version_before_the_workers_start(monkeypatch):
+    events = []
+    st.session_state.clear()
+    monkeypatch.setattr(prefetch.api_client, "data_version", lambda: events.append("data_version"))
+    monkeypatch.setattr(prefetch, "run_concurrently", lambda tasks: events.append("workers"))
+
+    prefetch.prefetch_tab_data()
+
+    assert events == ["data_version", "workers"]
+    assert st.session_state.prefetched
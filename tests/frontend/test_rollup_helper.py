@@ -0,0 +1,35 @@
+from datetime import date
+import pytest
+from encryption_helper import decrypt_rollup, encrypt_expense, encrypt_rollup, get_encryption_key
+from rollup_helper import build_rollup, set_day
+
+KEY = get_encryption_key("password123", "roller")
+
+
+def row(expense_date, amount, category):
+    encrypted = encrypt_expense({"amount": amount, "category": category, "notes": ""}, KEY)
+    encrypted["expense_date"] = expense_date
+    return encrypted
+
+
+def test_build_rollup_totals_by_day_and_category():
+    rows = [row("2024-08-15", 10.0, "Food"), row("2024-08-15", 2.5, "Food"), row("2024-08-02", 7.0, "Rent")]
+
+    assert build_rollup(rows, KEY) == {"days": {"15": {"Food": 12.5}, "2": {"Rent": 7.0}}}
+
+
+def test_set_day_replaces_and_clears_a_day():
+    rollup = {"days": {"15": {"Food": 12.5}, "2": {"Rent": 7.0}}}
+
+    set_day(rollup, date(2024, 8, 15), [{"amount": 3.0, "category": "Other"}])
+    set_day(rollup, date(2024, 8, 2), [])
+
+    assert rollup == {"days": {"15": {"Other": 3.0}}}
+
+
+def test_rollup_blob_is_bound_to_its_month():
+    blob = encrypt_rollup({"days": {"1": {"Food": 1.0}}}, "2024-08-01", KEY)
+
+    assert decrypt_rollup(blob, "2024-08-01", KEY) == {"days": {"1": {"Food": 1.0}}}
+    with pytest.raises(Exception):
+        decrypt_rollup(blob, "2024-09-01", KEY)
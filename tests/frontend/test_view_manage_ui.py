@@ -0,0 +1,36 @@
+import view_manage_ui
+from view_manage_ui import apply_changes, save_changes
+
+
+def test_apply_changes_merges_upserts_and_deletes():
+    expenses = [{"id": 3, "expense_date": "2024-08-02", "notes": "old"},
+                {"id": 2, "expense_date": "2024-08-01", "notes": "gone"}]
+    changes = {"version": 9, "deletes": [2],
+               "upserts": [{"id": 3, "expense_date": "2024-08-02", "notes": "edited"},
+                           {"id": 7, "expense_date": "2024-08-05", "notes": "new"}]}
+
+    assert [(expense["id"], expense["notes"]) for expense in apply_changes(expenses, changes)] == [
+        (7, "new"), (3, "edited")]
+
+
+def test_save_changes_splits_batches_and_returns_applied_ids(monkeypatch):
+    bodies = []
+
+    class Response:
+        status_code = 200
+
+        def __init__(self, body):
+            self.body = body
+
+        def json(self):
+            return {"updates": [{"id": update["id"], "status": "ok"} for update in self.body["updates"]],
+                    "deletes": [{"id": expense_id, "status": "not_found" if expense_id == 9 else "ok"}
+                                for expense_id in self.body["deletes"]]}
+
+    monkeypatch.setattr(view_manage_ui, "MAX_BATCH_OPERATIONS", 2)
+    monkeypatch.setattr(view_manage_ui.api_client, "post", lambda path, json: bodies.append(json) or Response(json))
+
+    applied = save_changes({1: {"payload": "a"}, 2: {"payload": "b"}}, [3, 9])
+
+    assert applied == {1, 2, 3}
+    assert [len(body["updates"]) + len(body["deletes"]) for body in bodies] == [2, 2]